@@ -99,7 +99,17 @@ from parsec.api.protocol.realm import (
     realm_start_reencryption_maintenance_serializer,
     realm_finish_reencryption_maintenance_serializer,
 )
-from parsec.api.protocol.block import block_create_serializer, block_read_serializer
+from parsec.api.protocol.block import (
+    BLOCK_BATCH_MAX_SIZE,
+    BLOCK_BATCH_MAX_BYTES,
+    BLOCK_STREAM_MAX_SIZE,
+    block_create_serializer,
+    block_read_serializer,
+    block_batch_create_serializer,
+    block_batch_read_serializer,
+    block_create_stream_serializer,
+    block_read_stream_serializer,
+)
 from parsec.api.protocol.vlob import (
     vlob_create_serializer,
     vlob_read_serializer,
@@ -109,8 +119,14 @@ from parsec.api.protocol.vlob import (
     vlob_maintenance_get_reencryption_batch_serializer,
     vlob_maintenance_save_reencryption_batch_serializer,
 )
+from parsec.api.protocol.multiplexing import (
+    is_multiplexed_message,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
+)
 from parsec.api.protocol.cmds import (
     AUTHENTICATED_CMDS,
+    MULTIPLEXED_EXCLUDED_CMDS,
     INVITED_CMDS,
     APIV1_AUTHENTICATED_CMDS,
     APIV1_ANONYMOUS_CMDS,
@@ -223,10 +239,22 @@ __all__ = (
     "vlob_maintenance_get_reencryption_batch_serializer",
     "vlob_maintenance_save_reencryption_batch_serializer",
     # Block
+    "BLOCK_BATCH_MAX_SIZE",
+    "BLOCK_BATCH_MAX_BYTES",
+    "BLOCK_STREAM_MAX_SIZE",
     "block_create_serializer",
     "block_read_serializer",
+    "block_batch_create_serializer",
+    "block_batch_read_serializer",
+    "block_create_stream_serializer",
+    "block_read_stream_serializer",
+    # Multiplexing
+    "is_multiplexed_message",
+    "pack_multiplexed_message",
+    "unpack_multiplexed_message",
     # List of cmds
     "AUTHENTICATED_CMDS",
+    "MULTIPLEXED_EXCLUDED_CMDS",
     "INVITED_CMDS",
     "APIV1_AUTHENTICATED_CMDS",
     "APIV1_ANONYMOUS_CMDS",
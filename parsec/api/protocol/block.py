@@ -1,10 +1,28 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
-from parsec.serde import fields
+from marshmallow import ValidationError
+
+from parsec.serde import BaseSchema, fields, validate
 from parsec.api.protocol.base import BaseReqSchema, BaseRepSchema, CmdSerializer
 
 
-__all__ = ("block_create_serializer", "block_read_serializer")
+__all__ = (
+    "BLOCK_BATCH_MAX_SIZE",
+    "BLOCK_BATCH_MAX_BYTES",
+    "block_create_serializer",
+    "block_read_serializer",
+    "block_batch_create_serializer",
+    "block_batch_read_serializer",
+    "BLOCK_STREAM_MAX_SIZE",
+    "block_create_stream_serializer",
+    "block_read_stream_serializer",
+)
+
+
+# Maximum number of blocks in a single batch request
+BLOCK_BATCH_MAX_SIZE = 100
+# Maximum cumulated size (in bytes) of the blocks in a single batch request
+BLOCK_BATCH_MAX_BYTES = 4 * 1024 * 1024
 
 
 class BlockCreateReqSchema(BaseReqSchema):
@@ -29,3 +47,81 @@ class BlockReadRepSchema(BaseRepSchema):
 
 
 block_read_serializer = CmdSerializer(BlockReadReqSchema, BlockReadRepSchema)
+
+
+# Batch commands, all the blocks must belong to the same realm
+
+
+class BlockBatchEntrySchema(BaseSchema):
+    block_id = fields.UUID(required=True)
+    block = fields.Bytes(required=True)
+
+
+def _validate_batch_bytes(blocks):
+    if sum(len(entry["block"]) for entry in blocks) > BLOCK_BATCH_MAX_BYTES:
+        raise ValidationError(f"Blocks exceed {BLOCK_BATCH_MAX_BYTES} bytes")
+
+
+class BlockBatchCreateReqSchema(BaseReqSchema):
+    realm_id = fields.UUID(required=True)
+    blocks = fields.List(
+        fields.Nested(BlockBatchEntrySchema),
+        required=True,
+        validate=[validate.Length(min=1, max=BLOCK_BATCH_MAX_SIZE), _validate_batch_bytes],
+    )
+
+
+class BlockBatchCreateRepSchema(BaseRepSchema):
+    pass
+
+
+block_batch_create_serializer = CmdSerializer(BlockBatchCreateReqSchema, BlockBatchCreateRepSchema)
+
+
+class BlockBatchReadReqSchema(BaseReqSchema):
+    realm_id = fields.UUID(required=True)
+    block_ids = fields.List(
+        fields.UUID(), required=True, validate=validate.Length(min=1, max=BLOCK_BATCH_MAX_SIZE)
+    )
+
+
+class BlockBatchReadRepSchema(BaseRepSchema):
+    blocks = fields.List(fields.Nested(BlockBatchEntrySchema), required=True)
+
+
+block_batch_read_serializer = CmdSerializer(BlockBatchReadReqSchema, BlockBatchReadRepSchema)
+
+
+# Stream commands, the block is not part of the msgpack message but sent
+# right after it (by the client for create, by the backend for read) as a
+# websocket message of exactly `size` bytes split into fragments.
+# This avoids the 1MB limit of the msgpack binary fields.
+
+# Maximum size of a streamed block
+BLOCK_STREAM_MAX_SIZE = 64 * 1024 * 1024
+
+
+class BlockCreateStreamReqSchema(BaseReqSchema):
+    block_id = fields.UUID(required=True)
+    realm_id = fields.UUID(required=True)
+    size = fields.Integer(required=True, validate=validate.Range(min=0, max=BLOCK_STREAM_MAX_SIZE))
+
+
+class BlockCreateStreamRepSchema(BaseRepSchema):
+    pass
+
+
+block_create_stream_serializer = CmdSerializer(
+    BlockCreateStreamReqSchema, BlockCreateStreamRepSchema
+)
+
+
+class BlockReadStreamReqSchema(BaseReqSchema):
+    block_id = fields.UUID(required=True)
+
+
+class BlockReadStreamRepSchema(BaseRepSchema):
+    size = fields.Integer(required=True, validate=validate.Range(min=0))
+
+
+block_read_stream_serializer = CmdSerializer(BlockReadStreamReqSchema, BlockReadStreamRepSchema)
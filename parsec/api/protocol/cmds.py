@@ -27,6 +27,10 @@ AUTHENTICATED_CMDS = {
     # Block
     "block_create",
     "block_read",
+    "block_batch_create",
+    "block_batch_read",
+    "block_create_stream",
+    "block_read_stream",
     # Vlob
     "vlob_poll_changes",
     "vlob_create",
@@ -43,6 +47,19 @@ AUTHENTICATED_CMDS = {
     "realm_start_reencryption_maintenance",
     "realm_finish_reencryption_maintenance",
 }
+# Those commands rely on the connection itself (events are delivered to the
+# connection which subscribed, streams are sent right after their message,
+# the connection is read while waiting), hence they are not available on a
+# multiplexed connection
+MULTIPLEXED_EXCLUDED_CMDS = {
+    "events_subscribe",
+    "events_listen",
+    "block_create_stream",
+    "block_read_stream",
+    # API v1 commands monitoring the connection while waiting for the peer
+    "user_invite",
+    "device_invite",
+}
 INVITED_CMDS = {
     "ping",  # TODO: remove ping and ping event (only have them in tests)
     "invite_info",
@@ -76,6 +93,10 @@ APIV1_AUTHENTICATED_CMDS = {
     # Block
     "block_create",
     "block_read",
+    "block_batch_create",
+    "block_batch_read",
+    "block_create_stream",
+    "block_read_stream",
     # Vlob
     "vlob_poll_changes",
     "vlob_create",
@@ -0,0 +1,41 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import struct
+
+from parsec.api.protocol.base import MessageSerializationError
+
+
+__all__ = (
+    "is_multiplexed_message",
+    "pack_multiplexed_message",
+    "unpack_multiplexed_message",
+)
+
+
+# On a multiplexed connection, each message is the regular msgpack message
+# prefixed by a marker and the id of the request it belongs to. The marker
+# (0xc1) is never used by msgpack, so the first request sent on a connection
+# tells whether the client wants it to be multiplexed.
+MULTIPLEXED_MARKER = 0xC1
+_HEADER = struct.Struct("!BI")
+
+
+def is_multiplexed_message(raw: bytes) -> bool:
+    return len(raw) >= _HEADER.size and raw[0] == MULTIPLEXED_MARKER
+
+
+def pack_multiplexed_message(req_id: int, raw: bytes) -> bytes:
+    return _HEADER.pack(MULTIPLEXED_MARKER, req_id) + raw
+
+
+def unpack_multiplexed_message(raw: bytes):
+    """
+    Returns: a tuple of the request id and the regular message
+
+    Raises:
+        MessageSerializationError
+    """
+    if not is_multiplexed_message(raw):
+        raise MessageSerializationError("Not a multiplexed message")
+    _, req_id = _HEADER.unpack_from(raw)
+    return req_id, raw[_HEADER.size :]
@@ -108,6 +108,10 @@ class VlobMaintenanceGetReencryptionBatchReqSchema(BaseReqSchema):
     realm_id = fields.UUID(required=True)
     encryption_revision = fields.Integer(required=True)
     size = fields.Integer(required=True, validate=validate.Range(min=0, max=1000))
+    # Only return the vlob atoms after this one (in vlob id and version order),
+    # which allows to fetch the next batch before the current one is saved
+    after_vlob_id = fields.UUID(missing=None, allow_none=True)
+    after_version = fields.Integer(missing=None, allow_none=True)
 
 
 class ReencryptionBatchEntrySchema(BaseSchema):
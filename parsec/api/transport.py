@@ -32,6 +32,8 @@ class TransportClosedByPeer(TransportError):
 
 class Transport:
     RECEIVE_BYTES = 2 ** 20  # 1Mo
+    # Size of the websocket fragments used to send a stream
+    STREAM_FRAGMENT_BYTES = 2 ** 16  # 64Ko
 
     def __init__(self, stream, ws, keepalive: Optional[int] = None):
         self.stream = stream
@@ -41,6 +43,9 @@ class Transport:
         self.logger = logger.bind(conn_id=self.conn_id)
         self._ws_events = ws.events()
         self._handshake = None
+        # Messages can be sent concurrently on a multiplexed connection, and
+        # pings are answered by whichever task is receiving
+        self._send_lock = trio.StrictFIFOLock()
 
     # Application handshake interface
     # TODO: Investigate a better place for providing an access to the peer API version
@@ -88,7 +93,8 @@ class Transport:
 
     async def _net_send(self, wsmsg):
         try:
-            await self.stream.send_all(self.ws.send(wsmsg))
+            async with self._send_lock:
+                await self.stream.send_all(self.ws.send(wsmsg))
 
         except BrokenResourceError as exc:
             raise TransportError(*exc.args) from exc
@@ -157,12 +163,79 @@ class Transport:
         """
         await self._net_send(BytesMessage(data=msg))
 
+    async def send_stream(self, data: bytes) -> None:
+        """
+        Send `data` as a single websocket message split into fragments, so that
+        neither the data nor a serialized copy of it has to be framed at once.
+
+        Raises:
+            TransportError
+        """
+        view = memoryview(data)
+        step = self.STREAM_FRAGMENT_BYTES
+        for offset in range(0, max(len(view), 1), step):
+            fragment = view[offset : offset + step]
+            await self._net_send(
+                BytesMessage(data=fragment, message_finished=offset + step >= len(view))
+            )
+
+    async def recv_stream(self, size: int) -> bytes:
+        """
+        Receive a message sent with `send_stream`, which must be exactly
+        `size` bytes long. The fragments are assembled only once, and the
+        transfer is interrupted as soon as the announced size is exceeded.
+
+        Raises:
+            TransportError
+        """
+        fragments = []
+        received = 0
+        while True:
+            event = await self._next_message_event()
+            received += len(event.data)
+            if received > size:
+                raise TransportError(f"Stream is bigger than the announced {size} bytes")
+            fragments.append(event.data)
+            if event.message_finished:
+                break
+        if received != size:
+            raise TransportError(f"Stream is smaller than the announced {size} bytes")
+        return b"".join(fragments)
+
+    async def discard_stream(self) -> None:
+        """
+        Receive a message sent with `send_stream` and drop it as it arrives,
+        for when its announced size cannot be trusted.
+
+        Raises:
+            TransportError
+        """
+        while True:
+            event = await self._next_message_event()
+            if event.message_finished:
+                return
+
     async def recv(self) -> bytes:
         """
         Raises:
             TransportError
         """
         data = bytearray()
+        while True:
+            event = await self._next_message_event()
+            # TODO: check that data doesn't go over MAX_BIN_LEN (1 MB)
+            # Msgpack will refuse to unpack it so we should fail early on if that happens
+            data += event.data
+            if event.message_finished:
+                return data
+
+    async def _next_message_event(self) -> BytesMessage:
+        """
+        Wait for the next piece of message, handling the control events meanwhile.
+
+        Raises:
+            TransportError
+        """
         while True:
             if self.keepalive:
                 with trio.move_on_after(self.keepalive) as cancel_scope:
@@ -184,11 +257,7 @@ class Transport:
                 raise TransportClosedByPeer("Peer has closed connection")
 
             elif isinstance(event, BytesMessage):
-                # TODO: check that data doesn't go over MAX_BIN_LEN (1 MB)
-                # Msgpack will refuse to unpack it so we should fail early on if that happens
-                data += event.data
-                if event.message_finished:
-                    return data
+                return event
 
             elif isinstance(event, Ping):
                 self.logger.debug("Received ping and sending pong")
@@ -16,8 +16,12 @@ from parsec.api.protocol import (
     MessageSerializationError,
     InvalidMessageError,
     InvitationStatus,
+    MULTIPLEXED_EXCLUDED_CMDS,
+    is_multiplexed_message,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
 )
-from parsec.backend.utils import CancelledByNewRequest, collect_apis
+from parsec.backend.utils import CancelledByNewRequest, StreamedRep, collect_apis
 from parsec.backend.config import BackendConfig
 from parsec.backend.client_context import AuthenticatedClientContext, InvitedClientContext
 from parsec.backend.handshake import do_handshake
@@ -42,20 +46,21 @@ async def backend_app_factory(config: BackendConfig, event_bus: Optional[EventBu
         components_factory = postgresql_components_factory
 
     async with components_factory(config=config, event_bus=event_bus) as components:
-        yield BackendApp(
-            config=config,
-            event_bus=event_bus,
-            user=components["user"],
-            invite=components["invite"],
-            organization=components["organization"],
-            message=components["message"],
-            realm=components["realm"],
-            vlob=components["vlob"],
-            ping=components["ping"],
-            blockstore=components["blockstore"],
-            block=components["block"],
-            events=components["events"],
-        )
+        with components["events"].connect_in_context(event_bus):
+            yield BackendApp(
+                config=config,
+                event_bus=event_bus,
+                user=components["user"],
+                invite=components["invite"],
+                organization=components["organization"],
+                message=components["message"],
+                realm=components["realm"],
+                vlob=components["vlob"],
+                ping=components["ping"],
+                blockstore=components["blockstore"],
+                block=components["block"],
+                events=components["events"],
+            )
 
 
 class BackendApp:
@@ -152,7 +157,10 @@ class BackendApp:
                                 cancel_scope.cancel()
 
                         client_ctx.event_bus_ctx.connect("user.revoked", _on_revoked)
-                        await self._handle_client_loop(transport, client_ctx)
+                        try:
+                            await self._handle_client_loop(transport, client_ctx)
+                        finally:
+                            self.events.unsubscribe(client_ctx)
 
             elif isinstance(client_ctx, InvitedClientContext):
                 await self.invite.claimer_joined(
@@ -212,43 +220,101 @@ class BackendApp:
             # raw_req can be already defined if we received a new request
             # while processing a command
             raw_req = raw_req or await transport.recv()
+
+            # The client asks for this connection to be multiplexed
+            if isinstance(client_ctx, AuthenticatedClientContext) and is_multiplexed_message(
+                raw_req
+            ):
+                await self._handle_multiplexed_client_loop(transport, client_ctx, raw_req)
+                return
+
             req = unpackb(raw_req)
-            if get_log_level() <= LOG_LEVEL_DEBUG:
-                client_ctx.logger.debug("Request", req=_filter_binary_fields(req))
             try:
-                cmd = req.get("cmd", "<missing>")
-                if not isinstance(cmd, str):
-                    raise KeyError()
+                rep, payload = await self._process_request(client_ctx, api_cmds, req)
 
-                cmd_func = api_cmds[cmd]
+            except CancelledByNewRequest as exc:
+                # Long command handling such as message_get can be cancelled
+                # when the peer send a new request
+                raw_req = exc.new_raw_req
+                continue
 
-            except KeyError:
-                rep = {"status": "unknown_command", "reason": "Unknown command"}
+            raw_rep = packb(rep)
+            await transport.send(raw_rep)
+            if payload is not None:
+                await transport.send_stream(payload)
+            raw_req = None
 
-            else:
-                try:
-                    rep = await cmd_func(client_ctx, req)
+    async def _handle_multiplexed_client_loop(self, transport, client_ctx, raw_req):
+        """
+        Each message is tagged with the id of its request, so the requests
+        are processed concurrently and answered as soon as they complete.
+        Once `multiplexed_max_concurrency` requests are being processed, no
+        more message is read from the connection until one of them completes.
+        """
+        api_cmds = self.apis[client_ctx.handshake_type]
+        limiter = trio.Semaphore(self.config.multiplexed_max_concurrency)
 
-                except InvalidMessageError as exc:
+        async def _process_multiplexed_request(req_id, req):
+            try:
+                cmd = req.get("cmd")
+                if cmd in MULTIPLEXED_EXCLUDED_CMDS:
                     rep = {
-                        "status": "bad_message",
-                        "errors": exc.errors,
-                        "reason": "Invalid message.",
+                        "status": "unknown_command",
+                        "reason": "Command not available on a multiplexed connection",
                     }
+                else:
+                    rep, _ = await self._process_request(client_ctx, api_cmds, req)
+                await transport.send(pack_multiplexed_message(req_id, packb(rep)))
+            finally:
+                limiter.release()
+
+        async with trio.open_service_nursery() as nursery:
+            while True:
+                req_id, raw_msg = unpack_multiplexed_message(raw_req)
+                req = unpackb(raw_msg)
+                await limiter.acquire()
+                nursery.start_soon(_process_multiplexed_request, req_id, req)
+                raw_req = await transport.recv()
+
+    async def _process_request(self, client_ctx, api_cmds, req):
+        """
+        Returns: a tuple of the response and the payload to stream after it (if any)
+
+        Raises:
+            CancelledByNewRequest
+        """
+        payload = None
+        if get_log_level() <= LOG_LEVEL_DEBUG:
+            client_ctx.logger.debug("Request", req=_filter_binary_fields(req))
+        try:
+            cmd = req.get("cmd", "<missing>")
+            if not isinstance(cmd, str):
+                raise KeyError()
 
-                except ProtocolError as exc:
-                    rep = {"status": "bad_message", "reason": str(exc)}
+            cmd_func = api_cmds[cmd]
 
-                except CancelledByNewRequest as exc:
-                    # Long command handling such as message_get can be cancelled
-                    # when the peer send a new request
-                    raw_req = exc.new_raw_req
-                    continue
+        except KeyError:
+            rep = {"status": "unknown_command", "reason": "Unknown command"}
 
-            if get_log_level() <= LOG_LEVEL_DEBUG:
-                client_ctx.logger.debug("Response", rep=_filter_binary_fields(req))
-            else:
-                client_ctx.logger.info("Request", cmd=cmd, status=rep["status"])
-            raw_rep = packb(rep)
-            await transport.send(raw_rep)
-            raw_req = None
+        else:
+            try:
+                rep = await cmd_func(client_ctx, req)
+
+            except InvalidMessageError as exc:
+                rep = {
+                    "status": "bad_message",
+                    "errors": exc.errors,
+                    "reason": "Invalid message.",
+                }
+
+            except ProtocolError as exc:
+                rep = {"status": "bad_message", "reason": str(exc)}
+
+            if isinstance(rep, StreamedRep):
+                rep, payload = rep.rep, rep.payload
+
+        if get_log_level() <= LOG_LEVEL_DEBUG:
+            client_ctx.logger.debug("Response", rep=_filter_binary_fields(req))
+        else:
+            client_ctx.logger.info("Request", cmd=cmd, status=rep["status"])
+        return rep, payload
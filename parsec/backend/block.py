@@ -1,10 +1,18 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from uuid import UUID
+from typing import List, Tuple
 
-from parsec.api.protocol import DeviceID, OrganizationID
-from parsec.api.protocol import block_create_serializer, block_read_serializer
-from parsec.backend.utils import catch_protocol_errors, api
+from parsec.api.protocol import DeviceID, OrganizationID, ProtocolError
+from parsec.api.protocol import (
+    block_create_serializer,
+    block_read_serializer,
+    block_batch_create_serializer,
+    block_batch_read_serializer,
+    block_create_stream_serializer,
+    block_read_stream_serializer,
+)
+from parsec.backend.utils import catch_protocol_errors, api, StreamedRep
 
 
 class BlockError(Exception):
@@ -31,6 +39,10 @@ class BlockInMaintenanceError(BlockError):
     pass
 
 
+class BlockBatchTooLargeError(BlockError):
+    pass
+
+
 class BaseBlockComponent:
     @api("block_read")
     @catch_protocol_errors
@@ -79,6 +91,127 @@ class BaseBlockComponent:
 
         return block_create_serializer.rep_dump({"status": "ok"})
 
+    @api("block_batch_read")
+    @catch_protocol_errors
+    async def api_block_batch_read(self, client_ctx, msg):
+        msg = block_batch_read_serializer.req_load(msg)
+
+        try:
+            blocks = await self.read_batch(client_ctx.organization_id, client_ctx.device_id, **msg)
+
+        except BlockNotFoundError:
+            return block_batch_read_serializer.rep_dump({"status": "not_found"})
+
+        except BlockTimeoutError:
+            return block_batch_read_serializer.rep_dump({"status": "timeout"})
+
+        except BlockAccessError:
+            return block_batch_read_serializer.rep_dump({"status": "not_allowed"})
+
+        except BlockInMaintenanceError:
+            return block_batch_read_serializer.rep_dump({"status": "in_maintenance"})
+
+        except BlockBatchTooLargeError:
+            return block_batch_read_serializer.rep_dump({"status": "too_large"})
+
+        return block_batch_read_serializer.rep_dump(
+            {
+                "status": "ok",
+                "blocks": [
+                    {"block_id": block_id, "block": block}
+                    for block_id, block in zip(msg["block_ids"], blocks)
+                ],
+            }
+        )
+
+    @api("block_batch_create")
+    @catch_protocol_errors
+    async def api_block_batch_create(self, client_ctx, msg):
+        msg = block_batch_create_serializer.req_load(msg)
+
+        try:
+            await self.create_batch(
+                client_ctx.organization_id,
+                client_ctx.device_id,
+                realm_id=msg["realm_id"],
+                blocks=[(x["block_id"], x["block"]) for x in msg["blocks"]],
+            )
+
+        except BlockAlreadyExistsError:
+            return block_batch_create_serializer.rep_dump({"status": "already_exists"})
+
+        except BlockNotFoundError:
+            return block_batch_create_serializer.rep_dump({"status": "not_found"})
+
+        except BlockTimeoutError:
+            return block_batch_create_serializer.rep_dump({"status": "timeout"})
+
+        except BlockAccessError:
+            return block_batch_create_serializer.rep_dump({"status": "not_allowed"})
+
+        except BlockInMaintenanceError:
+            return block_batch_create_serializer.rep_dump({"status": "in_maintenance"})
+
+        return block_batch_create_serializer.rep_dump({"status": "ok"})
+
+    @api("block_read_stream")
+    @catch_protocol_errors
+    async def api_block_read_stream(self, client_ctx, msg):
+        msg = block_read_stream_serializer.req_load(msg)
+
+        try:
+            block = await self.read(client_ctx.organization_id, client_ctx.device_id, **msg)
+
+        except BlockNotFoundError:
+            return block_read_stream_serializer.rep_dump({"status": "not_found"})
+
+        except BlockTimeoutError:
+            return block_read_stream_serializer.rep_dump({"status": "timeout"})
+
+        except BlockAccessError:
+            return block_read_stream_serializer.rep_dump({"status": "not_allowed"})
+
+        except BlockInMaintenanceError:
+            return block_read_stream_serializer.rep_dump({"status": "in_maintenance"})
+
+        # The block is sent as is, without being packed into the reply
+        rep = block_read_stream_serializer.rep_dump({"status": "ok", "size": len(block)})
+        return StreamedRep(rep, block)
+
+    @api("block_create_stream")
+    @catch_protocol_errors
+    async def api_block_create_stream(self, client_ctx, msg):
+        try:
+            msg = block_create_stream_serializer.req_load(msg)
+
+        except ProtocolError:
+            # The block follows the request even if it is invalid, it must be
+            # consumed so that it is not mistaken for the next request
+            await client_ctx.transport.discard_stream()
+            raise
+
+        block = await client_ctx.transport.recv_stream(msg.pop("size"))
+
+        try:
+            await self.create(client_ctx.organization_id, client_ctx.device_id, block=block, **msg)
+
+        except BlockAlreadyExistsError:
+            return block_create_stream_serializer.rep_dump({"status": "already_exists"})
+
+        except BlockNotFoundError:
+            return block_create_stream_serializer.rep_dump({"status": "not_found"})
+
+        except BlockTimeoutError:
+            return block_create_stream_serializer.rep_dump({"status": "timeout"})
+
+        except BlockAccessError:
+            return block_create_stream_serializer.rep_dump({"status": "not_allowed"})
+
+        except BlockInMaintenanceError:
+            return block_create_stream_serializer.rep_dump({"status": "in_maintenance"})
+
+        return block_create_stream_serializer.rep_dump({"status": "ok"})
+
     async def read(
         self, organization_id: OrganizationID, author: DeviceID, block_id: UUID
     ) -> bytes:
@@ -108,3 +241,42 @@ class BaseBlockComponent:
             BlockInMaintenanceError
         """
         raise NotImplementedError()
+
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        block_ids: List[UUID],
+    ) -> List[bytes]:
+        """
+        Returns the blocks in the same order than `block_ids`. Realm status and
+        access rights are checked once for the whole batch.
+
+        Raises:
+            BlockNotFoundError: if cannot found realm or any of the blocks
+            BlockBatchTooLargeError: if the blocks exceed `BLOCK_BATCH_MAX_BYTES`
+            BlockTimeoutError
+            BlockAccessError
+            BlockInMaintenanceError
+        """
+        raise NotImplementedError()
+
+    async def create_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        blocks: List[Tuple[UUID, bytes]],
+    ) -> None:
+        """
+        Either all the blocks are created or none of them are.
+
+        Raises:
+            BlockNotFoundError: if cannot found realm
+            BlockAlreadyExistsError: if any of the blocks already exists
+            BlockTimeoutError
+            BlockAccessError
+            BlockInMaintenanceError
+        """
+        raise NotImplementedError()
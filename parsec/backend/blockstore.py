@@ -1,6 +1,8 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import trio
 from uuid import UUID
+from typing import List, Tuple
 
 from parsec.api.protocol import OrganizationID
 from parsec.backend.config import BaseBlockStoreConfig
@@ -23,6 +25,39 @@ class BaseBlockStoreComponent:
         """
         raise NotImplementedError()
 
+    async def read_many(self, organization_id: OrganizationID, ids: List[UUID]) -> List[bytes]:
+        """
+        Read the blocks concurrently, results are in the same order than `ids`.
+
+        Raises:
+            BlockNotFoundError
+            BlockTimeoutError
+        """
+        results = [None] * len(ids)
+
+        async def _read(index, id):
+            results[index] = await self.read(organization_id, id)
+
+        async with trio.open_service_nursery() as nursery:
+            for index, id in enumerate(ids):
+                nursery.start_soon(_read, index, id)
+
+        return results
+
+    async def create_many(
+        self, organization_id: OrganizationID, blocks: List[Tuple[UUID, bytes]]
+    ) -> None:
+        """
+        Create the blocks concurrently.
+
+        Raises:
+            BlockAlreadyExistsError
+            BlockTimeoutError
+        """
+        async with trio.open_service_nursery() as nursery:
+            for id, block in blocks:
+                nursery.start_soon(self.create, organization_id, id, block)
+
 
 def blockstore_factory(
     config: BaseBlockStoreConfig, postgresql_dbh=None
@@ -91,5 +126,20 @@ def blockstore_factory(
 
         return RAID5BlockStoreComponent(blocks)
 
+    elif config.type == "RAIDN":
+        from parsec.backend.raidn_blockstore import RAIDNBlockStoreComponent
+
+        if config.nb_parity < 1:
+            raise ValueError(f"RAIDN block store needs at least 1 parity node")
+        if len(config.blockstores) < config.nb_parity + 2:
+            raise ValueError(
+                f"RAIDN block store with {config.nb_parity} parity nodes "
+                f"needs at least {config.nb_parity + 2} nodes"
+            )
+
+        blocks = [blockstore_factory(subconf, postgresql_dbh) for subconf in config.blockstores]
+
+        return RAIDNBlockStoreComponent(blocks, config.nb_parity)
+
     else:
         raise ValueError(f"Unknown block store type `{config.type}`")
@@ -20,6 +20,7 @@ from parsec.backend.config import (
     RAID0BlockStoreConfig,
     RAID1BlockStoreConfig,
     RAID5BlockStoreConfig,
+    RAIDNBlockStoreConfig,
 )
 
 
@@ -111,11 +112,16 @@ def _parse_blockstore_param(value):
             raise click.BadParameter(f"Invalid blockstore type `{parts[0]}`")
 
 
+def _is_raid_mode(raw):
+    raw = raw.upper()
+    return raw in ("RAID0", "RAID1", "RAID5") or raw.startswith("RAIDN-")
+
+
 def _parse_blockstore_params(raw_params):
     raid_configs = defaultdict(list)
     for raw_param in raw_params:
         raw_param_parts = raw_param.split(":", 2)
-        if raw_param_parts[0].upper() in ("RAID0", "RAID1", "RAID5") and len(raw_param_parts) == 3:
+        if _is_raid_mode(raw_param_parts[0]) and len(raw_param_parts) == 3:
             raid_mode, raid_node, node_param = raw_param_parts
             try:
                 raid_node = int(raid_node)
@@ -157,6 +163,18 @@ def _parse_blockstore_params(raw_params):
         return RAID1BlockStoreConfig(blockstores=blockstores)
     elif raid_mode.upper() == "RAID5":
         return RAID5BlockStoreConfig(blockstores=blockstores)
+    elif raid_mode.upper().startswith("RAIDN-"):
+        try:
+            nb_parity = int(raid_mode[len("RAIDN-") :])
+        except ValueError:
+            raise click.BadParameter(
+                f"Invalid parity count in `{raid_mode}` (must be integer, e.g. `RAIDN-2`)"
+            )
+        if nb_parity < 1 or len(blockstores) < nb_parity + 2:
+            raise click.BadParameter(
+                f"`{raid_mode}` needs at least 1 parity node and {nb_parity + 2} nodes"
+            )
+        return RAIDNBlockStoreConfig(blockstores=blockstores, nb_parity=nb_parity)
     else:
         raise click.BadParameter(f"Invalid multi blockstore mode `{raid_mode}`")
 
@@ -245,11 +263,15 @@ Note endpoint_url/auth_url are considered as https by default (e.g.
 Escaping must be used to provide a custom scheme (e.g. `s3:http\\://foo.com:[...]`).
 
 On top of that, multiple blockstore configurations can be provided to form a
-RAID0/1/5 cluster.
+RAID0/1/5/N cluster.
 
 Each configuration must be provided with the form
-`<raid_type>:<node>:<config>` with `<raid_type>` RAID0/RAID1/RAID5, `<node>` a
-integer and `<config>` the MOCKED/POSTGRESQL/S3/SWIFT config.
+`<raid_type>:<node>:<config>` with `<raid_type>` RAID0/RAID1/RAID5/RAIDN-<parity>,
+`<node>` a integer and `<config>` the MOCKED/POSTGRESQL/S3/SWIFT config.
+
+RAIDN is a Reed-Solomon erasure coded cluster where the last `<parity>` nodes
+store parity data, the cluster surviving up to `<parity>` node failures (e.g.
+`RAIDN-2` with 5 nodes: 3 data nodes and 2 parity nodes).
 """,
 )
 @click.option(
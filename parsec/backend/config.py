@@ -29,6 +29,14 @@ class RAID5BlockStoreConfig(BaseBlockStoreConfig):
     blockstores: List[BaseBlockStoreConfig]
 
 
+@attr.s(frozen=True, auto_attribs=True)
+class RAIDNBlockStoreConfig(BaseBlockStoreConfig):
+    type = "RAIDN"
+
+    blockstores: List[BaseBlockStoreConfig]
+    nb_parity: int
+
+
 @attr.s(frozen=True, auto_attribs=True)
 class S3BlockStoreConfig(BaseBlockStoreConfig):
     type = "S3"
@@ -75,6 +83,11 @@ class BackendConfig:
 
     debug: bool
 
+    # Maximum number of requests processed concurrently for each multiplexed connection
+    multiplexed_max_concurrency: int = 16
+    # Seconds between corrections of the organization stats counters (None to disable)
+    organization_stats_reconciliation_period: Optional[float] = 24 * 3600
+
     @property
     def db_type(self):
         if self.db_url.upper() == "MOCKED":
@@ -1,106 +1,144 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import trio
+from collections import defaultdict
 
+from parsec.event_bus import EventBus
 from parsec.api.protocol import events_subscribe_serializer, events_listen_serializer
 from parsec.backend.utils import catch_protocol_errors, run_with_breathing_transport, api
 from parsec.backend.realm import BaseRealmComponent
+from parsec.backend.client_context import AuthenticatedClientContext
 
 
 class EventsComponent:
+    """Route the backend events to the subscribed clients.
+
+    Clients are indexed by organization, user and realm, so an event only
+    visits the clients concerned by it instead of every connected client.
+    """
+
     def __init__(self, realm_component: BaseRealmComponent):
         self._realm_component = realm_component
+        self._organization_clients = defaultdict(set)
+        self._user_clients = defaultdict(set)
+        self._realm_clients = defaultdict(set)
+        self._dropped_events = 0
+        self._overflowed_clients = 0
+
+    def stats(self):
+        return {
+            "subscribed_clients": sum(len(x) for x in self._organization_clients.values()),
+            "indexed_users": len(self._user_clients),
+            "indexed_realms": len(self._realm_clients),
+            "dropped_events": self._dropped_events,
+            "overflowed_clients": self._overflowed_clients,
+        }
+
+    def connect_in_context(self, event_bus: EventBus):
+        return event_bus.connect_in_context(
+            ("pinged", self._on_pinged),
+            ("realm.vlobs_updated", self._on_realm_events),
+            ("realm.maintenance_started", self._on_realm_events),
+            ("realm.maintenance_finished", self._on_realm_events),
+            ("message.received", self._on_message_received),
+            ("invite.status_changed", self._on_invite_status_changed),
+            ("realm.roles_updated", self._on_roles_updated),
+        )
 
-    @api("events_subscribe")
-    @catch_protocol_errors
-    async def api_events_subscribe(self, client_ctx, msg):
-        msg = events_subscribe_serializer.req_load(msg)
-
-        def _on_roles_updated(event, organization_id, author, realm_id, user, role):
-            if organization_id != client_ctx.organization_id or user != client_ctx.user_id:
-                return
+    def _send_event(self, client_ctx: AuthenticatedClientContext, event_data: dict) -> None:
+        try:
+            client_ctx.send_events_channel.send_nowait(event_data)
+        except trio.WouldBlock:
+            if not client_ctx.dropped_events:
+                self._overflowed_clients += 1
+            client_ctx.dropped_events += 1
+            self._dropped_events += 1
+            client_ctx.logger.warning(
+                f"event queue is full for {client_ctx}", dropped_events=client_ctx.dropped_events
+            )
 
+    def _add_realm(self, client_ctx: AuthenticatedClientContext, realm_id) -> None:
+        client_ctx.realms.add(realm_id)
+        self._realm_clients[(client_ctx.organization_id, realm_id)].add(client_ctx)
+
+    def _discard_realm(self, client_ctx: AuthenticatedClientContext, realm_id) -> None:
+        client_ctx.realms.discard(realm_id)
+        key = (client_ctx.organization_id, realm_id)
+        clients = self._realm_clients.get(key)
+        if clients is not None:
+            clients.discard(client_ctx)
+            if not clients:
+                del self._realm_clients[key]
+
+    def _on_roles_updated(self, event, organization_id, author, realm_id, user, role):
+        for client_ctx in list(self._user_clients.get((organization_id, user), ())):
             if role is None:
-                client_ctx.realms.discard(realm_id)
+                self._discard_realm(client_ctx, realm_id)
             else:
-                client_ctx.realms.add(realm_id)
+                self._add_realm(client_ctx, realm_id)
 
             # Note for this event we don't filter out the ones sent by the client's
             # device, there is two reason for this:
             # 1) A user cannot change it own role, so this case should never occur
             # 2) Returning this event inform the peer we are ready to send it
             #    `realm.vlobs_updated` events on this realm (especially useful during tests)
-            try:
-                client_ctx.send_events_channel.send_nowait(
-                    {"event": event, "realm_id": realm_id, "role": role}
-                )
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_pinged(event, organization_id, author, ping):
-            if organization_id != client_ctx.organization_id or author == client_ctx.device_id:
-                return
-
-            try:
-                client_ctx.send_events_channel.send_nowait({"event": event, "ping": ping})
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_realm_events(event, organization_id, author, realm_id, **kwargs):
-            if (
-                organization_id != client_ctx.organization_id
-                or author == client_ctx.device_id
-                or realm_id not in client_ctx.realms
-            ):
-                return
-
-            try:
-                client_ctx.send_events_channel.send_nowait(
-                    {"event": event, "realm_id": realm_id, **kwargs}
-                )
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_message_received(event, organization_id, author, recipient, index):
-            if organization_id != client_ctx.organization_id or recipient != client_ctx.user_id:
-                return
-
-            try:
-                client_ctx.send_events_channel.send_nowait({"event": event, "index": index})
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
-
-        def _on_invite_status_changed(event, organization_id, greeter, token, status):
-            print("EVENT STATUS CHANGED ====>", organization_id, greeter, token, status)
-            if organization_id != client_ctx.organization_id or greeter != client_ctx.user_id:
-                return
+            self._send_event(client_ctx, {"event": event, "realm_id": realm_id, "role": role})
+
+    def _on_pinged(self, event, organization_id, author, ping):
+        for client_ctx in self._organization_clients.get(organization_id, ()):
+            if author != client_ctx.device_id:
+                self._send_event(client_ctx, {"event": event, "ping": ping})
+
+    def _on_realm_events(self, event, organization_id, author, realm_id, **kwargs):
+        for client_ctx in self._realm_clients.get((organization_id, realm_id), ()):
+            if author != client_ctx.device_id:
+                self._send_event(client_ctx, {"event": event, "realm_id": realm_id, **kwargs})
+
+    def _on_message_received(self, event, organization_id, author, recipient, index):
+        for client_ctx in self._user_clients.get((organization_id, recipient), ()):
+            self._send_event(client_ctx, {"event": event, "index": index})
+
+    def _on_invite_status_changed(self, event, organization_id, greeter, token, status):
+        for client_ctx in self._user_clients.get((organization_id, greeter), ()):
+            self._send_event(
+                client_ctx, {"event": event, "token": token, "invitation_status": status}
+            )
 
-            try:
-                client_ctx.send_events_channel.send_nowait(
-                    {"event": event, "token": token, "invitation_status": status}
-                )
-            except trio.WouldBlock:
-                client_ctx.logger.warning(f"event queue is full for {client_ctx}")
+    def unsubscribe(self, client_ctx: AuthenticatedClientContext) -> None:
+        """Stop routing events to the client, no-op if it has not subscribed."""
+        for realm_id in list(client_ctx.realms):
+            self._discard_realm(client_ctx, realm_id)
+        for index, key in (
+            (self._organization_clients, client_ctx.organization_id),
+            (self._user_clients, (client_ctx.organization_id, client_ctx.user_id)),
+        ):
+            clients = index.get(key)
+            if clients is not None:
+                clients.discard(client_ctx)
+                if not clients:
+                    del index[key]
 
-        # Drop previous event callbacks if any
-        client_ctx.event_bus_ctx.clear()
+    @api("events_subscribe")
+    @catch_protocol_errors
+    async def api_events_subscribe(self, client_ctx, msg):
+        msg = events_subscribe_serializer.req_load(msg)
 
-        # Connect the new callbacks
-        client_ctx.event_bus_ctx.connect("pinged", _on_pinged)
-        client_ctx.event_bus_ctx.connect("realm.vlobs_updated", _on_realm_events)
-        client_ctx.event_bus_ctx.connect("realm.maintenance_started", _on_realm_events)
-        client_ctx.event_bus_ctx.connect("realm.maintenance_finished", _on_realm_events)
-        client_ctx.event_bus_ctx.connect("message.received", _on_message_received)
-        client_ctx.event_bus_ctx.connect("invite.status_changed", _on_invite_status_changed)
+        # Drop previous subscription if any
+        self.unsubscribe(client_ctx)
 
-        # Final event to keep up to date the list of realm we should listen on
-        client_ctx.event_bus_ctx.connect("realm.roles_updated", _on_roles_updated)
+        # Subscribe to the user events first to keep up to date the list
+        # of realm we should listen on
+        self._organization_clients[client_ctx.organization_id].add(client_ctx)
+        self._user_clients[(client_ctx.organization_id, client_ctx.user_id)].add(client_ctx)
 
         # Finally populate the list of realm we should listen on
         realms_for_user = await self._realm_component.get_realms_for_user(
             client_ctx.organization_id, client_ctx.user_id
         )
-        client_ctx.realms = set(realms_for_user.keys())
+        for realm_id in client_ctx.realms - realms_for_user.keys():
+            self._discard_realm(client_ctx, realm_id)
+        for realm_id in realms_for_user.keys():
+            self._add_realm(client_ctx, realm_id)
 
         return events_subscribe_serializer.rep_dump({"status": "ok"})
 
@@ -1,9 +1,10 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from uuid import UUID
+from typing import List, Tuple
 import attr
 
-from parsec.api.protocol import DeviceID, OrganizationID
+from parsec.api.protocol import DeviceID, OrganizationID, BLOCK_BATCH_MAX_BYTES
 from parsec.api.protocol import RealmRole
 from parsec.backend.realm import BaseRealmComponent, RealmNotFoundError
 from parsec.backend.blockstore import BaseBlockStoreComponent
@@ -13,6 +14,7 @@ from parsec.backend.block import (
     BlockAccessError,
     BlockNotFoundError,
     BlockInMaintenanceError,
+    BlockBatchTooLargeError,
 )
 
 
@@ -85,6 +87,46 @@ class MemoryBlockComponent(BaseBlockComponent):
         await self._blockstore_component.create(organization_id, block_id, block)
         self._blockmetas[(organization_id, block_id)] = BlockMeta(realm_id, len(block))
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        block_ids: List[UUID],
+    ) -> List[bytes]:
+        self._check_realm_read_access(organization_id, realm_id, author.user_id)
+
+        total_size = 0
+        for block_id in block_ids:
+            blockmeta = self._blockmetas.get((organization_id, block_id))
+            if not blockmeta or blockmeta.realm_id != realm_id:
+                raise BlockNotFoundError()
+            total_size += blockmeta.size
+        if total_size > BLOCK_BATCH_MAX_BYTES:
+            raise BlockBatchTooLargeError()
+
+        return await self._blockstore_component.read_many(organization_id, block_ids)
+
+    async def create_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        blocks: List[Tuple[UUID, bytes]],
+    ) -> None:
+        self._check_realm_write_access(organization_id, realm_id, author.user_id)
+
+        block_ids = {block_id for block_id, _ in blocks}
+        if len(block_ids) != len(blocks):
+            raise BlockAlreadyExistsError()
+        for block_id in block_ids:
+            if (organization_id, block_id) in self._blockmetas:
+                raise BlockAlreadyExistsError()
+
+        await self._blockstore_component.create_many(organization_id, blocks)
+        for block_id, block in blocks:
+            self._blockmetas[(organization_id, block_id)] = BlockMeta(realm_id, len(block))
+
 
 class MemoryBlockStoreComponent(BaseBlockStoreComponent):
     def __init__(self):
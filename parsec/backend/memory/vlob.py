@@ -65,11 +65,13 @@ class Reencryption:
     def is_finished(self):
         return not self._todo
 
-    def get_batch(self, size):
+    def get_batch(self, size, after=None):
         batch = []
-        for (vlob_id, version), data in self._todo.items():
+        for (vlob_id, version), data in sorted(self._todo.items()):
             if (vlob_id, version) in self._done:
                 continue
+            if after is not None and (vlob_id, version) <= after:
+                continue
             batch.append((vlob_id, version, data))
         return batch[:size]
 
@@ -338,6 +340,8 @@ class MemoryVlobComponent(BaseVlobComponent):
         realm_id: UUID,
         encryption_revision: int,
         size: int,
+        after_vlob_id: Optional[UUID] = None,
+        after_version: Optional[int] = None,
     ) -> List[Tuple[UUID, int, bytes]]:
         self._check_realm_in_maintenance_access(
             organization_id, realm_id, author.user_id, encryption_revision
@@ -346,7 +350,8 @@ class MemoryVlobComponent(BaseVlobComponent):
         changes = self._per_realm_changes[(organization_id, realm_id)]
         assert changes.reencryption
 
-        return changes.reencryption.get_batch(size)
+        after = (after_vlob_id, after_version) if after_vlob_id is not None else None
+        return changes.reencryption.get_batch(size, after)
 
     async def maintenance_save_reencryption_batch(
         self,
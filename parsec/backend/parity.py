@@ -0,0 +1,163 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+from sys import byteorder
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is only an optional speedup
+    numpy = None
+
+
+__all__ = ("xor_buffers", "ReedSolomonCodec")
+
+
+# XOR parity
+
+
+def _xor_buffers_numpy(buffers: Sequence[bytes]) -> bytes:
+    xored = numpy.frombuffer(buffers[0], dtype=numpy.uint8).copy()
+    for buff in buffers[1:]:
+        numpy.bitwise_xor(xored, numpy.frombuffer(buff, dtype=numpy.uint8), out=xored)
+    return xored.tobytes()
+
+
+def _xor_buffers_int(buffers: Sequence[bytes]) -> bytes:
+    # Python integers are a poor man's vector: the conversions and the
+    # XOR itself are done in C, a machine word at a time
+    xored = int.from_bytes(buffers[0], byteorder)
+    for buff in buffers[1:]:
+        xored ^= int.from_bytes(buff, byteorder)
+    return xored.to_bytes(len(buffers[0]), byteorder)
+
+
+def xor_buffers(*buffers: bytes) -> bytes:
+    buff_len = len(buffers[0])
+    assert all(len(buff) == buff_len for buff in buffers)
+    if len(buffers) == 1:
+        return bytes(buffers[0])
+    if numpy is not None:
+        return _xor_buffers_numpy(buffers)
+    return _xor_buffers_int(buffers)
+
+
+# Galois field GF(2^8) arithmetic, generated by the 0x11d polynomial
+
+
+_GF_EXP = [0] * 510
+_GF_LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    _GF_EXP[_power] = _GF_EXP[_power + 255] = _value
+    _GF_LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+del _value, _power
+
+
+def _gf_mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return _GF_EXP[_GF_LOG[a] + _GF_LOG[b]]
+
+
+def _gf_inv(a: int) -> int:
+    assert a != 0
+    return _GF_EXP[255 - _GF_LOG[a]]
+
+
+@lru_cache(maxsize=256)
+def _gf_mul_table(coef: int) -> bytes:
+    # Multiplying a whole buffer by a constant is then a single `bytes.translate`
+    return bytes(_gf_mul(coef, x) for x in range(256))
+
+
+def _gf_invert_matrix(matrix: List[List[int]]) -> List[List[int]]:
+    size = len(matrix)
+    # Gauss-Jordan elimination on [matrix | identity]
+    rows = [row[:] + [int(i == j) for j in range(size)] for i, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = next(i for i in range(col, size) if rows[i][col])
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        inv = _gf_inv(rows[col][col])
+        rows[col] = [_gf_mul(inv, x) for x in rows[col]]
+        for i in range(size):
+            factor = rows[i][col]
+            if i != col and factor:
+                rows[i] = [x ^ _gf_mul(factor, y) for x, y in zip(rows[i], rows[col])]
+    return [row[size:] for row in rows]
+
+
+def _gf_linear_combination(coefs: Sequence[int], buffers: Sequence[bytes]) -> bytes:
+    terms = []
+    for coef, buff in zip(coefs, buffers):
+        if coef == 1:
+            terms.append(buff)
+        elif coef:
+            terms.append(buff.translate(_gf_mul_table(coef)))
+    return xor_buffers(*terms)
+
+
+# Reed-Solomon erasure coding
+
+
+class ReedSolomonCodec:
+    """Systematic Reed-Solomon erasure code over GF(2^8).
+
+    `nb_data` chunks are stored as is, along with `nb_parity` parity chunks.
+    Any `nb_data` chunks out of the `nb_data + nb_parity` are enough to
+    rebuild the data. The parity chunks are generated from a Cauchy matrix,
+    so that any square submatrix of the encoding matrix is invertible.
+    With a single parity chunk, this is a plain XOR parity.
+    """
+
+    def __init__(self, nb_data: int, nb_parity: int):
+        if nb_data < 1 or nb_parity < 1 or nb_data + nb_parity > 256:
+            raise ValueError(f"Invalid Reed-Solomon layout ({nb_data} data, {nb_parity} parity)")
+        self.nb_data = nb_data
+        self.nb_parity = nb_parity
+        if nb_parity == 1:
+            self._parity_matrix = [[1] * nb_data]
+        else:
+            self._parity_matrix = [
+                [_gf_inv((nb_data + j) ^ i) for i in range(nb_data)] for j in range(nb_parity)
+            ]
+
+    def _encoding_row(self, index: int) -> List[int]:
+        if index < self.nb_data:
+            return [int(i == index) for i in range(self.nb_data)]
+        return self._parity_matrix[index - self.nb_data]
+
+    def encode(self, chunks: Sequence[bytes]) -> List[bytes]:
+        """Return the parity chunks of the given data chunks."""
+        assert len(chunks) == self.nb_data
+        return [_gf_linear_combination(row, chunks) for row in self._parity_matrix]
+
+    def rebuild(self, chunks: Sequence[Optional[bytes]]) -> List[bytes]:
+        """Return the data chunks given the data and parity chunks, missing ones being `None`.
+
+        Raises:
+            ValueError: if less than `nb_data` chunks are available
+        """
+        assert len(chunks) == self.nb_data + self.nb_parity
+        missing = [index for index in range(self.nb_data) if chunks[index] is None]
+        if not missing:
+            return list(chunks[: self.nb_data])
+
+        available = [index for index, chunk in enumerate(chunks) if chunk is not None]
+        if len(available) < self.nb_data:
+            raise ValueError(
+                f"Cannot rebuild data: only {len(available)} out of {self.nb_data} chunks"
+            )
+        # Favor the data chunks, they need no computation
+        available = available[: self.nb_data]
+        decoding_matrix = _gf_invert_matrix([self._encoding_row(index) for index in available])
+        available_chunks = [chunks[index] for index in available]
+
+        data = list(chunks[: self.nb_data])
+        for index in missing:
+            data[index] = _gf_linear_combination(decoding_matrix[index], available_chunks)
+        return data
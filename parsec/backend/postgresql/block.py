@@ -2,10 +2,11 @@
 
 from triopg.exceptions import UniqueViolationError
 from uuid import UUID
+from typing import List, Tuple
 import pendulum
 from pypika import Parameter
 
-from parsec.api.protocol import DeviceID, OrganizationID
+from parsec.api.protocol import DeviceID, OrganizationID, BLOCK_BATCH_MAX_BYTES
 from parsec.backend.vlob import BaseVlobComponent
 from parsec.backend.blockstore import BaseBlockStoreComponent
 from parsec.backend.block import (
@@ -15,6 +16,7 @@ from parsec.backend.block import (
     BlockNotFoundError,
     BlockAccessError,
     BlockInMaintenanceError,
+    BlockBatchTooLargeError,
 )
 from parsec.backend.postgresql.handler import PGHandler
 from parsec.backend.postgresql.utils import Query, fn_exists
@@ -77,6 +79,71 @@ _q_insert_block = (
 )
 
 
+# Realm status, access right and blocks metadata for a whole batch in a single query
+_q_get_batch_read_meta = """
+SELECT
+    realm.maintenance_type,
+    ({}),
+    ARRAY(
+        SELECT block.block_id
+        FROM block
+        WHERE
+            block.realm = realm._id
+            AND block.block_id = ANY($4::UUID[])
+            AND block.deleted_on IS NULL
+    ),
+    (
+        SELECT COALESCE(SUM(block.size), 0)
+        FROM block
+        WHERE
+            block.realm = realm._id
+            AND block.block_id = ANY($4::UUID[])
+            AND block.deleted_on IS NULL
+    )
+FROM realm
+WHERE realm._id = ({})
+""".format(
+    q_user_can_read_vlob(
+        user=q_user_internal_id(organization_id=Parameter("$1"), user_id=Parameter("$3")),
+        realm=q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2")),
+    ),
+    q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2")),
+)
+
+
+_q_get_batch_create_meta = """
+SELECT
+    realm.maintenance_type,
+    ({}),
+    ARRAY(
+        SELECT block.block_id
+        FROM block
+        WHERE
+            block.organization = realm.organization
+            AND block.block_id = ANY($4::UUID[])
+    )
+FROM realm
+WHERE realm._id = ({})
+""".format(
+    q_user_can_write_vlob(
+        user=q_user_internal_id(organization_id=Parameter("$1"), user_id=Parameter("$3")),
+        realm=q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2")),
+    ),
+    q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2")),
+)
+
+
+_q_insert_block_batch = """
+INSERT INTO block (organization, block_id, realm, author, size, created_on)
+SELECT ({}), batch.block_id, ({}), ({}), batch.size, $6
+FROM UNNEST($4::UUID[], $5::INTEGER[]) AS batch(block_id, size)
+""".format(
+    q_organization_internal_id(Parameter("$1")),
+    q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2")),
+    q_device_internal_id(organization_id=Parameter("$1"), device_id=Parameter("$3")),
+)
+
+
 async def _check_realm(conn, organization_id, realm_id):
     try:
         rep = await get_realm_status(conn, organization_id, realm_id)
@@ -167,6 +234,83 @@ class PGBlockComponent(BaseBlockComponent):
             if ret != "INSERT 0 1":
                 raise BlockError(f"Insertion error: {ret}")
 
+    async def read_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        block_ids: List[UUID],
+    ) -> List[bytes]:
+        async with self.dbh.pool.acquire() as conn:
+            ret = await conn.fetchrow(
+                _q_get_batch_read_meta, organization_id, realm_id, author.user_id, block_ids
+            )
+
+        if not ret:
+            raise BlockNotFoundError(f"Realm `{realm_id}` doesn't exist")
+
+        maintenance_type, can_read, existing_block_ids, total_size = ret
+        if maintenance_type:
+            raise BlockInMaintenanceError("Data realm is currently under maintenance")
+
+        elif not can_read:
+            raise BlockAccessError()
+
+        elif not set(block_ids).issubset(existing_block_ids):
+            raise BlockNotFoundError()
+
+        elif total_size > BLOCK_BATCH_MAX_BYTES:
+            raise BlockBatchTooLargeError()
+
+        return await self._blockstore_component.read_many(organization_id, block_ids)
+
+    async def create_batch(
+        self,
+        organization_id: OrganizationID,
+        author: DeviceID,
+        realm_id: UUID,
+        blocks: List[Tuple[UUID, bytes]],
+    ) -> None:
+        block_ids = [block_id for block_id, _ in blocks]
+        if len(set(block_ids)) != len(block_ids):
+            raise BlockAlreadyExistsError()
+
+        async with self.dbh.pool.acquire() as conn, conn.transaction():
+            # 1) Check realm status, access rights and blocks unicity
+            ret = await conn.fetchrow(
+                _q_get_batch_create_meta, organization_id, realm_id, author.user_id, block_ids
+            )
+
+            if not ret:
+                raise BlockNotFoundError(f"Realm `{realm_id}` doesn't exist")
+
+            maintenance_type, can_write, existing_block_ids = ret
+            if maintenance_type:
+                raise BlockInMaintenanceError("Data realm is currently under maintenance")
+
+            elif not can_write:
+                raise BlockAccessError()
+
+            elif existing_block_ids:
+                raise BlockAlreadyExistsError()
+
+            # 2) Upload blocks data in blockstore (see `create` about idempotency)
+            await self._blockstore_component.create_many(organization_id, blocks)
+
+            # 3) Insert all the blocks metadata with a single query
+            ret = await conn.execute(
+                _q_insert_block_batch,
+                organization_id,
+                realm_id,
+                author,
+                block_ids,
+                [len(block) for _, block in blocks],
+                pendulum.now(),
+            )
+
+            if ret != f"INSERT 0 {len(blocks)}":
+                raise BlockError(f"Insertion error: {ret}")
+
 
 _q_get_block_data = (
     Query.from_(t_block_data)
@@ -35,6 +35,11 @@ async def components_factory(config: BackendConfig, event_bus: EventBus):
 
     async with trio.open_service_nursery() as nursery:
         await dbh.init(nursery)
+        if config.organization_stats_reconciliation_period:
+            nursery.start_soon(
+                organization.run_stats_reconciliation,
+                config.organization_stats_reconciliation_period,
+            )
         try:
             yield {
                 "user": user,
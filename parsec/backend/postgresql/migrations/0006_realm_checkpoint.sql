@@ -0,0 +1,15 @@
+-- Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+
+-------------------------------------------------------
+--  Migration
+-------------------------------------------------------
+
+-- Last index allocated in realm_vlob_update, incremented atomically by the
+-- writers instead of computing `MAX(index) + 1` (which lets concurrent
+-- writers pick the same index and retry on the unique constraint)
+ALTER TABLE realm ADD checkpoint INTEGER NOT NULL DEFAULT 0;
+UPDATE realm SET checkpoint = COALESCE(
+    (SELECT MAX(index) FROM realm_vlob_update WHERE realm_vlob_update.realm = realm._id),
+    0
+);
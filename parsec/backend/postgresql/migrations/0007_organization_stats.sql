@@ -0,0 +1,79 @@
+-- Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+
+-------------------------------------------------------
+--  Organization stats
+-------------------------------------------------------
+
+-- Counters maintained by triggers on insert, so the stats are read without
+-- scanning the user_/vlob_atom/block tables. Each organization has several
+-- rows (picked from the transaction id) so concurrent writers rarely wait on
+-- the same row, the stats are the sum of those rows.
+CREATE TABLE organization_stats (
+    _id SERIAL PRIMARY KEY,
+    organization INTEGER REFERENCES organization (_id) NOT NULL,
+    shard INTEGER NOT NULL,
+    users BIGINT NOT NULL DEFAULT 0,
+    metadata_size BIGINT NOT NULL DEFAULT 0,
+    data_size BIGINT NOT NULL DEFAULT 0,
+
+    UNIQUE(organization, shard)
+);
+
+
+CREATE FUNCTION organization_stats_add(
+    _organization INTEGER, _users BIGINT, _metadata_size BIGINT, _data_size BIGINT
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO organization_stats (organization, shard, users, metadata_size, data_size)
+    VALUES (_organization, (txid_current() % 16)::INTEGER, _users, _metadata_size, _data_size)
+    ON CONFLICT (organization, shard) DO UPDATE SET
+        users = organization_stats.users + EXCLUDED.users,
+        metadata_size = organization_stats.metadata_size + EXCLUDED.metadata_size,
+        data_size = organization_stats.data_size + EXCLUDED.data_size;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE FUNCTION organization_stats_on_user_insert() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM organization_stats_add(NEW.organization, 1, 0, 0);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER organization_stats_user AFTER INSERT ON user_
+FOR EACH ROW EXECUTE PROCEDURE organization_stats_on_user_insert();
+
+
+CREATE FUNCTION organization_stats_on_vlob_atom_insert() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM organization_stats_add(NEW.organization, 0, NEW.size, 0);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER organization_stats_vlob_atom AFTER INSERT ON vlob_atom
+FOR EACH ROW EXECUTE PROCEDURE organization_stats_on_vlob_atom_insert();
+
+
+CREATE FUNCTION organization_stats_on_block_insert() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM organization_stats_add(NEW.organization, 0, 0, NEW.size);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER organization_stats_block AFTER INSERT ON block
+FOR EACH ROW EXECUTE PROCEDURE organization_stats_on_block_insert();
+
+
+-- Initialize the counters with the existing data
+INSERT INTO organization_stats (organization, shard, users, metadata_size, data_size)
+SELECT
+    organization._id,
+    0,
+    (SELECT COUNT(*) FROM user_ WHERE user_.organization = organization._id),
+    (SELECT COALESCE(SUM(size), 0) FROM vlob_atom WHERE vlob_atom.organization = organization._id),
+    (SELECT COALESCE(SUM(size), 0) FROM block WHERE block.organization = organization._id)
+FROM organization;
@@ -0,0 +1,12 @@
+-- Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+
+-------------------------------------------------------
+--  Reencryption progress
+-------------------------------------------------------
+
+-- Progress of the reencryption into this revision, maintained by each saved
+-- batch instead of counting the vlob atoms of both revisions every time.
+-- NULL until the first batch is saved.
+ALTER TABLE vlob_encryption_revision ADD reencryption_total INTEGER;
+ALTER TABLE vlob_encryption_revision ADD reencryption_done INTEGER;
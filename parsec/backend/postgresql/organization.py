@@ -1,6 +1,8 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import trio
 from typing import Optional
+from structlog import get_logger
 
 from pendulum import Pendulum
 from triopg import UniqueViolationError
@@ -33,6 +35,12 @@ from parsec.backend.postgresql.tables import (
 from parsec.backend.postgresql.user_queries.create import _create_user
 
 
+logger = get_logger()
+
+# Arbitrary key of the advisory lock preventing concurrent reconciliations
+# (several backends may be running on the same database)
+_STATS_RECONCILIATION_LOCK_KEY = 0x5354415453
+
 _q_insert_organization = (
     (
         Query.into(t_organization)
@@ -69,7 +77,29 @@ _q_bootstrap_organization = (
 )
 
 
-_q_get_stats = Query.select(
+_q_get_organizations = Query.from_(t_organization).select("organization_id").get_sql()
+
+
+# Counters maintained by the triggers (see migration 0007)
+_q_get_stats = """
+SELECT
+    COALESCE(SUM(users), 0) AS users,
+    COALESCE(SUM(metadata_size), 0) AS metadata_size,
+    COALESCE(SUM(data_size), 0) AS data_size
+FROM organization_stats
+WHERE organization = ({})
+""".format(
+    q_organization_internal_id(Parameter("$1"))
+)
+
+
+_q_add_stats = "SELECT organization_stats_add(({}), $2, $3, $4)".format(
+    q_organization_internal_id(Parameter("$1"))
+)
+
+
+# Full computation, only used to correct the drift of the counters
+_q_compute_stats = Query.select(
     Query.from_(t_user)
     .where(t_user.organization == q_organization_internal_id(Parameter("$1")))
     .select(fn.Count("*"))
@@ -85,6 +115,18 @@ _q_get_stats = Query.select(
 ).get_sql()
 
 
+# Both computed from the same statement, hence from the same snapshot
+_q_get_stats_drift = """
+SELECT
+    expected.users - counted.users AS users,
+    expected.metadata_size - counted.metadata_size AS metadata_size,
+    expected.data_size - counted.data_size AS data_size
+FROM ({}) AS expected, ({}) AS counted
+""".format(
+    _q_compute_stats, _q_get_stats
+)
+
+
 _q_update_organisation_expiration_date = (
     Query.update(t_organization)
     .where((t_organization.organization_id == Parameter("$1")))
@@ -169,6 +211,59 @@ class PGOrganizationComponent(BaseOrganizationComponent):
             metadata_size=result["metadata_size"],
         )
 
+    async def reconcile_stats(self, id: OrganizationID) -> OrganizationStats:
+        """
+        Correct the stats counters with a full computation of the stats.
+
+        Returns: the drift that has been corrected
+
+        Raises:
+            OrganizationNotFoundError
+        """
+        async with self.dbh.pool.acquire() as conn, conn.transaction():
+            # Released at the end of the transaction, even if the connection
+            # goes back to the pool in a bad state
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", _STATS_RECONCILIATION_LOCK_KEY)
+            await self._get(conn, id)  # Check organization exists
+
+            # Counters are updated in the same transaction than the data,
+            # so both are consistent when read from the same snapshot
+            result = await conn.fetchrow(_q_get_stats_drift, id)
+            drift = OrganizationStats(
+                users=result["users"],
+                data_size=result["data_size"],
+                metadata_size=result["metadata_size"],
+            )
+
+            # The correction is added to the counters, hence it doesn't
+            # matter if other writes occurred since the snapshot
+            if drift != OrganizationStats(users=0, data_size=0, metadata_size=0):
+                logger.warning("Organization stats drift", organization_id=id, drift=drift)
+                await conn.execute(
+                    _q_add_stats, id, drift.users, drift.metadata_size, drift.data_size
+                )
+
+        return drift
+
+    async def run_stats_reconciliation(self, period: float) -> None:
+        while True:
+            await trio.sleep(period)
+            # A failure must not prevent the other organizations, nor the
+            # next periods, from being reconciled
+            try:
+                async with self.dbh.pool.acquire() as conn:
+                    rows = await conn.fetch(_q_get_organizations)
+            except Exception:
+                logger.exception("Organization stats reconciliation failed")
+                continue
+            for id in (row["organization_id"] for row in rows):
+                try:
+                    await self.reconcile_stats(id)
+                except OrganizationNotFoundError:
+                    pass
+                except Exception:
+                    logger.exception("Organization stats reconciliation failed", organization_id=id)
+
     async def set_expiration_date(
         self, id: OrganizationID, expiration_date: Pendulum = None
     ) -> None:
@@ -112,18 +112,24 @@ async def _check_realm_and_read_access(
 async def _vlob_updated(
     conn, vlob_atom_internal_id, organization_id, author, realm_id, src_id, src_version=1
 ):
+    # Incrementing the realm's checkpoint locks the realm row until the end of
+    # the transaction, so concurrent writers get their index one after another
+    # (and commit them in order) instead of conflicting on the unique constraint
     query = """
+WITH cte_realm AS (
+    UPDATE realm
+    SET checkpoint = checkpoint + 1
+    WHERE _id = ({q_realm})
+    RETURNING _id, checkpoint
+)
 INSERT INTO realm_vlob_update (
 realm, index, vlob_atom
 )
 SELECT
-({q_realm}),
-(
-    SELECT COALESCE(MAX(index) + 1, 1)
-    FROM realm_vlob_update
-    WHERE realm = ({q_realm})
-),
+_id,
+checkpoint,
 $3
+FROM cte_realm
 RETURNING index
 """.format(
         q_realm=q_realm_internal_id(organization_id=Parameter("$1"), realm_id=Parameter("$2"))
@@ -164,6 +170,102 @@ LIMIT 1
     return realm_id
 
 
+_q_lock_reencryption_progress = """
+SELECT reencryption_total, reencryption_done
+FROM vlob_encryption_revision
+WHERE _id = ({})
+FOR UPDATE
+""".format(
+    q_vlob_encryption_revision_internal_id(
+        organization_id=Parameter("$1"),
+        realm_id=Parameter("$2"),
+        encryption_revision=Parameter("$3"),
+    )
+)
+
+
+_q_update_reencryption_progress = """
+UPDATE vlob_encryption_revision
+SET reencryption_total = $4, reencryption_done = $5
+WHERE _id = ({})
+""".format(
+    q_vlob_encryption_revision_internal_id(
+        organization_id=Parameter("$1"),
+        realm_id=Parameter("$2"),
+        encryption_revision=Parameter("$3"),
+    )
+)
+
+
+_q_count_reencryption_progress = """
+SELECT (
+    SELECT COUNT(*)
+    FROM vlob_atom
+    WHERE vlob_encryption_revision = ({})
+),
+(
+    SELECT COUNT(*)
+    FROM vlob_atom
+    WHERE vlob_encryption_revision = ({})
+)
+""".format(
+    q_vlob_encryption_revision_internal_id(
+        organization_id=Parameter("$1"),
+        realm_id=Parameter("$2"),
+        encryption_revision=Parameter("$3") - 1,
+    ),
+    q_vlob_encryption_revision_internal_id(
+        organization_id=Parameter("$1"),
+        realm_id=Parameter("$2"),
+        encryption_revision=Parameter("$3"),
+    ),
+)
+
+
+_q_insert_reencryption_batch = """
+INSERT INTO vlob_atom(
+    organization,
+    vlob_encryption_revision,
+    vlob_id,
+    version,
+    blob,
+    size,
+    author,
+    created_on,
+    deleted_on
+)
+SELECT
+    vlob_atom.organization,
+    ({}),
+    batch.vlob_id,
+    batch.version,
+    batch.blob,
+    batch.size,
+    vlob_atom.author,
+    vlob_atom.created_on,
+    vlob_atom.deleted_on
+FROM UNNEST($4::UUID[], $5::INTEGER[], $6::BYTEA[], $7::INTEGER[])
+    AS batch(vlob_id, version, blob, size)
+INNER JOIN vlob_atom
+ON
+    vlob_atom.vlob_encryption_revision = ({})
+    AND vlob_atom.vlob_id = batch.vlob_id
+    AND vlob_atom.version = batch.version
+ON CONFLICT DO NOTHING
+""".format(
+    q_vlob_encryption_revision_internal_id(
+        organization_id=Parameter("$1"),
+        realm_id=Parameter("$2"),
+        encryption_revision=Parameter("$3"),
+    ),
+    q_vlob_encryption_revision_internal_id(
+        organization_id=Parameter("$1"),
+        realm_id=Parameter("$2"),
+        encryption_revision=Parameter("$3") - 1,
+    ),
+)
+
+
 class PGVlobComponent(BaseVlobComponent):
     def __init__(self, dbh: PGHandler):
         self.dbh = dbh
@@ -551,6 +653,8 @@ ORDER BY version DESC
         realm_id: UUID,
         encryption_revision: int,
         size: int,
+        after_vlob_id: Optional[UUID] = None,
+        after_version: Optional[int] = None,
     ) -> List[Tuple[UUID, int, bytes]]:
         async with self.dbh.pool.acquire() as conn, conn.transaction():
 
@@ -562,7 +666,9 @@ ORDER BY version DESC
 WITH cte_to_encrypt AS (
     SELECT vlob_id, version, blob
     FROM vlob_atom
-    WHERE vlob_encryption_revision = ({})
+    WHERE
+        vlob_encryption_revision = ({})
+        AND ($5::UUID IS NULL OR (vlob_id, version) > ($5::UUID, $6::INTEGER))
 ),
 cte_encrypted AS (
     SELECT vlob_id, version
@@ -577,6 +683,7 @@ FROM cte_to_encrypt
 LEFT JOIN cte_encrypted
 ON cte_to_encrypt.vlob_id = cte_encrypted.vlob_id AND cte_to_encrypt.version = cte_encrypted.version
 WHERE cte_encrypted.vlob_id IS NULL
+ORDER BY cte_to_encrypt.vlob_id, cte_to_encrypt.version
 LIMIT $4
 """.format(
                 q_vlob_encryption_revision_internal_id(
@@ -591,7 +698,15 @@ LIMIT $4
                 ),
             )
 
-            rep = await conn.fetch(query, organization_id, realm_id, encryption_revision, size)
+            rep = await conn.fetch(
+                query,
+                organization_id,
+                realm_id,
+                encryption_revision,
+                size,
+                after_vlob_id,
+                after_version,
+            )
             return [(row["vlob_id"], row["version"], row["blob"]) for row in rep]
 
     async def maintenance_save_reencryption_batch(
@@ -607,79 +722,40 @@ LIMIT $4
             await _check_realm_and_maintenance_access(
                 conn, organization_id, author, realm_id, encryption_revision
             )
-            for vlob_id, version, blob in batch:
-                query = """
-INSERT INTO vlob_atom(
-    organization,
-    vlob_encryption_revision,
-    vlob_id,
-    version,
-    blob,
-    size,
-    author,
-    created_on,
-    deleted_on
-)
-SELECT
-    organization,
-    ({}),
-    $3,
-    $4,
-    $6,
-    $7,
-    author,
-    created_on,
-    deleted_on
-FROM vlob_atom
-WHERE
-    organization = ({})
-    AND vlob_id = $3
-    AND version = $4
-ON CONFLICT DO NOTHING
-""".format(
-                    q_vlob_encryption_revision_internal_id(
-                        organization_id=Parameter("$1"),
-                        realm_id=Parameter("$2"),
-                        encryption_revision=Parameter("$5"),
-                    ),
-                    q_organization_internal_id(Parameter("$1")),
-                )
-
-                await conn.execute(
-                    query,
-                    organization_id,
-                    realm_id,
-                    vlob_id,
-                    version,
-                    encryption_revision,
-                    blob,
-                    len(blob),
-                )
+            # Lock the progress counters, so concurrent batches are counted one after another
+            progress = await conn.fetchrow(
+                _q_lock_reencryption_progress, organization_id, realm_id, encryption_revision
+            )
 
-            query = """
-SELECT (
-    SELECT COUNT(*)
-    FROM vlob_atom
-    WHERE vlob_encryption_revision = ({})
-),
-(
-    SELECT COUNT(*)
-    FROM vlob_atom
-    WHERE vlob_encryption_revision = ({})
-)
-""".format(
-                q_vlob_encryption_revision_internal_id(
-                    organization_id=Parameter("$1"),
-                    realm_id=Parameter("$2"),
-                    encryption_revision=Parameter("$3") - 1,
-                ),
-                q_vlob_encryption_revision_internal_id(
-                    organization_id=Parameter("$1"),
-                    realm_id=Parameter("$2"),
-                    encryption_revision=Parameter("$3"),
-                ),
+            result = await conn.execute(
+                _q_insert_reencryption_batch,
+                organization_id,
+                realm_id,
+                encryption_revision,
+                [vlob_id for vlob_id, _, _ in batch],
+                [version for _, version, _ in batch],
+                [blob for _, _, blob in batch],
+                [len(blob) for _, _, blob in batch],
             )
+            # Already reencrypted vlob atoms are not inserted, hence not counted
+            inserted = int(result.split()[-1])
 
-            rep = await conn.fetchrow(query, organization_id, realm_id, encryption_revision)
+            if progress["reencryption_total"] is None:
+                # First batch of the reencryption, initialize the counters
+                total, done = await conn.fetchrow(
+                    _q_count_reencryption_progress, organization_id, realm_id, encryption_revision
+                )
+            else:
+                total = progress["reencryption_total"]
+                done = progress["reencryption_done"] + inserted
+
+            await conn.execute(
+                _q_update_reencryption_progress,
+                organization_id,
+                realm_id,
+                encryption_revision,
+                total,
+                done,
+            )
 
-            return rep[0], rep[1]
+            return total, done
@@ -4,26 +4,17 @@ import trio
 from uuid import UUID
 import struct
 from structlog import get_logger
-from sys import byteorder
 from typing import List, Optional
 
 from parsec.api.protocol import OrganizationID
 from parsec.backend.blockstore import BaseBlockStoreComponent
+from parsec.backend.parity import xor_buffers
 from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
 
 
 logger = get_logger()
 
 
-def _xor_buffers(*buffers):
-    buff_len = len(buffers[0])
-    xored = int.from_bytes(buffers[0], byteorder)
-    for buff in buffers[1:]:
-        assert len(buff) == buff_len
-        xored ^= int.from_bytes(buff, byteorder)
-    return xored.to_bytes(buff_len, byteorder)
-
-
 def split_block_in_chunks(block: bytes, nb_chunks: int) -> List[bytes]:
     payload_size = len(block) + 4  # encode block len as a uint32
     chunk_len = payload_size // nb_chunks
@@ -37,7 +28,7 @@ def split_block_in_chunks(block: bytes, nb_chunks: int) -> List[bytes]:
 
 
 def generate_checksum_chunk(chunks: List[bytes]) -> bytes:
-    return _xor_buffers(*chunks)
+    return xor_buffers(*chunks)
 
 
 def rebuild_block_from_chunks(chunks: List[Optional[bytes]], checksum_chunk: bytes) -> bytes:
@@ -46,7 +37,7 @@ def rebuild_block_from_chunks(chunks: List[Optional[bytes]], checksum_chunk: byt
     try:
         missing_chunk_id = next(index for index, chunk in enumerate(chunks) if chunk is None)
         assert checksum_chunk is not None
-        chunks[missing_chunk_id] = _xor_buffers(*valid_chunks, checksum_chunk)
+        chunks[missing_chunk_id] = xor_buffers(*valid_chunks, checksum_chunk)
     except StopIteration:
         pass
 
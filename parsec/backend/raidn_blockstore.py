@@ -0,0 +1,118 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import trio
+import struct
+from uuid import UUID
+from structlog import get_logger
+
+from parsec.api.protocol import OrganizationID
+from parsec.backend.blockstore import BaseBlockStoreComponent
+from parsec.backend.parity import ReedSolomonCodec
+from parsec.backend.raid5_blockstore import split_block_in_chunks
+from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
+
+
+logger = get_logger()
+
+
+class RAIDNBlockStoreComponent(BaseBlockStoreComponent):
+    """Generalization of RAID5 with `nb_parity` parity blockstores.
+
+    A block is split into `len(blockstores) - nb_parity` data chunks stored
+    along with `nb_parity` Reed-Solomon parity chunks (the parity blockstores
+    being the last ones), so up to `nb_parity` blockstores can fail.
+    """
+
+    def __init__(self, blockstores, nb_parity: int):
+        self.blockstores = blockstores
+        self.nb_parity = nb_parity
+        self.codec = ReedSolomonCodec(len(blockstores) - nb_parity, nb_parity)
+
+    async def read(self, organization_id: OrganizationID, id: UUID) -> bytes:
+        nb_data = self.codec.nb_data
+        fetch_results = [None] * len(self.blockstores)
+        # Parity chunks are only fetched to replace the unreachable data chunks
+        next_parity_index = nb_data
+        timeout_count = 0
+
+        async def _partial_blockstore_read(nursery, blockstore_index):
+            nonlocal timeout_count
+            nonlocal next_parity_index
+            try:
+                fetch_results[blockstore_index] = await self.blockstores[blockstore_index].read(
+                    organization_id, id
+                )
+
+            except BlockNotFoundError as exc:
+                # We don't know yet if this id doesn't exists globally or only in this blockstore...
+                fetch_results[blockstore_index] = exc
+
+            except BlockTimeoutError as exc:
+                fetch_results[blockstore_index] = exc
+                timeout_count += 1
+                logger.warning(
+                    f"Cannot reach RAIDN blockstore #{blockstore_index} to read block {id}",
+                    exc_info=exc,
+                )
+                if timeout_count > self.nb_parity:
+                    nursery.cancel_scope.cancel()
+                else:
+                    nursery.start_soon(_partial_blockstore_read, nursery, next_parity_index)
+                    next_parity_index += 1
+
+        async with trio.open_service_nursery() as nursery:
+            for blockstore_index in range(nb_data):
+                nursery.start_soon(_partial_blockstore_read, nursery, blockstore_index)
+
+        if timeout_count > self.nb_parity:
+            logger.error(
+                f"Block {id} cannot be read: Too many failing blockstores in the RAIDN cluster"
+            )
+            raise BlockTimeoutError(
+                f"More than {self.nb_parity} blockstores have failed in the RAIDN cluster"
+            )
+
+        for result in fetch_results:
+            if isinstance(result, BlockNotFoundError):
+                raise result
+
+        chunks = [res if isinstance(res, (bytes, bytearray)) else None for res in fetch_results]
+        payload = b"".join(self.codec.rebuild(chunks))
+        block_len, = struct.unpack("!I", payload[:4])
+        return payload[4 : 4 + block_len]
+
+    async def create(self, organization_id: OrganizationID, id: UUID, block: bytes) -> None:
+        chunks = split_block_in_chunks(block, self.codec.nb_data)
+        chunks += self.codec.encode(chunks)
+
+        # Actually do the upload
+        error_count = 0
+
+        async def _subblockstore_create(nursery, blockstore_index, chunk):
+            nonlocal error_count
+            try:
+                await self.blockstores[blockstore_index].create(organization_id, id, chunk)
+            except BlockAlreadyExistsError:
+                # Previous attempt might have partially succeeded (see RAID5)
+                pass
+            except BlockTimeoutError as exc:
+                error_count += 1
+                logger.warning(
+                    f"Cannot reach RAIDN blockstore #{blockstore_index} to create block {id}",
+                    exc_info=exc,
+                )
+                if error_count > self.nb_parity:
+                    # Early exit
+                    nursery.cancel_scope.cancel()
+
+        async with trio.open_service_nursery() as nursery:
+            for i, chunk in enumerate(chunks):
+                nursery.start_soon(_subblockstore_create, nursery, i, chunk)
+
+        if error_count > self.nb_parity:
+            logger.error(
+                f"Block {id} cannot be created: Too many failing blockstores in the RAIDN cluster"
+            )
+            raise BlockTimeoutError(
+                f"More than {self.nb_parity} blockstores have failed in the RAIDN cluster"
+            )
@@ -2,9 +2,11 @@
 
 import trio
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import (
     ClientError as S3ClientError,
     EndpointConnectionError as S3EndpointConnectionError,
+    ReadTimeoutError as S3ReadTimeoutError,
 )
 from uuid import UUID
 from functools import partial
@@ -14,8 +16,31 @@ from parsec.backend.blockstore import BaseBlockStoreComponent
 from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
 
 
+# Maximum number of concurrent S3 requests (i.e. size of the HTTP connection pool)
+DEFAULT_MAX_CONNECTIONS = 16
+# Time (in seconds) allowed for a single read or create operation
+DEFAULT_OPERATION_TIMEOUT = 30
+
+
+def _add_if_none_match_header(request, **kwargs):
+    # Turn PUT into a conditional create: the server answers with
+    # `412 Precondition Failed` if the object already exists.
+    # S3 implementations that don't support it simply overwrite the object
+    # which is fine given blockstores must be idempotent.
+    request.headers["If-None-Match"] = "*"
+
+
 class S3BlockStoreComponent(BaseBlockStoreComponent):
-    def __init__(self, s3_region, s3_bucket, s3_key, s3_secret, s3_endpoint_url=None):
+    def __init__(
+        self,
+        s3_region,
+        s3_bucket,
+        s3_key,
+        s3_secret,
+        s3_endpoint_url=None,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        operation_timeout=DEFAULT_OPERATION_TIMEOUT,
+    ):
         self._s3 = None
         self._s3_bucket = None
         self._s3 = boto3.client(
@@ -24,45 +49,66 @@ class S3BlockStoreComponent(BaseBlockStoreComponent):
             aws_access_key_id=s3_key,
             aws_secret_access_key=s3_secret,
             endpoint_url=s3_endpoint_url,
+            config=BotoConfig(
+                max_pool_connections=max_connections,
+                connect_timeout=operation_timeout,
+                read_timeout=operation_timeout,
+            ),
         )
+        self._s3.meta.events.register("before-sign.s3.PutObject", _add_if_none_match_header)
         self._s3_bucket = s3_bucket
         self._s3.head_bucket(Bucket=s3_bucket)
+        # boto3 is blocking, so each request runs in a worker thread. The limiter
+        # makes sure we never have more threads than available pooled connections.
+        self._limiter = trio.CapacityLimiter(max_connections)
+        self._operation_timeout = operation_timeout
+
+    async def _run_in_thread(self, fn, *args, **kwargs):
+        """
+        Raises:
+            BlockTimeoutError
+            S3ClientError
+            S3EndpointConnectionError
+        """
+        with trio.move_on_after(self._operation_timeout):
+            return await trio.to_thread.run_sync(
+                partial(fn, *args, **kwargs), cancellable=True, limiter=self._limiter
+            )
+        raise BlockTimeoutError()
+
+    def _get_object(self, slug: str) -> bytes:
+        obj = self._s3.get_object(Bucket=self._s3_bucket, Key=slug)
+        # Consuming the body is also network I/O, hence done in the worker thread
+        return obj["Body"].read()
 
     async def read(self, organization_id: OrganizationID, id: UUID) -> bytes:
         slug = f"{organization_id}/{id}"
         try:
-            obj = self._s3.get_object(Bucket=self._s3_bucket, Key=slug)
+            return await self._run_in_thread(self._get_object, slug)
 
         except S3ClientError as exc:
-            if exc.response["Error"]["Code"] == "404":
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey"):
                 raise BlockNotFoundError() from exc
 
             else:
                 raise BlockTimeoutError() from exc
 
-        except S3EndpointConnectionError as exc:
+        except (S3EndpointConnectionError, S3ReadTimeoutError) as exc:
             raise BlockTimeoutError() from exc
 
-        return obj["Body"].read()
-
     async def create(self, organization_id: OrganizationID, id: UUID, block: bytes) -> None:
         slug = f"{organization_id}/{id}"
         try:
-            await trio.to_thread.run_sync(
-                partial(self._s3.head_object, Bucket=self._s3_bucket, Key=slug)
+            await self._run_in_thread(
+                self._s3.put_object, Bucket=self._s3_bucket, Key=slug, Body=block
             )
+
         except S3ClientError as exc:
-            if exc.response["Error"]["Code"] == "404":
-                try:
-                    await trio.to_thread.run_sync(
-                        partial(self._s3.put_object, Bucket=self._s3_bucket, Key=slug, Body=block)
-                    )
-                except (S3ClientError, S3EndpointConnectionError) as exc:
-                    raise BlockTimeoutError() from exc
+            if exc.response["Error"]["Code"] in ("412", "PreconditionFailed"):
+                raise BlockAlreadyExistsError() from exc
+
             else:
                 raise BlockTimeoutError() from exc
 
-        except S3EndpointConnectionError as exc:
+        except (S3EndpointConnectionError, S3ReadTimeoutError) as exc:
             raise BlockTimeoutError() from exc
-        else:
-            raise BlockAlreadyExistsError()
@@ -1,6 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import trio
+import threading
 from unittest.mock import Mock
 import pbr.version
 from uuid import UUID
@@ -28,20 +29,65 @@ from parsec.backend.blockstore import BaseBlockStoreComponent
 from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
 
 
+# Maximum number of concurrent Swift requests (i.e. number of opened connections)
+DEFAULT_MAX_CONNECTIONS = 16
+# Time (in seconds) allowed for a single read or create operation
+DEFAULT_OPERATION_TIMEOUT = 30
+
+
 class SwiftBlockStoreComponent(BaseBlockStoreComponent):
-    def __init__(self, auth_url, tenant, container, user, password):
-        self.swift_client = swiftclient.Connection(
-            authurl=auth_url, user=":".join([user, tenant]), key=password
+    def __init__(
+        self,
+        auth_url,
+        tenant,
+        container,
+        user,
+        password,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        operation_timeout=DEFAULT_OPERATION_TIMEOUT,
+    ):
+        self._connection_factory = partial(
+            swiftclient.Connection,
+            authurl=auth_url,
+            user=":".join([user, tenant]),
+            key=password,
+            timeout=operation_timeout,
         )
+        self.swift_client = self._connection_factory()
         self._container = container
         self.swift_client.head_container(container)
+        # swiftclient's connection is blocking and not thread-safe, so each
+        # worker thread uses its own connection. Given trio reuses its worker
+        # threads, the limiter also bounds the number of opened connections.
+        self._local = threading.local()
+        self._limiter = trio.CapacityLimiter(max_connections)
+        self._operation_timeout = operation_timeout
+
+    def _get_thread_connection(self):
+        try:
+            return self._local.connection
+        except AttributeError:
+            self._local.connection = self._connection_factory()
+            return self._local.connection
+
+    async def _run_in_thread(self, method_name, *args, **kwargs):
+        """
+        Raises:
+            BlockTimeoutError
+            ClientException
+        """
+
+        def _run():
+            return getattr(self._get_thread_connection(), method_name)(*args, **kwargs)
+
+        with trio.move_on_after(self._operation_timeout):
+            return await trio.to_thread.run_sync(_run, cancellable=True, limiter=self._limiter)
+        raise BlockTimeoutError()
 
     async def read(self, organization_id: OrganizationID, id: UUID) -> bytes:
         slug = f"{organization_id}/{id}"
         try:
-            headers, obj = await trio.to_thread.run_sync(
-                self.swift_client.get_object, self._container, slug
-            )
+            headers, obj = await self._run_in_thread("get_object", self._container, slug)
 
         except ClientException as exc:
             if exc.http_status == 404:
@@ -55,17 +101,14 @@ class SwiftBlockStoreComponent(BaseBlockStoreComponent):
     async def create(self, organization_id: OrganizationID, id: UUID, block: bytes) -> None:
         slug = f"{organization_id}/{id}"
         try:
-            _, obj = await trio.to_thread.run_sync(
-                self.swift_client.get_object, self._container, slug
+            # Conditional create, avoid a request to check if the object already exists
+            await self._run_in_thread(
+                "put_object", self._container, slug, block, headers={"If-None-Match": "*"}
             )
 
         except ClientException as exc:
-            if exc.http_status == 404:
-                await trio.to_thread.run_sync(
-                    partial(self.swift_client.put_object, self._container, slug, block)
-                )
+            if exc.http_status == 412:
+                raise BlockAlreadyExistsError() from exc
+
             else:
                 raise BlockTimeoutError() from exc
-
-        else:
-            raise BlockAlreadyExistsError()
@@ -74,6 +74,19 @@ def catch_protocol_errors(fn):
     return wrapper
 
 
+class StreamedRep:
+    """
+    Returned by a command to send `payload` with `Transport.send_stream`
+    right after the `rep` message.
+    """
+
+    __slots__ = ("rep", "payload")
+
+    def __init__(self, rep: dict, payload: bytes):
+        self.rep = rep
+        self.payload = payload
+
+
 class CancelledByNewRequest(Exception):
     def __init__(self, new_raw_req):
         self.new_raw_req = new_raw_req
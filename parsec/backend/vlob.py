@@ -387,8 +387,13 @@ class BaseVlobComponent:
         realm_id: UUID,
         encryption_revision: int,
         size: int,
+        after_vlob_id: Optional[UUID] = None,
+        after_version: Optional[int] = None,
     ) -> List[Tuple[UUID, int, bytes]]:
         """
+        Return the vlob atoms not yet reencrypted, in vlob id and version
+        order, starting after `(after_vlob_id, after_version)` if provided.
+
         Raises:
             VlobNotFoundError
             VlobAccessError
@@ -5,6 +5,7 @@ from parsec.core.backend_connection.exceptions import (
     BackendProtocolError,
     BackendNotAvailable,
     BackendConnectionRefused,
+    BackendStreamNotSupported,
 )
 from parsec.core.backend_connection.authenticated import (
     BackendAuthenticatedCmds,
@@ -34,6 +35,7 @@ __all__ = (
     "BackendProtocolError",
     "BackendNotAvailable",
     "BackendConnectionRefused",
+    "BackendStreamNotSupported",
     # Authenticated
     "BackendAuthenticatedCmds",
     "BackendConnStatus",
@@ -13,8 +13,16 @@ from parsec.api.data import EntryID
 from parsec.api.protocol import DeviceID
 from parsec.core.types import BackendOrganizationAddr
 from parsec.core.backend_connection import cmds
-from parsec.core.backend_connection.transport import connect_as_authenticated, TransportPool
-from parsec.core.backend_connection.exceptions import BackendNotAvailable, BackendConnectionRefused
+from parsec.core.backend_connection.transport import (
+    connect_as_authenticated,
+    TransportPool,
+    MultiplexedTransportPool,
+)
+from parsec.core.backend_connection.exceptions import (
+    BackendNotAvailable,
+    BackendConnectionRefused,
+    BackendStreamNotSupported,
+)
 from parsec.core.backend_connection.expose_cmds import expose_cmds_with_retrier
 from parsec.api.protocol import AUTHENTICATED_CMDS
 
@@ -75,7 +83,7 @@ def _handle_event(event_bus: EventBus, rep: dict) -> None:
         )
 
 
-def _transport_pool_factory(addr, device_id, signing_key, max_pool, keepalive):
+def _connect_factory(addr, device_id, signing_key, keepalive):
     async def _connect():
         transport = await connect_as_authenticated(
             addr, device_id=device_id, signing_key=signing_key, keepalive=keepalive
@@ -83,7 +91,7 @@ def _transport_pool_factory(addr, device_id, signing_key, max_pool, keepalive):
         transport.logger = transport.logger.bind(device_id=device_id)
         return transport
 
-    return TransportPool(_connect, max_pool=max_pool)
+    return _connect
 
 
 class BackendAuthenticatedConn:
@@ -96,14 +104,18 @@ class BackendAuthenticatedConn:
         max_cooldown: int = 30,
         max_pool: int = 4,
         keepalive: Optional[int] = None,
+        multiplexed_connections: int = 0,
     ):
         if max_pool < 2:
             raise ValueError("max_pool must be at least 2 (for event listener + query sender)")
 
         self._started = False
-        self._transport_pool = _transport_pool_factory(
-            addr, device_id, signing_key, max_pool, keepalive
-        )
+        self._connect = _connect_factory(addr, device_id, signing_key, keepalive)
+        self._transport_pool = TransportPool(self._connect, max_pool=max_pool)
+        # Multiplexed transports need a nursery for their readers, hence the
+        # pool is only created once running (0 to disable multiplexing)
+        self._multiplexed_connections = multiplexed_connections
+        self._multiplexed_transport_pool = None
         self._status = BackendConnStatus.LOST
         self._status_exc = None
         self._cmds = BackendAuthenticatedCmds(addr, self._acquire_transport)
@@ -143,8 +155,15 @@ class BackendAuthenticatedConn:
         if self._started:
             raise RuntimeError("Already started")
         async with trio.open_service_nursery() as nursery:
+            if self._multiplexed_connections:
+                self._multiplexed_transport_pool = MultiplexedTransportPool(
+                    self._connect, nursery, max_connections=self._multiplexed_connections
+                )
             nursery.start_soon(self._run_manager)
-            yield
+            try:
+                yield
+            finally:
+                self._multiplexed_transport_pool = None
             nursery.cancel_scope.cancel()
 
     async def _run_manager(self):
@@ -242,14 +261,22 @@ class BackendAuthenticatedConn:
 
     @asynccontextmanager
     async def _acquire_transport(
-        self, force_fresh=False, ignore_status=False, allow_not_available=False
+        self, force_fresh=False, ignore_status=False, allow_not_available=False, multiplexed=False
     ):
         if not ignore_status:
             if self._status_exc:
                 raise self._status_exc
 
+        pool = self._transport_pool
+        if (
+            multiplexed
+            and self._multiplexed_transport_pool
+            and not self._multiplexed_transport_pool.unsupported
+        ):
+            pool = self._multiplexed_transport_pool
+
         try:
-            async with self._transport_pool.acquire(force_fresh=force_fresh) as transport:
+            async with pool.acquire(force_fresh=force_fresh) as transport:
                 yield transport
 
         except BackendNotAvailable as exc:
@@ -305,7 +332,7 @@ async def backend_authenticated_cmds_factory(
             await _init_transport()
             try:
                 yield transport
-            except BackendNotAvailable:
+            except (BackendNotAvailable, BackendStreamNotSupported):
                 await _destroy_transport()
                 raise
 
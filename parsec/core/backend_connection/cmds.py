@@ -55,6 +55,10 @@ from parsec.api.protocol import (
     realm_finish_reencryption_maintenance_serializer,
     block_create_serializer,
     block_read_serializer,
+    block_batch_create_serializer,
+    block_batch_read_serializer,
+    block_create_stream_serializer,
+    block_read_stream_serializer,
     user_get_serializer,
     human_find_serializer,
     apiv1_user_find_serializer,
@@ -73,11 +77,19 @@ from parsec.api.protocol import (
     device_create_serializer,
 )
 from parsec.core.types import EntryID
-from parsec.core.backend_connection.exceptions import BackendNotAvailable, BackendProtocolError
+from parsec.core.backend_connection.exceptions import (
+    BackendNotAvailable,
+    BackendProtocolError,
+    BackendStreamNotSupported,
+)
 
 
-async def _send_cmd(transport: Transport, serializer, **req) -> dict:
+async def _send_cmd(
+    transport: Transport, serializer, stream_payload: Optional[bytes] = None, **req
+) -> dict:
     """
+    `stream_payload` is sent with `Transport.send_stream` right after the request.
+
     Raises:
         Backend
         BackendNotAvailable
@@ -99,6 +111,8 @@ async def _send_cmd(transport: Transport, serializer, **req) -> dict:
 
     try:
         await transport.send(raw_req)
+        if stream_payload is not None:
+            await transport.send_stream(stream_payload)
         raw_rep = await transport.recv()
 
     except TransportError as exc:
@@ -222,8 +236,13 @@ async def vlob_list_versions(transport: Transport, vlob_id: UUID) -> dict:
 
 
 async def vlob_maintenance_get_reencryption_batch(
-    transport: Transport, realm_id: UUID, encryption_revision: int, size: int
+    transport: Transport,
+    realm_id: UUID,
+    encryption_revision: int,
+    size: int,
+    after: Optional[Tuple[EntryID, int]] = None,
 ) -> dict:
+    after_vlob_id, after_version = after or (None, None)
     return await _send_cmd(
         transport,
         vlob_maintenance_get_reencryption_batch_serializer,
@@ -231,6 +250,8 @@ async def vlob_maintenance_get_reencryption_batch(
         realm_id=realm_id,
         encryption_revision=encryption_revision,
         size=size,
+        after_vlob_id=after_vlob_id,
+        after_version=after_version,
     )
 
 
@@ -334,6 +355,68 @@ async def block_read(transport: Transport, block_id: UUID) -> dict:
     return await _send_cmd(transport, block_read_serializer, cmd="block_read", block_id=block_id)
 
 
+async def block_batch_create(
+    transport: Transport, realm_id: UUID, blocks: List[Tuple[UUID, bytes]]
+) -> dict:
+    return await _send_cmd(
+        transport,
+        block_batch_create_serializer,
+        cmd="block_batch_create",
+        realm_id=realm_id,
+        blocks=[{"block_id": block_id, "block": block} for block_id, block in blocks],
+    )
+
+
+async def block_batch_read(transport: Transport, realm_id: UUID, block_ids: List[UUID]) -> dict:
+    return await _send_cmd(
+        transport,
+        block_batch_read_serializer,
+        cmd="block_batch_read",
+        realm_id=realm_id,
+        block_ids=block_ids,
+    )
+
+
+async def block_create_stream(
+    transport: Transport, block_id: UUID, realm_id: UUID, block: bytes
+) -> dict:
+    """
+    Raises:
+        BackendStreamNotSupported: the backend predates this command
+    """
+    rep = await _send_cmd(
+        transport,
+        block_create_stream_serializer,
+        stream_payload=block,
+        cmd="block_create_stream",
+        block_id=block_id,
+        realm_id=realm_id,
+        size=len(block),
+    )
+    if rep["status"] == "unknown_command":
+        transport.logger.info("Backend doesn't support streamed blocks", cmd="block_create_stream")
+        raise BackendStreamNotSupported("Backend doesn't support streamed blocks")
+
+    return rep
+
+
+async def block_read_stream(transport: Transport, block_id: UUID) -> dict:
+    rep = await _send_cmd(
+        transport, block_read_stream_serializer, cmd="block_read_stream", block_id=block_id
+    )
+    if rep["status"] == "ok":
+        try:
+            rep["block"] = await transport.recv_stream(rep["size"])
+
+        except TransportError as exc:
+            transport.logger.debug(
+                "Request failed (backend not available)", cmd="block_read_stream"
+            )
+            raise BackendNotAvailable(exc) from exc
+
+    return rep
+
+
 ### Invite API ###
 
 
@@ -15,3 +15,9 @@ class BackendNotAvailable(BackendConnectionError):
 
 class BackendConnectionRefused(BackendConnectionError):
     pass
+
+
+class BackendStreamNotSupported(BackendConnectionError):
+    # The streamed payload has been sent nevertheless, so the connection
+    # is out of sync and must be dropped
+    pass
@@ -1,5 +1,6 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+from parsec.api.protocol import MULTIPLEXED_EXCLUDED_CMDS
 from parsec.core.backend_connection import cmds
 from parsec.core.backend_connection.exceptions import BackendNotAvailable
 
@@ -25,15 +26,21 @@ def expose_cmds_with_retrier(name: str, apiv1: bool = False):
     else:
         cmd = getattr(cmds, name)
 
+    multiplexed = name not in MULTIPLEXED_EXCLUDED_CMDS
+
     async def wrapper(self, *args, **kwargs):
         # Reusing the transports expose us to `BackendNotAvaiable` exceptions
         # due to inactivity timeout while the transport was in the pool.
         try:
-            async with self.acquire_transport(allow_not_available=True) as transport:
+            async with self.acquire_transport(
+                allow_not_available=True, multiplexed=multiplexed
+            ) as transport:
                 return await cmd(transport, *args, **kwargs)
 
         except BackendNotAvailable:
-            async with self.acquire_transport(force_fresh=True) as transport:
+            async with self.acquire_transport(
+                force_fresh=True, multiplexed=multiplexed
+            ) as transport:
                 return await cmd(transport, *args, **kwargs)
 
     wrapper.__name__ = name
@@ -3,9 +3,10 @@
 import os
 import trio
 import ssl
+from itertools import count
 from async_generator import asynccontextmanager
 from structlog import get_logger
-from typing import Optional, Union
+from typing import Optional, Union, Dict, List
 
 from parsec.crypto import SigningKey
 from parsec.api.transport import Transport, TransportError, TransportClosedByPeer
@@ -13,6 +14,11 @@ from parsec.api.protocol import (
     DeviceID,
     ProtocolError,
     HandshakeError,
+    MessageSerializationError,
+    packb,
+    is_multiplexed_message,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
     BaseClientHandshake,
     AuthenticatedClientHandshake,
     InvitedClientHandshake,
@@ -214,3 +220,177 @@ class TransportPool:
 
             else:
                 self._transports.append(transport)
+
+
+class MultiplexedTransport:
+    """
+    Transport shared by concurrent requests (see `parsec.api.protocol.multiplexing`).
+
+    The responses are received by a background task (`run_reader`) which
+    dispatches them to their requests, hence they can arrive in any order.
+    """
+
+    def __init__(self, transport: Transport):
+        self.transport = transport
+        self.logger = transport.logger
+        self._req_ids = count(1)
+        self._waiters: Dict[int, trio.Event] = {}
+        self._reps: Dict[int, bytes] = {}
+        self._exc: Optional[TransportError] = None
+
+    @property
+    def broken(self) -> bool:
+        return self._exc is not None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._waiters)
+
+    async def probe(self) -> bool:
+        """
+        Check the backend accepts to multiplex this transport, it must be done
+        before starting the reader.
+
+        Raises:
+            TransportError
+        """
+        await self.transport.send(pack_multiplexed_message(0, packb({"cmd": "ping", "ping": ""})))
+        return is_multiplexed_message(await self.transport.recv())
+
+    def _set_broken(self, exc: TransportError) -> None:
+        if self._exc is None:
+            self._exc = exc
+        # Wake up all the requests, they will find no response
+        for waiter in self._waiters.values():
+            waiter.set()
+
+    async def run_reader(self, *, task_status=trio.TASK_STATUS_IGNORED) -> None:
+        task_status.started()
+        try:
+            while True:
+                raw_rep = await self.transport.recv()
+                req_id, raw_rep = unpack_multiplexed_message(raw_rep)
+                waiter = self._waiters.get(req_id)
+                # Otherwise the request has been cancelled in the meantime
+                if waiter is not None:
+                    self._reps[req_id] = raw_rep
+                    waiter.set()
+
+        except MessageSerializationError as exc:
+            self._set_broken(TransportError(f"Invalid multiplexed message: {exc}"))
+
+        except TransportError as exc:
+            self._set_broken(exc)
+
+        finally:
+            self._set_broken(TransportError("Transport has been closed"))
+            with trio.CancelScope(shield=True):
+                await self.transport.aclose()
+
+    async def request(self, raw_req: bytes) -> bytes:
+        """
+        Raises:
+            TransportError
+        """
+        if self._exc is not None:
+            raise TransportError(*self._exc.args) from self._exc
+        req_id = next(self._req_ids) % 2 ** 32
+        waiter = self._waiters[req_id] = trio.Event()
+        try:
+            # A partially sent message would corrupt the whole transport
+            with trio.CancelScope(shield=True):
+                await self.transport.send(pack_multiplexed_message(req_id, raw_req))
+            await waiter.wait()
+            try:
+                return self._reps.pop(req_id)
+            except KeyError:
+                raise TransportError(*self._exc.args) from self._exc
+
+        except TransportError as exc:
+            self._set_broken(exc)
+            raise
+
+        finally:
+            self._waiters.pop(req_id, None)
+            self._reps.pop(req_id, None)
+
+
+class MultiplexedRequest:
+    """
+    Transport-like object used to send a single request on a multiplexed
+    transport (the request is actually sent when waiting for the response).
+    """
+
+    def __init__(self, multiplexed_transport: MultiplexedTransport):
+        self.multiplexed_transport = multiplexed_transport
+        self.logger = multiplexed_transport.logger
+        self._raw_req = None
+
+    async def send(self, msg: bytes) -> None:
+        assert self._raw_req is None
+        self._raw_req = msg
+
+    async def recv(self) -> bytes:
+        raw_req, self._raw_req = self._raw_req, None
+        return await self.multiplexed_transport.request(raw_req)
+
+    async def send_stream(self, data: bytes) -> None:
+        raise TransportError("Streams are not available on a multiplexed transport")
+
+    async def recv_stream(self, size: int) -> bytes:
+        raise TransportError("Streams are not available on a multiplexed transport")
+
+
+class MultiplexedTransportPool:
+    """
+    Spread the requests over at most `max_connections` multiplexed transports,
+    a new transport is only opened when all the others have requests in flight.
+    """
+
+    def __init__(self, connect_cb, nursery, max_connections):
+        self._connect_cb = connect_cb
+        self._nursery = nursery
+        self._max_connections = max_connections
+        self._transports: List[MultiplexedTransport] = []
+        self._connect_lock = trio.Lock()
+        # Set if the backend doesn't support multiplexing
+        self.unsupported = False
+
+    def _pick_transport(self) -> Optional[MultiplexedTransport]:
+        self._transports = [t for t in self._transports if not t.broken]
+        transport = min(self._transports, key=lambda t: t.in_flight, default=None)
+        if transport is None:
+            return None
+        if transport.in_flight and len(self._transports) < self._max_connections:
+            return None
+        return transport
+
+    async def _connect(self) -> MultiplexedTransport:
+        transport = MultiplexedTransport(await self._connect_cb())
+        try:
+            supported = await transport.probe()
+        except TransportError as exc:
+            await transport.transport.aclose()
+            raise BackendNotAvailable(exc) from exc
+        if not supported:
+            await transport.transport.aclose()
+            self.unsupported = True
+            raise BackendNotAvailable("Backend doesn't support multiplexed connections")
+        await self._nursery.start(transport.run_reader)
+        self._transports.append(transport)
+        return transport
+
+    @asynccontextmanager
+    async def acquire(self, force_fresh=False):
+        """
+        Raises:
+            BackendConnectionError
+        """
+        transport = None if force_fresh else self._pick_transport()
+        if transport is None:
+            async with self._connect_lock:
+                transport = None if force_fresh else self._pick_transport()
+                if transport is None:
+                    transport = await self._connect()
+
+        yield MultiplexedRequest(transport)
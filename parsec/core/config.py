@@ -59,11 +59,28 @@ class CoreConfig:
     backend_max_cooldown: int = 30
     backend_connection_keepalive: Optional[int] = 29
     backend_max_connections: int = 4
+    # Connections shared by concurrent requests to the backend (0 to disable)
+    backend_multiplexed_connections: int = 0
+
+    # Maximum number of blocks downloaded in parallel when reading a file
+    block_download_max_concurrency: int = 4
+    # Maximum number of blocks uploaded in parallel when synchronizing a file
+    block_upload_max_concurrency: int = 4
+    # Maximum number of blocks prefetched ahead of sequential reads (0 to disable)
+    read_ahead_max_blocks: int = 8
+    # Seconds the modified manifests wait to be written to the local database
+    # in a single transaction (None to write each of them right away)
+    manifest_flush_interval: Optional[float] = None
+    # Maximum number of manifests kept in memory for each workspace
+    manifest_cache_size: int = 10000
 
     invitation_token_size: int = 8
 
     mountpoint_enabled: bool = False
     disabled_workspaces: FrozenSet[EntryID] = frozenset()
+    # Seconds the mountpoint driver caches entries attributes and path lookups
+    mountpoint_attr_timeout: float = 1.0
+    mountpoint_entry_timeout: float = 1.0
 
     sentry_url: Optional[str] = None
     telemetry_enabled: bool = True
@@ -94,9 +111,17 @@ def config_factory(
     mountpoint_base_dir: Path = None,
     mountpoint_enabled: bool = False,
     disabled_workspaces: FrozenSet[EntryID] = frozenset(),
+    mountpoint_attr_timeout: float = 1.0,
+    mountpoint_entry_timeout: float = 1.0,
     backend_max_cooldown: int = 30,
     backend_connection_keepalive: Optional[int] = 29,
     backend_max_connections: int = 4,
+    backend_multiplexed_connections: int = 0,
+    block_download_max_concurrency: int = 4,
+    block_upload_max_concurrency: int = 4,
+    read_ahead_max_blocks: int = 8,
+    manifest_flush_interval: Optional[float] = None,
+    manifest_cache_size: int = 10000,
     telemetry_enabled: bool = True,
     debug: bool = False,
     gui_last_device: str = None,
@@ -118,9 +143,17 @@ def config_factory(
         mountpoint_base_dir=get_default_mountpoint_base_dir(environ),
         mountpoint_enabled=mountpoint_enabled,
         disabled_workspaces=disabled_workspaces,
+        mountpoint_attr_timeout=mountpoint_attr_timeout,
+        mountpoint_entry_timeout=mountpoint_entry_timeout,
         backend_max_cooldown=backend_max_cooldown,
         backend_connection_keepalive=backend_connection_keepalive,
         backend_max_connections=backend_max_connections,
+        backend_multiplexed_connections=backend_multiplexed_connections,
+        block_download_max_concurrency=block_download_max_concurrency,
+        block_upload_max_concurrency=block_upload_max_concurrency,
+        read_ahead_max_blocks=read_ahead_max_blocks,
+        manifest_flush_interval=manifest_flush_interval,
+        manifest_cache_size=manifest_cache_size,
         telemetry_enabled=telemetry_enabled,
         debug=debug,
         sentry_url=environ.get("SENTRY_URL") or None,
@@ -202,6 +235,8 @@ def save_config(config: CoreConfig):
                 "cache_base_dir": str(config.cache_base_dir),
                 "telemetry_enabled": config.telemetry_enabled,
                 "disabled_workspaces": list(map(str, config.disabled_workspaces)),
+                "mountpoint_attr_timeout": config.mountpoint_attr_timeout,
+                "mountpoint_entry_timeout": config.mountpoint_entry_timeout,
                 "backend_max_cooldown": config.backend_max_cooldown,
                 "backend_connection_keepalive": config.backend_connection_keepalive,
                 "gui_last_device": config.gui_last_device,
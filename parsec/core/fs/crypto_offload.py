@@ -0,0 +1,60 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+from typing import Union
+
+import trio
+from trio.hazmat import RunVar
+
+from parsec.crypto import SecretKey
+
+
+__all__ = ("CRYPTO_OFFLOAD_THRESHOLD", "run_crypto", "encrypt", "decrypt")
+
+
+# Below this size (in bytes), the round trip to a worker thread costs more
+# than the operation itself, so it is run directly in the trio thread
+CRYPTO_OFFLOAD_THRESHOLD = 64 * 1024
+
+# The crypto operations are CPU-bound, there is no point having more
+# worker threads than CPUs (and the default trio limiter is shared with
+# blocking I/O operations)
+CRYPTO_MAX_THREADS = os.cpu_count() or 1
+
+_crypto_limiter = RunVar("crypto_limiter")
+
+
+def _get_crypto_limiter() -> trio.CapacityLimiter:
+    try:
+        return _crypto_limiter.get()
+    except LookupError:
+        limiter = trio.CapacityLimiter(CRYPTO_MAX_THREADS)
+        _crypto_limiter.set(limiter)
+        return limiter
+
+
+async def run_crypto(fn, *args, size: int):
+    """Run `fn(*args)` in a worker thread if `size` is large enough.
+
+    `fn` must be thread-safe and not touch any trio object.
+    Exceptions raised by `fn` are propagated as is.
+    """
+    if size < CRYPTO_OFFLOAD_THRESHOLD:
+        return fn(*args)
+    return await trio.to_thread.run_sync(fn, *args, limiter=_get_crypto_limiter())
+
+
+async def encrypt(key: SecretKey, data: Union[bytes, bytearray]) -> bytes:
+    """
+    Raises:
+        CryptoError: if key is invalid.
+    """
+    return await run_crypto(key.encrypt, data, size=len(data))
+
+
+async def decrypt(key: SecretKey, ciphered: bytes) -> bytes:
+    """
+    Raises:
+        CryptoError: if key is invalid.
+    """
+    return await run_crypto(key.decrypt, ciphered, size=len(ciphered))
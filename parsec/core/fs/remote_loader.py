@@ -1,18 +1,29 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import trio
 from pendulum import Pendulum, now as pendulum_now
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple, Iterable, Iterator, Callable, TypeVar
 
 from parsec.utils import timestamps_in_the_ballpark
 from parsec.crypto import HashDigest, CryptoError
-from parsec.api.protocol import UserID, DeviceID, RealmRole
+from parsec.api.protocol import (
+    UserID,
+    DeviceID,
+    RealmRole,
+    BLOCK_BATCH_MAX_SIZE,
+    BLOCK_BATCH_MAX_BYTES,
+)
 from parsec.api.data import (
     DataError,
     BlockAccess,
     RealmRoleCertificateContent,
     Manifest as RemoteManifest,
 )
-from parsec.core.backend_connection import BackendConnectionError, BackendNotAvailable
+from parsec.core.backend_connection import (
+    BackendConnectionError,
+    BackendNotAvailable,
+    BackendStreamNotSupported,
+)
 from parsec.core.types import EntryID, ChunkID
 from parsec.core.fs.exceptions import (
     FSError,
@@ -27,6 +38,42 @@ from parsec.core.fs.exceptions import (
     FSWorkspaceNoReadAccess,
     FSWorkspaceNoWriteAccess,
 )
+from parsec.core.fs.crypto_offload import run_crypto, encrypt
+
+
+DEFAULT_BLOCK_DOWNLOAD_MAX_CONCURRENCY = 4
+DEFAULT_BLOCK_UPLOAD_MAX_CONCURRENCY = 4
+# Downloaded blocks are written to the local storage in batches of at most this size
+BLOCK_STORAGE_BATCH_SIZE = 16
+# Blocks from this size are transferred with the stream commands, so that
+# they are neither packed into the messages nor limited to 1MB
+BLOCK_STREAM_THRESHOLD = 256 * 1024
+# Nonce and MAC added to the blocks by `SecretKey.encrypt`
+BLOCK_ENCRYPTION_OVERHEAD = 40
+
+T = TypeVar("T")
+
+
+def group_block_batches(items: Iterable[T], get_size: Callable[[T], int]) -> Iterator[List[T]]:
+    """
+    Group consecutive blocks (given their ciphered size) to be transferred
+    with the batch commands, the blocks to be streamed are alone in their group.
+    """
+    batch = []
+    batch_bytes = 0
+    for item in items:
+        size = get_size(item)
+        if size >= BLOCK_STREAM_THRESHOLD:
+            yield [item]
+            continue
+        if len(batch) >= BLOCK_BATCH_MAX_SIZE or batch_bytes + size > BLOCK_BATCH_MAX_BYTES:
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        yield batch
 
 
 class RemoteLoader:
@@ -38,6 +85,7 @@ class RemoteLoader:
         backend_cmds,
         remote_device_manager,
         local_storage,
+        block_download_max_concurrency: int = DEFAULT_BLOCK_DOWNLOAD_MAX_CONCURRENCY,
     ):
         self.device = device
         self.workspace_id = workspace_id
@@ -45,6 +93,10 @@ class RemoteLoader:
         self.backend_cmds = backend_cmds
         self.remote_device_manager = remote_device_manager
         self.local_storage = local_storage
+        self.block_download_max_concurrency = block_download_max_concurrency
+        # Cleared once the backend turns out to predate the stream/batch commands
+        self._block_streams_supported = True
+        self._block_batches_supported = True
         self._realm_role_certificates_cache = None
         self._realm_role_certificates_cache_timestamp = None
 
@@ -71,6 +123,10 @@ class RemoteLoader:
         except BackendNotAvailable as exc:
             raise FSBackendOfflineError(str(exc)) from exc
 
+        except BackendStreamNotSupported:
+            # Let the caller fall back on the regular commands
+            raise
+
         except BackendConnectionError as exc:
             raise FSError(f"`{cmd}` request has failed due to connection error `{exc}`") from exc
 
@@ -164,14 +220,67 @@ class RemoteLoader:
 
     async def load_blocks(self, accesses: List[BlockAccess]) -> None:
         """
+        Download the blocks concurrently (up to `block_download_max_concurrency`
+        requests in flight, the small blocks being grouped in batch requests),
+        decrypt and check them in worker threads, then write them to the local
+        storage in batches.
+
         Raises:
             FSError
             FSRemoteBlockNotFound
             FSBackendOfflineError
             FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
         """
-        for access in accesses:
-            await self.load_block(access)
+        # No need for the whole machinery when there is a single block to load
+        if len(accesses) <= 1:
+            for access in accesses:
+                await self.load_block(access)
+            return
+
+        # All the jobs are known beforehand
+        jobs = list(
+            group_block_batches(accesses, lambda access: access.size + BLOCK_ENCRYPTION_OVERHEAD)
+        )
+        job_send_channel, job_receive_channel = trio.open_memory_channel(len(jobs))
+        for job in jobs:
+            job_send_channel.send_nowait(job)
+        await job_send_channel.aclose()
+
+        # The result channel is bounded to provide backpressure on the downloads
+        max_concurrency = max(1, min(self.block_download_max_concurrency, len(jobs)))
+        result_send_channel, result_receive_channel = trio.open_memory_channel(max_concurrency)
+
+        async with trio.open_service_nursery() as nursery:
+            async with result_send_channel:
+                for _ in range(max_concurrency):
+                    nursery.start_soon(
+                        self._load_blocks_worker,
+                        job_receive_channel.clone(),
+                        result_send_channel.clone(),
+                    )
+            await job_receive_channel.aclose()
+
+            # Store the blocks as they arrive, grouping the ones that are already available
+            batch = []
+            async with result_receive_channel:
+                async for block_id, block in result_receive_channel:
+                    batch.append((block_id, block))
+                    stats = result_receive_channel.statistics()
+                    if len(batch) >= BLOCK_STORAGE_BATCH_SIZE or not stats.current_buffer_used:
+                        await self.local_storage.set_clean_blocks(batch)
+                        batch = []
+            if batch:
+                await self.local_storage.set_clean_blocks(batch)
+
+    async def _load_blocks_worker(self, job_receive_channel, result_send_channel) -> None:
+        async with job_receive_channel, result_send_channel:
+            async for batch in job_receive_channel:
+                for access, ciphered in zip(batch, await self._download_blocks(batch)):
+                    block = await run_crypto(
+                        self._decrypt_block, access, ciphered, size=len(ciphered)
+                    )
+                    await result_send_channel.send((access.id, block))
 
     async def load_block(self, access: BlockAccess) -> None:
         """
@@ -182,11 +291,58 @@ class RemoteLoader:
             FSWorkspaceInMaintenance
             FSWorkspaceNoAccess
         """
-        # Download
-        rep = await self._backend_cmds("block_read", access.id)
+        ciphered = await self._download_block(access)
+        block = await run_crypto(self._decrypt_block, access, ciphered, size=len(ciphered))
+        await self.local_storage.set_clean_block(access.id, block)
+
+    async def _download_blocks(self, accesses: List[BlockAccess]) -> List[bytes]:
+        """
+        Raises:
+            FSError
+            FSRemoteBlockNotFound
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        if len(accesses) > 1 and self._block_batches_supported:
+            rep = await self._backend_cmds(
+                "block_batch_read", self.workspace_id, [access.id for access in accesses]
+            )
+            if rep["status"] == "ok":
+                blocks = {entry["block_id"]: entry["block"] for entry in rep["blocks"]}
+                return [blocks[access.id] for access in accesses]
+            elif rep["status"] == "unknown_command":
+                self._block_batches_supported = False
+            elif rep["status"] not in ("not_found", "too_large"):
+                self._check_download_block_rep(rep)
+            # Otherwise retry block by block to find out which one is missing
+
+        return [await self._download_block(access) for access in accesses]
+
+    async def _download_block(self, access: BlockAccess) -> bytes:
+        """
+        Raises:
+            FSError
+            FSRemoteBlockNotFound
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        rep = None
+        if access.size >= BLOCK_STREAM_THRESHOLD and self._block_streams_supported:
+            rep = await self._backend_cmds("block_read_stream", access.id)
+            if rep["status"] == "unknown_command":
+                self._block_streams_supported = False
+                rep = None
+        if rep is None:
+            rep = await self._backend_cmds("block_read", access.id)
         if rep["status"] == "not_found":
             raise FSRemoteBlockNotFound(access)
-        elif rep["status"] == "not_allowed":
+        self._check_download_block_rep(rep)
+        return rep["block"]
+
+    def _check_download_block_rep(self, rep: dict) -> None:
+        if rep["status"] == "not_allowed":
             # Seems we lost the access to the realm
             raise FSWorkspaceNoReadAccess("Cannot load block: no read access")
         elif rep["status"] == "in_maintenance":
@@ -196,9 +352,15 @@ class RemoteLoader:
         elif rep["status"] != "ok":
             raise FSError(f"Cannot download block: `{rep['status']}`")
 
-        # Decryption
+    def _decrypt_block(self, access: BlockAccess, ciphered: bytes) -> bytes:
+        """
+        Synchronous so it can be run from a worker thread.
+
+        Raises:
+            FSError
+        """
         try:
-            block = access.key.decrypt(rep["block"])
+            block = access.key.decrypt(ciphered)
 
         # Decryption error
         except CryptoError as exc:
@@ -206,10 +368,23 @@ class RemoteLoader:
 
         # TODO: let encryption manager do the digest check ?
         assert HashDigest.from_data(block) == access.digest, access
-        await self.local_storage.set_clean_block(access.id, block)
+        return block
 
     async def upload_block(self, access: BlockAccess, data: bytes):
         """
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        await self.upload_blocks([(access, data)])
+
+    async def upload_blocks(self, blocks: List[Tuple[BlockAccess, bytes]]):
+        """
+        Upload the blocks one after another, the small ones being grouped in
+        batch requests.
+
         Raises:
             FSError
             FSBackendOfflineError
@@ -218,19 +393,77 @@ class RemoteLoader:
         """
         # Encryption
         try:
-            ciphered = access.key.encrypt(data)
+            ciphereds = [(access, await encrypt(access.key, data)) for access, data in blocks]
 
         # Encryption error
         except CryptoError as exc:
             raise FSError(f"Cannot encrypt block: {exc}") from exc
 
-        # Upload block
-        rep = await self._backend_cmds("block_create", access.id, self.workspace_id, ciphered)
+        # Upload blocks
+        for batch in group_block_batches(ciphereds, lambda item: len(item[1])):
+            if len(batch) == 1 or not await self._create_block_batch(batch):
+                for access, ciphered in batch:
+                    await self._create_block(access, ciphered)
+
+        # Update local storage
+        for access, data in blocks:
+            await self.local_storage.set_clean_block(access.id, data)
+            await self.local_storage.clear_chunk(ChunkID(access.id), miss_ok=True)
+
+    async def _create_block_batch(self, batch: List[Tuple[BlockAccess, bytes]]) -> bool:
+        """
+        Returns: False if the blocks have to be uploaded one by one
+
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        if not self._block_batches_supported:
+            return False
+
+        rep = await self._backend_cmds(
+            "block_batch_create",
+            self.workspace_id,
+            [(access.id, ciphered) for access, ciphered in batch],
+        )
+        if rep["status"] == "unknown_command":
+            self._block_batches_supported = False
+            return False
+        elif rep["status"] == "already_exists":
+            # Nothing has been created, some blocks have already been uploaded
+            # (see `_create_block`) and must be ignored
+            return False
+        self._check_create_block_rep(rep)
+        return True
+
+    async def _create_block(self, access: BlockAccess, ciphered: bytes):
+        """
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        rep = None
+        if len(ciphered) >= BLOCK_STREAM_THRESHOLD and self._block_streams_supported:
+            try:
+                rep = await self._backend_cmds(
+                    "block_create_stream", access.id, self.workspace_id, ciphered
+                )
+            except BackendStreamNotSupported:
+                self._block_streams_supported = False
+        if rep is None:
+            rep = await self._backend_cmds("block_create", access.id, self.workspace_id, ciphered)
         if rep["status"] == "already_exists":
             # Ignore exception if the block has already been uploaded
             # This might happen when a failure occurs before the local storage is updated
-            pass
-        elif rep["status"] == "not_allowed":
+            return
+        self._check_create_block_rep(rep)
+
+    def _check_create_block_rep(self, rep: dict) -> None:
+        if rep["status"] == "not_allowed":
             # Seems we lost the access to the realm
             raise FSWorkspaceNoWriteAccess("Cannot upload block: no write access")
         elif rep["status"] == "in_maintenance":
@@ -240,10 +473,6 @@ class RemoteLoader:
         elif rep["status"] != "ok":
             raise FSError(f"Cannot upload block: {rep}")
 
-        # Update local storage
-        await self.local_storage.set_clean_block(access.id, data)
-        await self.local_storage.clear_chunk(ChunkID(access.id), miss_ok=True)
-
     async def load_manifest(
         self,
         entry_id: EntryID,
@@ -512,6 +741,9 @@ class RemoteLoaderTimestamped(RemoteLoader):
         self.backend_cmds = remote_loader.backend_cmds
         self.remote_device_manager = remote_loader.remote_device_manager
         self.local_storage = remote_loader.local_storage.to_timestamped(timestamp)
+        self.block_download_max_concurrency = remote_loader.block_download_max_concurrency
+        self._block_streams_supported = remote_loader._block_streams_supported
+        self._block_batches_supported = remote_loader._block_batches_supported
         self._realm_role_certificates_cache = None
         self._realm_role_certificates_cache_timestamp = None
         self.timestamp = timestamp
@@ -519,6 +751,9 @@ class RemoteLoaderTimestamped(RemoteLoader):
     async def upload_block(self, *e, **ke):
         raise FSError(f"Cannot upload block through a timestamped remote loader")
 
+    async def upload_blocks(self, *e, **ke):
+        raise FSError(f"Cannot upload block through a timestamped remote loader")
+
     async def load_manifest(
         self,
         entry_id: EntryID,
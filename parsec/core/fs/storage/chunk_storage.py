@@ -1,22 +1,75 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import time
+from uuid import UUID
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Tuple
 
+import attr
 import trio
 from async_generator import asynccontextmanager
 
 from parsec.core.types import ChunkID
 from parsec.core.fs.exceptions import FSLocalMissError
+from parsec.core.fs.crypto_offload import run_crypto, encrypt, decrypt
 from parsec.core.types import LocalDevice, DEFAULT_BLOCK_SIZE
 from parsec.core.fs.storage.local_database import LocalDatabase
 
 
-class ChunkStorage:
-    """Interface to access the local chunks of data."""
+# Maximum size of the decrypted data kept in memory by each chunk storage
+DEFAULT_MEMORY_CACHE_SIZE = 32 * 1024 * 1024
+# Number of pending `accessed_on` updates that triggers a write to the database
+ACCESSED_ON_FLUSH_THRESHOLD = 128
+
+
+@attr.s(slots=True, auto_attribs=True)
+class ChunkCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    # Number of chunks and total size (in bytes) of the data kept in memory
+    entries: int = 0
+    size: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
-    def __init__(self, device: LocalDevice, localdb: LocalDatabase):
+
+class ChunkStorage:
+    """Interface to access the local chunks of data.
+
+    The decrypted data of the recently accessed chunks is kept in a memory
+    LRU cache (bounded by `memory_cache_size` bytes) so that reading the
+    same chunk many times (e.g. a block read 4K by 4K by the mountpoint)
+    doesn't hit the database and the decryption every time. Consequently,
+    the `accessed_on` timestamps are not updated on each read but written
+    to the database by batch.
+
+    When the local database provides read-only connections, the chunks
+    are read from worker threads so that reads don't wait for the writes.
+    The chunks written since the last commit are only visible from the
+    writer connection, hence they are tracked to be read from there.
+    """
+
+    def __init__(
+        self,
+        device: LocalDevice,
+        localdb: LocalDatabase,
+        memory_cache_size: int = DEFAULT_MEMORY_CACHE_SIZE,
+    ):
         self.local_symkey = device.local_symkey
         self.localdb = localdb
+        self.memory_cache_size = memory_cache_size
+        self._memory_cache: Dict[ChunkID, bytes] = OrderedDict()
+        self._memory_cache_statistics = ChunkCacheStatistics()
+        self._pending_accessed_on: Dict[ChunkID, float] = {}
+        # Incremented on each invalidation, so data read from the database
+        # while a concurrent write was in progress doesn't get cached
+        self._memory_cache_generation = 0
+        # Chunks modified since the commit number `_uncommitted_commit_count`
+        self._uncommitted_chunk_ids: Set[ChunkID] = set()
+        self._uncommitted_commit_count = 0
 
     @property
     def path(self):
@@ -31,6 +84,7 @@ class ChunkStorage:
             yield self
         finally:
             with trio.CancelScope(shield=True):
+                await self.flush_accessed_on()
                 await self.localdb.commit()
 
     def _open_cursor(self):
@@ -44,6 +98,22 @@ class ChunkStorage:
         # an acutal flush operation is performed.
         return self.localdb.open_cursor(commit=False)
 
+    def _mark_uncommitted(self, chunk_ids: Iterable[ChunkID]) -> None:
+        # Must be called while the writer connection is held, right after the change
+        self._discard_committed()
+        self._uncommitted_chunk_ids.update(chunk_ids)
+
+    def _discard_committed(self) -> None:
+        if self._uncommitted_commit_count != self.localdb.commit_count:
+            self._uncommitted_chunk_ids.clear()
+            self._uncommitted_commit_count = self.localdb.commit_count
+
+    def _use_reader(self, chunk_id: ChunkID) -> bool:
+        if not self.localdb.has_readers:
+            return False
+        self._discard_committed()
+        return chunk_id not in self._uncommitted_chunk_ids
+
     # Database initialization
 
     async def _create_db(self):
@@ -58,6 +128,70 @@ class ChunkStorage:
                 );"""
             )
 
+    # Memory cache
+
+    def get_memory_cache_statistics(self) -> ChunkCacheStatistics:
+        return attr.evolve(self._memory_cache_statistics)
+
+    def _memory_cache_get(self, chunk_id: ChunkID):
+        try:
+            data = self._memory_cache[chunk_id]
+        except KeyError:
+            self._memory_cache_statistics.misses += 1
+            return None
+        self._memory_cache.move_to_end(chunk_id)
+        self._memory_cache_statistics.hits += 1
+        return data
+
+    def _memory_cache_set(self, chunk_id: ChunkID, data: bytes) -> None:
+        if len(data) > self.memory_cache_size:
+            return
+        stats = self._memory_cache_statistics
+        previous = self._memory_cache.pop(chunk_id, None)
+        if previous is not None:
+            stats.size -= len(previous)
+        self._memory_cache[chunk_id] = data
+        stats.size += len(data)
+        while stats.size > self.memory_cache_size:
+            _, evicted = self._memory_cache.popitem(last=False)
+            stats.size -= len(evicted)
+        stats.entries = len(self._memory_cache)
+
+    def invalidate_memory_cache(self, chunk_ids: Iterable[ChunkID]) -> None:
+        self._memory_cache_generation += 1
+        stats = self._memory_cache_statistics
+        for chunk_id in chunk_ids:
+            data = self._memory_cache.pop(chunk_id, None)
+            if data is not None:
+                stats.size -= len(data)
+            self._pending_accessed_on.pop(chunk_id, None)
+        stats.entries = len(self._memory_cache)
+
+    def clear_memory_cache(self) -> None:
+        self._memory_cache_generation += 1
+        self._memory_cache.clear()
+        self._pending_accessed_on.clear()
+        self._memory_cache_statistics.size = 0
+        self._memory_cache_statistics.entries = 0
+
+    # Access timestamps
+
+    async def _register_access(self, chunk_id: ChunkID) -> None:
+        self._pending_accessed_on[chunk_id] = time.time()
+        if len(self._pending_accessed_on) >= ACCESSED_ON_FLUSH_THRESHOLD:
+            await self.flush_accessed_on()
+
+    async def flush_accessed_on(self) -> None:
+        if not self._pending_accessed_on:
+            return
+        rows = [
+            (accessed_on, chunk_id.bytes)
+            for chunk_id, accessed_on in self._pending_accessed_on.items()
+        ]
+        self._pending_accessed_on.clear()
+        async with self._open_cursor() as cursor:
+            cursor.executemany("UPDATE chunks SET accessed_on = ? WHERE chunk_id = ?", rows)
+
     # Size and chunks
 
     async def get_nb_blocks(self):
@@ -74,33 +208,43 @@ class ChunkStorage:
 
     # Generic chunk operations
 
-    async def is_chunk(self, chunk_id: ChunkID):
+    @staticmethod
+    def _fetch_chunk_row(cursor, column: str, chunk_id: ChunkID):
+        cursor.execute(f"SELECT {column} FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+        return cursor.fetchone()
+
+    async def _get_chunk_row(self, column: str, chunk_id: ChunkID):
+        if self._use_reader(chunk_id):
+            return await self.localdb.run_read_query(
+                lambda cursor: self._fetch_chunk_row(cursor, column, chunk_id)
+            )
         async with self._open_cursor() as cursor:
-            cursor.execute("SELECT chunk_id FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
-            manifest_row = cursor.fetchone()
+            return self._fetch_chunk_row(cursor, column, chunk_id)
+
+    async def is_chunk(self, chunk_id: ChunkID):
+        manifest_row = await self._get_chunk_row("chunk_id", chunk_id)
         return bool(manifest_row)
 
     async def get_chunk(self, chunk_id: ChunkID):
-        async with self._open_cursor() as cursor:
-            cursor.execute(
-                """
-                UPDATE chunks SET accessed_on = ? WHERE chunk_id = ?;
-                """,
-                (time.time(), chunk_id.bytes),
-            )
-            cursor.execute("SELECT changes()")
-            changes, = cursor.fetchone()
-            if not changes:
+        data = self._memory_cache_get(chunk_id)
+        if data is None:
+            generation = self._memory_cache_generation
+            row = await self._get_chunk_row("data", chunk_id)
+            if not row:
                 raise FSLocalMissError(chunk_id)
 
-            cursor.execute("""SELECT data FROM chunks WHERE chunk_id = ?""", (chunk_id.bytes,))
-            ciphered, = cursor.fetchone()
+            ciphered, = row
+            data = await decrypt(self.local_symkey, ciphered)
+            if generation == self._memory_cache_generation:
+                self._memory_cache_set(chunk_id, data)
 
-        return self.local_symkey.decrypt(ciphered)
+        await self._register_access(chunk_id)
+        return data
 
     async def set_chunk(self, chunk_id: ChunkID, raw: bytes):
         assert isinstance(raw, (bytes, bytearray))
-        ciphered = self.local_symkey.encrypt(raw)
+        ciphered = await encrypt(self.local_symkey, raw)
+        self.invalidate_memory_cache((chunk_id,))
 
         # Update database
         async with self._open_cursor() as cursor:
@@ -110,12 +254,40 @@ class ChunkStorage:
                 VALUES (?, ?, ?, ?, ?)""",
                 (chunk_id.bytes, len(ciphered), False, time.time(), ciphered),
             )
+            self._mark_uncommitted((chunk_id,))
+
+    async def set_chunks(self, chunks: List[Tuple[ChunkID, bytes]]):
+        now = time.time()
+
+        def _encrypt_rows():
+            rows = []
+            for chunk_id, raw in chunks:
+                assert isinstance(raw, (bytes, bytearray))
+                ciphered = self.local_symkey.encrypt(raw)
+                rows.append((chunk_id.bytes, len(ciphered), False, now, ciphered))
+            return rows
+
+        # Encrypt the whole batch in a single trip to the worker thread
+        rows = await run_crypto(_encrypt_rows, size=sum(len(raw) for _, raw in chunks))
+        self.invalidate_memory_cache(chunk_id for chunk_id, _ in chunks)
+
+        # Update database in a single transaction
+        async with self._open_cursor() as cursor:
+            cursor.executemany(
+                """INSERT OR REPLACE INTO
+                chunks (chunk_id, size, offline, accessed_on, data)
+                VALUES (?, ?, ?, ?, ?)""",
+                rows,
+            )
+            self._mark_uncommitted(chunk_id for chunk_id, _ in chunks)
 
     async def clear_chunk(self, chunk_id: ChunkID):
+        self.invalidate_memory_cache((chunk_id,))
         async with self._open_cursor() as cursor:
             cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
             cursor.execute("SELECT changes()")
             changes, = cursor.fetchone()
+            self._mark_uncommitted((chunk_id,))
 
         if not changes:
             raise FSLocalMissError(chunk_id)
@@ -124,8 +296,14 @@ class ChunkStorage:
 class BlockStorage(ChunkStorage):
     """Interface for caching the data blocks."""
 
-    def __init__(self, device: LocalDevice, localdb: LocalDatabase, cache_size: int):
-        super().__init__(device, localdb)
+    def __init__(
+        self,
+        device: LocalDevice,
+        localdb: LocalDatabase,
+        cache_size: int,
+        memory_cache_size: int = DEFAULT_MEMORY_CACHE_SIZE,
+    ):
+        super().__init__(device, localdb, memory_cache_size=memory_cache_size)
         self.cache_size = cache_size
 
     def _open_cursor(self):
@@ -142,27 +320,37 @@ class BlockStorage(ChunkStorage):
         return self.cache_size // DEFAULT_BLOCK_SIZE
 
     async def clear_all_blocks(self):
+        self.clear_memory_cache()
         async with self._open_cursor() as cursor:
             cursor.execute("DELETE FROM chunks")
 
     async def clear_old_blocks(self, limit):
+        # The least recently used blocks are determined from the database
+        await self.flush_accessed_on()
         async with self._open_cursor() as cursor:
-            cursor.execute(
-                """
-                DELETE FROM chunks WHERE chunk_id IN (
-                    SELECT chunk_id FROM chunks ORDER BY accessed_on ASC LIMIT ?
-                )
-                """,
-                (limit,),
-            )
+            cursor.execute("SELECT chunk_id FROM chunks ORDER BY accessed_on ASC LIMIT ?", (limit,))
+            rows = cursor.fetchall()
+            cursor.executemany("DELETE FROM chunks WHERE chunk_id = ?", rows)
+        # Only the removed blocks are dropped from the memory cache
+        self.invalidate_memory_cache(ChunkID(UUID(bytes=row[0])) for row in rows)
 
-    # Upgraded set method
+    # Upgraded set methods
 
     async def set_chunk(self, chunk_id: ChunkID, raw: bytes):
         # Actual set operation
         await super().set_chunk(chunk_id, raw)
 
         # Clean up if necessary
+        await self._cleanup_extra_blocks()
+
+    async def set_chunks(self, chunks: List[Tuple[ChunkID, bytes]]):
+        # Actual set operation
+        await super().set_chunks(chunks)
+
+        # Clean up if necessary, once for the whole batch
+        await self._cleanup_extra_blocks()
+
+    async def _cleanup_extra_blocks(self):
         nb_blocks = await self.get_nb_blocks()
         extra_blocks = nb_blocks - self.block_limit
         if extra_blocks > 0:
@@ -66,16 +66,36 @@ def protect_with_lock(fn):
     return wrapper
 
 
+def _run_with_cursor(conn, fn):
+    cursor = conn.cursor()
+    try:
+        return fn(cursor)
+    finally:
+        cursor.close()
+
+
 class LocalDatabase:
-    """Base class for managing an sqlite3 connection."""
+    """Base class for managing an sqlite3 connection.
 
-    def __init__(self, path, vacuum_threshold=None):
+    All the writes go through a single connection, protected by a lock.
+    Optionally, a pool of `max_readers` read-only connections can be used
+    to run queries in worker threads, concurrently with the writes (this
+    is possible thanks to the WAL journal mode). Those connections only
+    see the committed data.
+    """
+
+    def __init__(self, path, vacuum_threshold=None, max_readers=0):
         self._conn = None
         self._lock = trio.Lock()
         self._run_in_thread = None
+        self._reader_conns = []
+        self._readers_semaphore = trio.Semaphore(max(max_readers, 1))
 
         self.path = Path(path)
         self.vacuum_threshold = vacuum_threshold
+        self.max_readers = max_readers
+        # Incremented every time the pending changes are committed
+        self.commit_count = 0
 
     @classmethod
     @asynccontextmanager
@@ -90,6 +110,7 @@ class LocalDatabase:
             # Create the connection to the sqlite database
             try:
                 await self._connect()
+                await self._connect_readers()
 
                 # Yield the instance
                 yield self
@@ -97,6 +118,7 @@ class LocalDatabase:
             # Safely flush and close the connection
             finally:
                 with trio.CancelScope(shield=True):
+                    self._close_readers()
                     await self._close()
 
     # Life cycle
@@ -130,6 +152,18 @@ class LocalDatabase:
         # Connect and initialize database
         self._conn = await self._create_connection()
 
+    async def _connect_readers(self):
+        # The writer connection has already created the database and its WAL files
+        uri = f"{self.path.resolve().as_uri()}?mode=ro"
+        for _ in range(self.max_readers):
+            conn = sqlite_connect(uri, uri=True, check_same_thread=False)
+            self._reader_conns.append(conn)
+
+    def _close_readers(self):
+        for conn in self._reader_conns:
+            conn.close()
+        self._reader_conns.clear()
+
     @protect_with_lock
     async def _close(self):
         # Idempotency
@@ -138,6 +172,7 @@ class LocalDatabase:
 
         # Commit and close
         await self._run_in_thread(self._conn.commit)
+        self.commit_count += 1
         self._conn.close()
         self._conn = None
 
@@ -156,6 +191,7 @@ class LocalDatabase:
             # Commit the transaction when finished
             if commit and self._conn.in_transaction:
                 await self._run_in_thread(self._conn.commit)
+                self.commit_count += 1
 
         # Close cursor
         finally:
@@ -164,6 +200,27 @@ class LocalDatabase:
     @protect_with_lock
     async def commit(self):
         await self._run_in_thread(self._conn.commit)
+        self.commit_count += 1
+
+    # Concurrent readers
+
+    @property
+    def has_readers(self) -> bool:
+        return bool(self._reader_conns)
+
+    async def run_read_query(self, fn):
+        """Run `fn(cursor)` in a worker thread using a read-only connection.
+
+        Only the committed data is visible from there, it's up to the caller
+        to use `open_cursor` instead when reading data that might not be
+        committed yet.
+        """
+        async with self._readers_semaphore:
+            conn = self._reader_conns.pop()
+            try:
+                return await trio.to_thread.run_sync(_run_with_cursor, conn, fn)
+            finally:
+                self._reader_conns.append(conn)
 
     # Vacuum
 
@@ -184,13 +241,20 @@ class LocalDatabase:
 
         # Flush to disk
         await self._run_in_thread(self._conn.commit)
+        self.commit_count += 1
 
         # No reason to vacuum yet
         if self.get_disk_usage() < self.vacuum_threshold:
             return
 
-        # Run vacuum
-        await self._run_in_thread(self._conn.execute, "VACUUM")
+        # Run vacuum, without any reader in the way
+        for _ in range(self.max_readers):
+            await self._readers_semaphore.acquire()
+        try:
+            await self._run_in_thread(self._conn.execute, "VACUUM")
+        finally:
+            for _ in range(self.max_readers):
+                self._readers_semaphore.release()
 
         # The connection needs to be recreated
         try:
@@ -1,31 +1,93 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import attr
 import trio
+from collections import OrderedDict
 from structlog import get_logger
-from typing import Dict, Tuple, Set, Optional
+from typing import Dict, Tuple, Set, Optional, Iterable, List
 from async_generator import asynccontextmanager
 
 from parsec.core.fs.exceptions import FSLocalMissError
 from parsec.core.types import EntryID, ChunkID, LocalDevice, LocalManifest
 from parsec.core.fs.storage.local_database import LocalDatabase
+from parsec.core.fs.storage.chunk_storage import ChunkStorage
+from parsec.core.fs.crypto_offload import run_crypto
 
 logger = get_logger()
 
 
+# Maximum number of manifests kept in memory by each manifest storage
+DEFAULT_MANIFEST_CACHE_SIZE = 10000
+# Number of manifests waiting for a group commit that triggers the flush
+# (regardless of the flush interval)
+DEFAULT_FLUSH_THRESHOLD = 1024
+# Rough size of a serialized manifest, used to decide whether the bulk
+# encryption is worth running in a worker thread
+MANIFEST_SIZE_ESTIMATE = 1024
+
+
+def _dump_and_encrypt_manifests(manifests: List[LocalManifest], key) -> List[bytes]:
+    return [manifest.dump_and_encrypt(key) for manifest in manifests]
+
+
+@attr.s(slots=True, auto_attribs=True)
+class ManifestCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    # Number of manifests kept in memory
+    entries: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
 class ManifestStorage:
     """Persistent storage with cache for storing manifests.
 
     Also stores the checkpoint.
+
+    By default, each manifest set without `cache_only` is written right away
+    in its own transaction. With a `flush_interval`, those manifests are
+    instead group-committed: they are all written in a single transaction
+    once `flush_interval` seconds have passed since the first of them, or
+    as soon as `flush_threshold` of them are waiting.
+
+    The manifests are kept in a memory LRU cache bounded to `cache_size`
+    entries. The manifests not yet written to the local database, as well
+    as the realm root manifest, are never evicted.
     """
 
-    def __init__(self, device: LocalDevice, localdb: LocalDatabase, realm_id: EntryID):
+    def __init__(
+        self,
+        device: LocalDevice,
+        localdb: LocalDatabase,
+        realm_id: EntryID,
+        chunk_storage: Optional[ChunkStorage] = None,
+        flush_interval: Optional[float] = None,
+        flush_threshold: int = DEFAULT_FLUSH_THRESHOLD,
+        cache_size: int = DEFAULT_MANIFEST_CACHE_SIZE,
+    ):
         self.device = device
         self.localdb = localdb
         self.realm_id = realm_id
-
-        # This cache contains all the manifests that have been set or accessed
-        # since the last call to `clear_memory_cache`
-        self._cache = {}
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.cache_size = cache_size
+        # Chunk storage sharing the same localdb, if any. Its memory cache
+        # has to be invalidated when the chunks are removed from here.
+        self.chunk_storage = chunk_storage
+
+        # This cache contains the manifests that have been recently set or
+        # accessed, ordered from the least to the most recently used
+        self._cache: Dict[EntryID, LocalManifest] = OrderedDict()
+        self._cache_statistics = ManifestCacheStatistics()
+        # Incremented when manifests are removed from the cache or committed,
+        # so a manifest read concurrently from the database doesn't end up
+        # stale in the cache
+        self._cache_generation = 0
 
         # This dictionnary keeps track of all the entry ids of the manifests
         # that have been added to the cache but still needs to be written to
@@ -35,6 +97,10 @@ class ManifestStorage:
         # still requires to be flushed.
         self._cache_ahead_of_localdb = {}
 
+        # Entry ids waiting for the next group commit
+        self._pending_flush = set()
+        self._flush_requested = trio.Event()
+
     @property
     def path(self):
         return self.localdb.path
@@ -45,7 +111,13 @@ class ManifestStorage:
         self = cls(*args, **kwargs)
         await self._create_db()
         try:
-            yield self
+            async with trio.open_service_nursery() as nursery:
+                if self.flush_interval is not None:
+                    nursery.start_soon(self._run_group_commits)
+                try:
+                    yield self
+                finally:
+                    nursery.cancel_scope.cancel()
         finally:
             with trio.CancelScope(shield=True):
                 await self._flush_cache_ahead_of_persistance()
@@ -59,7 +131,10 @@ class ManifestStorage:
         if flush:
             await self._flush_cache_ahead_of_persistance()
         self._cache_ahead_of_localdb.clear()
+        self._pending_flush.clear()
         self._cache.clear()
+        self._cache_generation += 1
+        self._cache_statistics.entries = 0
 
     # Database initialization
 
@@ -89,6 +164,38 @@ class ManifestStorage:
                 """
             )
 
+    # Memory cache
+
+    def get_memory_cache_statistics(self) -> ManifestCacheStatistics:
+        return attr.evolve(self._cache_statistics)
+
+    def _cache_get(self, entry_id: EntryID) -> Optional[LocalManifest]:
+        try:
+            manifest = self._cache[entry_id]
+        except KeyError:
+            self._cache_statistics.misses += 1
+            return None
+        self._cache.move_to_end(entry_id)
+        self._cache_statistics.hits += 1
+        return manifest
+
+    def _cache_evict(self) -> None:
+        stats = self._cache_statistics
+        excess = len(self._cache) - self.cache_size
+        if excess > 0:
+            # Evict the least recently used entries that are not pinned
+            evicted = []
+            for entry_id in self._cache:
+                if entry_id in self._cache_ahead_of_localdb or entry_id == self.realm_id:
+                    continue
+                evicted.append(entry_id)
+                if len(evicted) == excess:
+                    break
+            for entry_id in evicted:
+                del self._cache[entry_id]
+            stats.evictions += len(evicted)
+        stats.entries = len(self._cache)
+
     # Checkpoint operations
 
     async def get_realm_checkpoint(self) -> int:
@@ -106,6 +213,8 @@ class ManifestStorage:
         """
         Raises: Nothing !
         """
+        # The vlobs to update have to be in the database
+        await self._flush_pending()
         async with self._open_cursor() as cursor:
             cursor.executemany(
                 "UPDATE vlobs SET remote_version = ? WHERE vlob_id = ?",
@@ -121,6 +230,7 @@ class ManifestStorage:
         """
         Raises: Nothing !
         """
+        await self._flush_pending()
         async with self._open_cursor() as cursor:
             cursor.execute(
                 "SELECT vlob_id, need_sync, base_version, remote_version "
@@ -138,21 +248,35 @@ class ManifestStorage:
 
     # Manifest operations
 
+    @staticmethod
+    def _fetch_manifest_row(cursor, entry_id: EntryID):
+        cursor.execute("SELECT blob FROM vlobs WHERE vlob_id = ?", (entry_id.bytes,))
+        return cursor.fetchone()
+
     async def get_manifest(self, entry_id: EntryID) -> LocalManifest:
         """
         Raises:
             FSLocalMissError
         """
         # Look in cache first
-        try:
-            return self._cache[entry_id]
-        except KeyError:
-            pass
+        manifest = self._cache_get(entry_id)
+        if manifest is not None:
+            return manifest
+
+        # Look into the database (the manifests that are not committed yet
+        # are always in the cache, so a read-only connection can be used)
+        generation = self._cache_generation
+        if self.localdb.has_readers:
+            manifest_row = await self.localdb.run_read_query(
+                lambda cursor: self._fetch_manifest_row(cursor, entry_id)
+            )
+        else:
+            async with self._open_cursor() as cursor:
+                manifest_row = self._fetch_manifest_row(cursor, entry_id)
 
-        # Look into the database
-        async with self._open_cursor() as cursor:
-            cursor.execute("SELECT blob FROM vlobs WHERE vlob_id = ?", (entry_id.bytes,))
-            manifest_row = cursor.fetchone()
+        # The cache has been cleared in the meantime, the row might be outdated
+        if generation != self._cache_generation:
+            return await self.get_manifest(entry_id)
 
         # Not found
         if not manifest_row:
@@ -160,9 +284,17 @@ class ManifestStorage:
 
         # Safely fill the cache
         if entry_id not in self._cache:
-            self._cache[entry_id] = LocalManifest.decrypt_and_load(
-                manifest_row[0], key=self.device.local_symkey
+            ciphered = manifest_row[0]
+            manifest = await run_crypto(
+                LocalManifest.decrypt_and_load,
+                ciphered,
+                self.device.local_symkey,
+                size=len(ciphered),
             )
+            # The manifest might have been set in the meantime
+            manifest = self._cache.setdefault(entry_id, manifest)
+            self._cache_evict()
+            return manifest
 
         # Always return the cached value
         return self._cache[entry_id]
@@ -181,9 +313,11 @@ class ManifestStorage:
 
         # Set the cache first
         self._cache[entry_id] = manifest
+        self._cache.move_to_end(entry_id)
 
-        # Tag the entry as ahead of localdb
+        # Tag the entry as ahead of localdb (which pins it in the cache)
         self._cache_ahead_of_localdb.setdefault(entry_id, set())
+        self._cache_evict()
 
         # Cleanup
         if removed_ids:
@@ -191,25 +325,59 @@ class ManifestStorage:
 
         # Flush the cached value to the localdb
         if not cache_only:
+            await self._request_manifest_persistence(entry_id)
+
+    async def _request_manifest_persistence(self, entry_id: EntryID) -> None:
+        if self.flush_interval is None:
             await self._ensure_manifest_persistent(entry_id)
+            return
+
+        # Wait for the next group commit
+        self._pending_flush.add(entry_id)
+        if len(self._pending_flush) >= self.flush_threshold:
+            await self._flush_pending()
+        else:
+            self._flush_requested.set()
+
+    async def _run_group_commits(self) -> None:
+        while True:
+            await self._flush_requested.wait()
+            await trio.sleep(self.flush_interval)
+            self._flush_requested = trio.Event()
+            await self._flush_pending()
+
+    async def _flush_pending(self) -> None:
+        entry_ids, self._pending_flush = self._pending_flush, set()
+        await self._ensure_manifests_persistent(entry_ids)
 
     async def _ensure_manifest_persistent(self, entry_id: EntryID) -> None:
+        await self._ensure_manifests_persistent((entry_id,))
+
+    async def _ensure_manifests_persistent(self, entry_ids: Iterable[EntryID]) -> None:
 
         # Get cursor
         async with self._open_cursor() as cursor:
 
             # Flushing is not necessary
-            if entry_id not in self._cache_ahead_of_localdb:
+            entry_ids = [x for x in entry_ids if x in self._cache_ahead_of_localdb]
+            if not entry_ids:
                 return
 
-            # Safely get the manifest
-            manifest = self._cache[entry_id]
-
-            # Dump and decrypt the manifest
-            ciphered = manifest.dump_and_encrypt(self.device.local_symkey)
+            # Snapshot the manifests and their pending chunks
+            manifests = [self._cache[entry_id] for entry_id in entry_ids]
+            pending_chunk_ids = [set(self._cache_ahead_of_localdb[x]) for x in entry_ids]
+            removed_chunk_ids = set().union(*pending_chunk_ids)
+
+            # Dump and encrypt the manifests in bulk
+            ciphered = await run_crypto(
+                _dump_and_encrypt_manifests,
+                manifests,
+                self.device.local_symkey,
+                size=len(manifests) * MANIFEST_SIZE_ESTIMATE,
+            )
 
             # Insert into the local database
-            cursor.execute(
+            cursor.executemany(
                 """INSERT OR REPLACE INTO vlobs (vlob_id, blob, need_sync, base_version, remote_version)
                 VALUES (
                     ?, ?, ?, ?,
@@ -219,36 +387,68 @@ class ManifestStorage:
                     )
                 )""",
                 (
-                    entry_id.bytes,
-                    ciphered,
-                    manifest.need_sync,
-                    manifest.base_version,
-                    manifest.base_version,
-                    entry_id.bytes,
+                    (
+                        entry_id.bytes,
+                        blob,
+                        manifest.need_sync,
+                        manifest.base_version,
+                        manifest.base_version,
+                        entry_id.bytes,
+                    )
+                    for entry_id, blob, manifest in zip(entry_ids, ciphered, manifests)
                 ),
             )
 
             # Clean all the pending chunks
-            for chunk_id in self._cache_ahead_of_localdb[entry_id]:
-                cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
-
-            # Safely tag entry as up-to-date
-            self._cache_ahead_of_localdb.pop(entry_id)
-
-    async def ensure_manifest_persistent(self, entry_id: EntryID) -> None:
+            if removed_chunk_ids:
+                cursor.executemany(
+                    "DELETE FROM chunks WHERE chunk_id = ?",
+                    ((chunk_id.bytes,) for chunk_id in removed_chunk_ids),
+                )
+
+        # The transaction is committed at this point: a concurrent read that
+        # started before the commit might have fetched outdated rows, so it
+        # must not fill the cache once the written manifests get evicted
+        self._cache_generation += 1
+        if self.chunk_storage is not None:
+            self.chunk_storage.invalidate_memory_cache(removed_chunk_ids)
+
+        # Safely tag entries as up-to-date, unless they have changed
+        # while the manifests were being encrypted or committed
+        for entry_id, manifest, chunk_ids in zip(entry_ids, manifests, pending_chunk_ids):
+            remaining_chunk_ids = self._cache_ahead_of_localdb.get(entry_id)
+            if remaining_chunk_ids is None:
+                continue
+            remaining_chunk_ids -= chunk_ids
+            if not remaining_chunk_ids and self._cache.get(entry_id) is manifest:
+                del self._cache_ahead_of_localdb[entry_id]
+
+        # The written manifests are no longer pinned
+        self._cache_evict()
+
+    async def ensure_manifest_persistent(
+        self, entry_id: EntryID, group_commit: bool = False
+    ) -> None:
         """
+        With `group_commit`, the manifest is allowed to wait for the next
+        group commit (if enabled) instead of being written right away.
+
         Raises: Nothing !
         """
         assert isinstance(entry_id, EntryID)
         # Flush if necessary
-        if entry_id in self._cache_ahead_of_localdb:
+        if entry_id not in self._cache_ahead_of_localdb:
+            return
+        if group_commit:
+            await self._request_manifest_persistence(entry_id)
+        else:
             await self._ensure_manifest_persistent(entry_id)
 
     async def _flush_cache_ahead_of_persistance(self) -> None:
         # Flush until the all the cache is gone
+        self._pending_flush.clear()
         while self._cache_ahead_of_localdb:
-            entry_id = next(iter(self._cache_ahead_of_localdb))
-            await self._ensure_manifest_persistent(entry_id)
+            await self._ensure_manifests_persistent(list(self._cache_ahead_of_localdb))
 
     # This method is not used in the code base but it is still tested
     # as it might come handy in a cleanup routine later
@@ -263,6 +463,8 @@ class ManifestStorage:
 
             # Safely remove from cache
             in_cache = bool(self._cache.pop(entry_id, None))
+            self._cache_generation += 1
+            self._cache_statistics.entries = len(self._cache)
 
             # Remove from local database
             cursor.execute("DELETE FROM vlobs WHERE vlob_id = ?", (entry_id.bytes,))
@@ -272,8 +474,14 @@ class ManifestStorage:
             # Clean all the pending chunks
             # TODO: should also add the content of the popped manifest
             pending_chunk_ids = self._cache_ahead_of_localdb.pop(entry_id, ())
-            for chunk_id in pending_chunk_ids:
-                cursor.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id.bytes,))
+            self._pending_flush.discard(entry_id)
+            if pending_chunk_ids:
+                cursor.executemany(
+                    "DELETE FROM chunks WHERE chunk_id = ?",
+                    ((chunk_id.bytes,) for chunk_id in pending_chunk_ids),
+                )
+            if self.chunk_storage is not None:
+                self.chunk_storage.invalidate_memory_cache(pending_chunk_ids)
 
         # Raise a miss if the entry wasn't found
         if not deleted and not in_cache:
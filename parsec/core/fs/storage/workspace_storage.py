@@ -2,7 +2,7 @@
 
 from pathlib import Path
 from collections import defaultdict
-from typing import Dict, Tuple, Set, Optional
+from typing import Dict, Tuple, Set, Optional, List
 
 import trio
 from trio import hazmat
@@ -22,8 +22,17 @@ from parsec.core.types import (
 from parsec.core.fs.exceptions import FSError, FSLocalMissError, FSInvalidFileDescriptor
 
 from parsec.core.fs.storage.local_database import LocalDatabase
-from parsec.core.fs.storage.manifest_storage import ManifestStorage
-from parsec.core.fs.storage.chunk_storage import ChunkStorage, BlockStorage
+from parsec.core.fs.storage.manifest_storage import (
+    ManifestStorage,
+    ManifestCacheStatistics,
+    DEFAULT_MANIFEST_CACHE_SIZE,
+)
+from parsec.core.fs.storage.chunk_storage import (
+    ChunkStorage,
+    BlockStorage,
+    ChunkCacheStatistics,
+    DEFAULT_MEMORY_CACHE_SIZE,
+)
 from parsec.core.fs.storage.version import WORKSPACE_DATA_STORAGE_NAME, WORKSPACE_CACHE_STORAGE_NAME
 
 
@@ -32,6 +41,8 @@ logger = get_logger()
 # TODO: should be in config.py
 DEFAULT_BLOCK_CACHE_SIZE = 512 * 1024 * 1024
 DEFAULT_CHUNK_VACUUM_THRESHOLD = 512 * 1024 * 1024
+# Number of read-only connections to each local database
+DEFAULT_DATABASE_READERS = 4
 
 
 class WorkspaceStorage:
@@ -83,30 +94,44 @@ class WorkspaceStorage:
         workspace_id: EntryID,
         cache_size=DEFAULT_BLOCK_CACHE_SIZE,
         vacuum_threshold=DEFAULT_CHUNK_VACUUM_THRESHOLD,
+        memory_cache_size=DEFAULT_MEMORY_CACHE_SIZE,
+        max_readers=DEFAULT_DATABASE_READERS,
+        manifest_flush_interval=None,
+        manifest_cache_size=DEFAULT_MANIFEST_CACHE_SIZE,
     ):
         data_path = path / WORKSPACE_DATA_STORAGE_NAME
         cache_path = path / WORKSPACE_CACHE_STORAGE_NAME
 
         # Local cache storage service
-        async with LocalDatabase.run(cache_path) as cache_localdb:
+        async with LocalDatabase.run(cache_path, max_readers=max_readers) as cache_localdb:
 
             # Local data storage service
             async with LocalDatabase.run(
-                data_path, vacuum_threshold=vacuum_threshold
+                data_path, vacuum_threshold=vacuum_threshold, max_readers=max_readers
             ) as data_localdb:
 
                 # Block storage service
                 async with BlockStorage.run(
-                    device, cache_localdb, cache_size=cache_size
+                    device,
+                    cache_localdb,
+                    cache_size=cache_size,
+                    memory_cache_size=memory_cache_size,
                 ) as block_storage:
 
-                    # Manifest storage service
-                    async with ManifestStorage.run(
-                        device, data_localdb, workspace_id
-                    ) as manifest_storage:
-
-                        # Chunk storage service
-                        async with ChunkStorage.run(device, data_localdb) as chunk_storage:
+                    # Chunk storage service
+                    async with ChunkStorage.run(
+                        device, data_localdb, memory_cache_size=memory_cache_size
+                    ) as chunk_storage:
+
+                        # Manifest storage service
+                        async with ManifestStorage.run(
+                            device,
+                            data_localdb,
+                            workspace_id,
+                            chunk_storage=chunk_storage,
+                            flush_interval=manifest_flush_interval,
+                            cache_size=manifest_cache_size,
+                        ) as manifest_storage:
 
                             # Instanciate workspace storage
                             yield cls(
@@ -128,6 +153,19 @@ class WorkspaceStorage:
 
     async def clear_memory_cache(self, flush=True):
         await self.manifest_storage.clear_memory_cache(flush=flush)
+        for storage in (self.chunk_storage, self.block_storage):
+            if flush:
+                await storage.flush_accessed_on()
+            storage.clear_memory_cache()
+
+    def get_chunk_cache_statistics(self) -> Dict[str, ChunkCacheStatistics]:
+        return {
+            "chunks": self.chunk_storage.get_memory_cache_statistics(),
+            "blocks": self.block_storage.get_memory_cache_statistics(),
+        }
+
+    def get_manifest_cache_statistics(self) -> ManifestCacheStatistics:
+        return self.manifest_storage.get_memory_cache_statistics()
 
     # Locking helpers
 
@@ -186,9 +224,11 @@ class WorkspaceStorage:
             entry_id, manifest, cache_only=cache_only, removed_ids=removed_ids
         )
 
-    async def ensure_manifest_persistent(self, entry_id: EntryID) -> None:
+    async def ensure_manifest_persistent(
+        self, entry_id: EntryID, group_commit: bool = False
+    ) -> None:
         self._check_lock_status(entry_id)
-        await self.manifest_storage.ensure_manifest_persistent(entry_id)
+        await self.manifest_storage.ensure_manifest_persistent(entry_id, group_commit=group_commit)
 
     async def clear_manifest(self, entry_id: EntryID) -> None:
         self._check_lock_status(entry_id)
@@ -200,6 +240,12 @@ class WorkspaceStorage:
         assert isinstance(block_id, BlockID)
         return await self.block_storage.set_chunk(ChunkID(block_id), block)
 
+    async def set_clean_blocks(self, blocks: List[Tuple[BlockID, bytes]]) -> None:
+        assert all(isinstance(block_id, BlockID) for block_id, _ in blocks)
+        return await self.block_storage.set_chunks(
+            [(ChunkID(block_id), block) for block_id, block in blocks]
+        )
+
     async def clear_clean_block(self, block_id: BlockID) -> None:
         assert isinstance(block_id, BlockID)
         try:
@@ -212,6 +258,12 @@ class WorkspaceStorage:
 
     # Chunk interface
 
+    async def is_chunk(self, chunk_id: ChunkID) -> bool:
+        assert isinstance(chunk_id, ChunkID)
+        if await self.chunk_storage.is_chunk(chunk_id):
+            return True
+        return await self.block_storage.is_chunk(chunk_id)
+
     async def get_chunk(self, chunk_id: ChunkID) -> bytes:
         assert isinstance(chunk_id, ChunkID)
         try:
@@ -219,6 +271,10 @@ class WorkspaceStorage:
         except FSLocalMissError:
             return await self.block_storage.get_chunk(chunk_id)
 
+    async def is_dirty_chunk(self, chunk_id: ChunkID) -> bool:
+        assert isinstance(chunk_id, ChunkID)
+        return await self.chunk_storage.is_chunk(chunk_id)
+
     async def set_chunk(self, chunk_id: ChunkID, block: bytes) -> None:
         assert isinstance(chunk_id, ChunkID)
         return await self.chunk_storage.set_chunk(chunk_id, block)
@@ -317,5 +373,7 @@ class WorkspaceStorageTimestamped(WorkspaceStorage):
         self._check_lock_status(entry_id)
         self._cache[entry_id] = manifest
 
-    async def ensure_manifest_persistent(self, entry_id: EntryID) -> None:
+    async def ensure_manifest_persistent(
+        self, entry_id: EntryID, group_commit: bool = False
+    ) -> None:
         pass
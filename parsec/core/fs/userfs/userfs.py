@@ -3,7 +3,7 @@
 import trio
 from pathlib import Path
 from pendulum import Pendulum, now as pendulum_now
-from typing import List, Tuple, Optional, Union
+from typing import List, Tuple, Optional, Union, Callable
 from structlog import get_logger
 
 from async_generator import asynccontextmanager
@@ -44,8 +44,14 @@ from parsec.core.remote_devices_manager import (
 )
 
 from parsec.core.fs.workspacefs import WorkspaceFS
-from parsec.core.fs.remote_loader import RemoteLoader
+from parsec.core.fs.workspacefs.read_ahead import DEFAULT_READ_AHEAD_MAX_BLOCKS
+from parsec.core.fs.remote_loader import (
+    RemoteLoader,
+    DEFAULT_BLOCK_DOWNLOAD_MAX_CONCURRENCY,
+    DEFAULT_BLOCK_UPLOAD_MAX_CONCURRENCY,
+)
 from parsec.core.fs.storage import UserStorage, WorkspaceStorage
+from parsec.core.fs.storage.manifest_storage import DEFAULT_MANIFEST_CACHE_SIZE
 from parsec.core.fs.userfs.merging import merge_local_user_manifests, merge_workspace_entry
 from parsec.core.fs.exceptions import (
     FSError,
@@ -62,6 +68,23 @@ logger = get_logger()
 
 AnyEntryName = Union[EntryName, str]
 
+# Bounds of the number of vlob atoms reencrypted at once (the backend doesn't
+# provide more than 1000 vlob atoms per batch)
+REENCRYPTION_BATCH_MIN_SIZE = 10
+REENCRYPTION_BATCH_MAX_SIZE = 1000
+REENCRYPTION_BATCH_DEFAULT_SIZE = 100
+# Duration (in seconds) the batches should take, big enough to amortize the
+# round trips with the backend yet small enough to report progress regularly
+REENCRYPTION_BATCH_TARGET_DURATION = 1.0
+# Number of threads decrypting and encrypting the vlob atoms of a batch
+REENCRYPTION_MAX_THREADS = 4
+
+
+def _adapt_batch_size(size: int, duration: float) -> int:
+    # Don't more than double the size at once, a batch may have been fast by chance
+    size = min(size * 2, int(size * REENCRYPTION_BATCH_TARGET_DURATION / max(duration, 1e-3)))
+    return max(REENCRYPTION_BATCH_MIN_SIZE, min(REENCRYPTION_BATCH_MAX_SIZE, size))
+
 
 class ReencryptionJob:
     def __init__(self, backend_cmds, new_workspace_entry, old_workspace_entry):
@@ -69,8 +92,91 @@ class ReencryptionJob:
         self.new_workspace_entry = new_workspace_entry
         self.old_workspace_entry = old_workspace_entry
         assert new_workspace_entry.id == old_workspace_entry.id
+        # Adapted by `do_all_batches` according to the time taken by each batch
+        self.batch_size = REENCRYPTION_BATCH_DEFAULT_SIZE
+
+    async def _backend_cmd(self, cmd, *args) -> dict:
+        workspace_id = self.new_workspace_entry.id
+        try:
+            rep = await cmd(*args)
+
+        except BackendNotAvailable as exc:
+            raise FSBackendOfflineError(str(exc)) from exc
 
-    async def do_one_batch(self, size=100) -> Tuple[int, int]:
+        except BackendConnectionError as exc:
+            raise FSError(
+                f"Cannot do reencryption maintenance on workspace {workspace_id}: {exc}"
+            ) from exc
+
+        if rep["status"] in ("not_in_maintenance", "bad_encryption_revision"):
+            raise FSWorkspaceNotInMaintenance(f"Reencryption job already finished: {rep}")
+        elif rep["status"] == "not_allowed":
+            raise FSWorkspaceNoAccess(
+                f"Not allowed to do reencryption maintenance on workspace {workspace_id}: {rep}"
+            )
+        elif rep["status"] != "ok":
+            raise FSError(f"Cannot do reencryption maintenance on workspace {workspace_id}: {rep}")
+        return rep
+
+    async def _get_batch(self, size: int, after: Optional[Tuple[EntryID, int]] = None) -> list:
+        rep = await self._backend_cmd(
+            self.backend_cmds.vlob_maintenance_get_reencryption_batch,
+            self.new_workspace_entry.id,
+            self.new_workspace_entry.encryption_revision,
+            size,
+            after,
+        )
+        batch = [(item["vlob_id"], item["version"], item["blob"]) for item in rep["batch"]]
+        if after is not None:
+            # Older backends ignore `after`
+            batch = [item for item in batch if item[:2] > after]
+        return batch
+
+    def _reencrypt(self, batch: list) -> list:
+        donebatch = []
+        for vlob_id, version, blob in batch:
+            cleartext = self.old_workspace_entry.key.decrypt(blob)
+            newciphered = self.new_workspace_entry.key.encrypt(cleartext)
+            donebatch.append((vlob_id, version, newciphered))
+        return donebatch
+
+    async def _reencrypt_in_threads(self, batch: list) -> list:
+        # Libsodium releases the GIL, so the batch is split among several threads
+        chunk_size = max(1, -(-len(batch) // REENCRYPTION_MAX_THREADS))
+        chunks = [batch[i : i + chunk_size] for i in range(0, len(batch), chunk_size)]
+        donechunks = [None] * len(chunks)
+
+        async def _reencrypt_chunk(index):
+            donechunks[index] = await trio.to_thread.run_sync(self._reencrypt, chunks[index])
+
+        async with trio.open_service_nursery() as nursery:
+            for index in range(len(chunks)):
+                nursery.start_soon(_reencrypt_chunk, index)
+        return [item for donechunk in donechunks for item in donechunk]
+
+    async def _save_batch(self, donebatch: list) -> Tuple[int, int]:
+        workspace_id = self.new_workspace_entry.id
+        new_encryption_revision = self.new_workspace_entry.encryption_revision
+        rep = await self._backend_cmd(
+            self.backend_cmds.vlob_maintenance_save_reencryption_batch,
+            workspace_id,
+            new_encryption_revision,
+            donebatch,
+        )
+        total = rep["total"]
+        done = rep["done"]
+
+        if total == done:
+            # Finish the maintenance
+            await self._backend_cmd(
+                self.backend_cmds.realm_finish_reencryption_maintenance,
+                workspace_id,
+                new_encryption_revision,
+            )
+
+        return total, done
+
+    async def do_one_batch(self, size: Optional[int] = None) -> Tuple[int, int]:
         """
         Raises:
             FSError
@@ -78,72 +184,58 @@ class ReencryptionJob:
             FSWorkspaceInMaintenance
             FSWorkspaceNoAccess
         """
-        workspace_id = self.new_workspace_entry.id
-        new_encryption_revision = self.new_workspace_entry.encryption_revision
+        batch = await self._get_batch(size or self.batch_size)
+        donebatch = await self._reencrypt_in_threads(batch)
+        return await self._save_batch(donebatch)
 
-        # Get the batch
-        try:
-            rep = await self.backend_cmds.vlob_maintenance_get_reencryption_batch(
-                workspace_id, new_encryption_revision, size
-            )
-            if rep["status"] in ("not_in_maintenance", "bad_encryption_revision"):
-                raise FSWorkspaceNotInMaintenance(f"Reencryption job already finished: {rep}")
-            elif rep["status"] == "not_allowed":
-                raise FSWorkspaceNoAccess(
-                    f"Not allowed to do reencryption maintenance on workspace {workspace_id}: {rep}"
-                )
-            elif rep["status"] != "ok":
-                raise FSError(
-                    f"Cannot do reencryption maintenance on workspace {workspace_id}: {rep}"
-                )
+    async def do_all_batches(
+        self, on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[int, int]:
+        """
+        Reencrypt batches until the end of the maintenance, the next batch being
+        fetched while the current one is reencrypted. The batch size is adapted
+        so each batch takes about `REENCRYPTION_BATCH_TARGET_DURATION`.
 
-            donebatch = []
-            for item in rep["batch"]:
-                cleartext = self.old_workspace_entry.key.decrypt(item["blob"])
-                newciphered = self.new_workspace_entry.key.encrypt(cleartext)
-                donebatch.append((item["vlob_id"], item["version"], newciphered))
-
-            rep = await self.backend_cmds.vlob_maintenance_save_reencryption_batch(
-                workspace_id, new_encryption_revision, donebatch
-            )
-            if rep["status"] in ("not_in_maintenance", "bad_encryption_revision"):
-                raise FSWorkspaceNotInMaintenance(f"Reencryption job already finished: {rep}")
-            elif rep["status"] == "not_allowed":
-                raise FSWorkspaceNoAccess(
-                    f"Not allowed to do reencryption maintenance on workspace {workspace_id}: {rep}"
-                )
-            elif rep["status"] != "ok":
-                raise FSError(
-                    f"Cannot do reencryption maintenance on workspace {workspace_id}: {rep}"
-                )
-            total = rep["total"]
-            done = rep["done"]
+        Returns early (with total != done) if there is no more vlob to fetch,
+        which happens when other jobs are reencrypting the remaining vlobs.
 
+        Raises:
+            FSError
+            FSBackendOfflineError
+            FSWorkspaceInMaintenance
+            FSWorkspaceNoAccess
+        """
+        batch = await self._get_batch(self.batch_size)
+        while True:
+            started_at = trio.current_time()
+            next_batch = []
+
+            async def _prefetch_next_batch():
+                nonlocal next_batch
+                after = batch[-1][:2]
+                next_batch = await self._get_batch(self.batch_size, after)
+
+            async with trio.open_service_nursery() as nursery:
+                if batch:
+                    nursery.start_soon(_prefetch_next_batch)
+                donebatch = await self._reencrypt_in_threads(batch)
+
+            total, done = await self._save_batch(donebatch)
+            if on_progress:
+                on_progress(total, done)
             if total == done:
-                # Finish the maintenance
-                rep = await self.backend_cmds.realm_finish_reencryption_maintenance(
-                    workspace_id, new_encryption_revision
-                )
-                if rep["status"] in ("not_in_maintenance", "bad_encryption_revision"):
-                    raise FSWorkspaceNotInMaintenance(f"Reencryption job already finished: {rep}")
-                elif rep["status"] == "not_allowed":
-                    raise FSWorkspaceNoAccess(
-                        f"Not allowed to do reencryption maintenance on workspace {workspace_id}: {rep}"
-                    )
-                elif rep["status"] != "ok":
-                    raise FSError(
-                        f"Cannot do reencryption maintenance on workspace {workspace_id}: {rep}"
-                    )
-
-        except BackendNotAvailable as exc:
-            raise FSBackendOfflineError(str(exc)) from exc
+                return total, done
 
-        except BackendConnectionError as exc:
-            raise FSError(
-                f"Cannot do reencryption maintenance on workspace {workspace_id}: {exc}"
-            ) from exc
+            if batch:
+                duration = trio.current_time() - started_at
+                self.batch_size = _adapt_batch_size(self.batch_size, duration)
+            else:
+                return total, done
 
-        return total, done
+            if not next_batch:
+                # The end has been reached, start over for the vlobs skipped meanwhile
+                next_batch = await self._get_batch(self.batch_size)
+            batch = next_batch
 
 
 class UserFS:
@@ -154,12 +246,22 @@ class UserFS:
         backend_cmds: APIV1_BackendAuthenticatedCmds,
         remote_devices_manager: RemoteDevicesManager,
         event_bus: EventBus,
+        block_download_max_concurrency: int = DEFAULT_BLOCK_DOWNLOAD_MAX_CONCURRENCY,
+        block_upload_max_concurrency: int = DEFAULT_BLOCK_UPLOAD_MAX_CONCURRENCY,
+        read_ahead_max_blocks: int = DEFAULT_READ_AHEAD_MAX_BLOCKS,
+        manifest_flush_interval: Optional[float] = None,
+        manifest_cache_size: int = DEFAULT_MANIFEST_CACHE_SIZE,
     ):
         self.device = device
         self.path = path
         self.backend_cmds = backend_cmds
         self.remote_devices_manager = remote_devices_manager
         self.event_bus = event_bus
+        self.block_download_max_concurrency = block_download_max_concurrency
+        self.block_upload_max_concurrency = block_upload_max_concurrency
+        self.read_ahead_max_blocks = read_ahead_max_blocks
+        self.manifest_flush_interval = manifest_flush_interval
+        self.manifest_cache_size = manifest_cache_size
 
         self.storage = None
 
@@ -235,16 +337,6 @@ class UserFS:
 
         await self.storage.set_user_manifest(manifest)
 
-    async def _instantiate_workspace_storage(self, workspace_id: EntryID) -> WorkspaceStorage:
-        path = self.path / str(workspace_id)
-
-        async def workspace_storage_task(task_status=trio.TASK_STATUS_IGNORED):
-            async with WorkspaceStorage.run(self.device, path, workspace_id) as workspace_storage:
-                task_status.started(workspace_storage)
-                await trio.sleep_forever()
-
-        return await self._workspace_storage_nursery.start(workspace_storage_task)
-
     async def _instantiate_workspace(self, workspace_id: EntryID) -> WorkspaceFS:
         # Workspace entry can change at any time, so we provide a way for
         # WorskpaeFS to load it each time it is needed
@@ -255,19 +347,43 @@ class UserFS:
                 raise FSWorkspaceNotFoundError(f"Unknown workspace `{workspace_id}`")
             return workspace_entry
 
-        # Instantiate the local storage
-        local_storage = await self._instantiate_workspace_storage(workspace_id)
-
-        # Instantiate the workspace
-        return WorkspaceFS(
-            workspace_id=workspace_id,
-            get_workspace_entry=get_workspace_entry,
-            device=self.device,
-            local_storage=local_storage,
-            backend_cmds=self.backend_cmds,
-            event_bus=self.event_bus,
-            remote_device_manager=self.remote_devices_manager,
-        )
+        path = self.path / str(workspace_id)
+
+        async def workspace_task(task_status=trio.TASK_STATUS_IGNORED):
+            # Instantiate the local storage
+            async with WorkspaceStorage.run(
+                self.device,
+                path,
+                workspace_id,
+                manifest_flush_interval=self.manifest_flush_interval,
+                manifest_cache_size=self.manifest_cache_size,
+            ) as local_storage:
+
+                # Instantiate the workspace
+                workspace = WorkspaceFS(
+                    workspace_id=workspace_id,
+                    get_workspace_entry=get_workspace_entry,
+                    device=self.device,
+                    local_storage=local_storage,
+                    backend_cmds=self.backend_cmds,
+                    event_bus=self.event_bus,
+                    remote_device_manager=self.remote_devices_manager,
+                    block_download_max_concurrency=self.block_download_max_concurrency,
+                    # Block prefetching runs as long as the user fs
+                    read_ahead_nursery=self._workspace_storage_nursery,
+                    read_ahead_max_blocks=self.read_ahead_max_blocks,
+                    block_upload_max_concurrency=self.block_upload_max_concurrency,
+                )
+                task_status.started(workspace)
+
+                # The buffered writes must reach the local storage before it closes
+                try:
+                    await workspace.transactions.run_write_buffers_flusher()
+                finally:
+                    with trio.CancelScope(shield=True):
+                        await workspace.transactions.flush_write_buffers()
+
+        return await self._workspace_storage_nursery.start(workspace_task)
 
     async def _create_workspace(
         self, workspace_id: EntryID, manifest: LocalWorkspaceManifest
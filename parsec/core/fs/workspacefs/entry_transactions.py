@@ -1,20 +1,26 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
-from typing import Tuple
+import trio
+from math import inf
+from typing import Tuple, Set, Dict, List, Optional, Iterable, AsyncIterator
 from async_generator import asynccontextmanager
 
 from parsec.core.types import (
     EntryID,
+    EntryName,
     FsPath,
     WorkspaceRole,
     LocalManifest,
     LocalFileManifest,
     LocalFolderManifest,
     FileDescriptor,
+    Chunk,
+    ChunkID,
 )
 
 
 from parsec.core.fs.workspacefs.file_transactions import FileTransactions
+from parsec.core.fs.workspacefs.file_operations import chunk_id_set
 from parsec.core.fs.utils import is_file_manifest, is_folder_manifest, is_folderish_manifest
 from parsec.core.fs.exceptions import (
     FSPermissionError,
@@ -27,13 +33,67 @@ from parsec.core.fs.exceptions import (
     FSIsADirectoryError,
     FSDirectoryNotEmptyError,
     FSLocalMissError,
+    FSRemoteManifestNotFound,
+    FSBackendOfflineError,
 )
 
 
 WRITE_RIGHT_ROLES = (WorkspaceRole.OWNER, WorkspaceRole.MANAGER, WorkspaceRole.CONTRIBUTOR)
 
+# Maximum number of resolved paths kept in memory by the path cache
+PATH_CACHE_MAX_SIZE = 128 * 1024
+
+# Maximum number of manifests downloaded in parallel when listing a folder
+MANIFEST_DOWNLOAD_MAX_CONCURRENCY = 8
+# Number of children manifests downloaded before their stats are returned
+FOLDER_STATS_BATCH_SIZE = 100
+
+
+def _manifest_stats(manifest: LocalManifest) -> dict:
+    # General stats
+    stats = {
+        "id": manifest.id,
+        "created": manifest.created,
+        "updated": manifest.updated,
+        "base_version": manifest.base_version,
+        "is_placeholder": manifest.is_placeholder,
+        "need_sync": manifest.need_sync,
+    }
+
+    # File/folder specific stats
+    if is_file_manifest(manifest):
+        stats["type"] = "file"
+        stats["size"] = manifest.size
+    else:
+        stats["type"] = "folder"
+        stats["children"] = sorted(manifest.children.keys())
+
+    return stats
+
 
 class EntryTransactions(FileTransactions):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Path parts -> entry id, only valid as long as none of the
+        # folders the resolution went through has seen its children change
+        self._path_cache = {}
+        self._path_cache_folders = set()
+        self._path_cache_generation = 0
+
+    # Event helper
+
+    def _send_event(self, event, **kwargs):
+        # Every change of a folder's children (local or downsynced) goes
+        # through those events, which makes them the invalidation points
+        if event in ("fs.entry.updated", "fs.entry.downsynced"):
+            self._invalidate_path_cache(kwargs["id"])
+        super()._send_event(event, **kwargs)
+
+    def _invalidate_path_cache(self, entry_id: EntryID) -> None:
+        if entry_id in self._path_cache_folders:
+            self._path_cache.clear()
+            self._path_cache_folders.clear()
+            self._path_cache_generation += 1
 
     # Right management helper
 
@@ -64,26 +124,85 @@ class EntryTransactions(FileTransactions):
                 remote_manifest = await self.remote_loader.load_manifest(exc.id)
                 local_manifest = LocalManifest.from_remote(remote_manifest)
                 await self.local_storage.set_manifest(entry_id, local_manifest)
+            # Make the pending writes visible (e.g. in the file size)
+            if entry_id in self._write_buffers:
+                local_manifest = await self._flush_write_buffer(local_manifest)
             yield local_manifest
 
     async def _load_manifest(self, entry_id: EntryID) -> LocalManifest:
         async with self._load_and_lock_manifest(entry_id) as manifest:
             return manifest
 
-    @asynccontextmanager
-    async def _lock_manifest_from_path(self, path: FsPath) -> LocalManifest:
-        # Root entry_id and manifest
-        entry_id = self.workspace_id
+    async def _load_manifests(
+        self, entry_ids: List[EntryID]
+    ) -> Dict[EntryID, Optional[LocalManifest]]:
+        # Manifests not found in the backend (or not available as the backend
+        # is offline) are returned as None
+        manifests: Dict[EntryID, Optional[LocalManifest]] = {}
+        send_channel, receive_channel = trio.open_memory_channel(inf)
+        with send_channel:
+            for entry_id in entry_ids:
+                send_channel.send_nowait(entry_id)
+
+        async def _worker():
+            async for entry_id in receive_channel:
+                try:
+                    manifests[entry_id] = await self._load_manifest(entry_id)
+                except (FSRemoteManifestNotFound, FSBackendOfflineError):
+                    manifests[entry_id] = None
+
+        async with trio.open_service_nursery() as nursery:
+            for _ in range(min(MANIFEST_DOWNLOAD_MAX_CONCURRENCY, len(entry_ids))):
+                nursery.start_soon(_worker)
+        return manifests
+
+    async def _resolve_path(self, path: FsPath) -> EntryID:
+        parts = path.parts
+        if not parts:
+            return self.workspace_id
+        entry_id = self._path_cache.get(parts)
+        if entry_id is not None:
+            return entry_id
+
+        # Start from the closest resolved ancestor
+        index = len(parts) - 1
+        while index > 0:
+            entry_id = self._path_cache.get(parts[:index])
+            if entry_id is not None:
+                break
+            index -= 1
+        else:
+            entry_id = self.workspace_id
 
-        # Follow the path
-        for name in path.parts:
+        # Follow the rest of the path
+        generation = self._path_cache_generation
+        resolved = []
+        for index in range(index, len(parts)):
             manifest = await self._load_manifest(entry_id)
             if is_file_manifest(manifest):
                 raise FSNotADirectoryError(filename=path)
             try:
-                entry_id = manifest.children[name]
+                child_id = manifest.children[parts[index]]
             except (AttributeError, KeyError):
                 raise FSFileNotFoundError(filename=path)
+            resolved.append((entry_id, parts[: index + 1], child_id))
+            entry_id = child_id
+
+        # A folder might have changed while the manifests were loaded,
+        # in which case the resolution must not be cached
+        if generation == self._path_cache_generation:
+            if len(self._path_cache) + len(resolved) > PATH_CACHE_MAX_SIZE:
+                self._path_cache.clear()
+                self._path_cache_folders.clear()
+            for folder_id, key, child_id in resolved:
+                self._path_cache_folders.add(folder_id)
+                self._path_cache[key] = child_id
+
+        return entry_id
+
+    @asynccontextmanager
+    async def _lock_manifest_from_path(self, path: FsPath) -> LocalManifest:
+        entry_id = await self._resolve_path(path)
 
         # Lock entry
         async with self._load_and_lock_manifest(entry_id) as manifest:
@@ -156,26 +275,52 @@ class EntryTransactions(FileTransactions):
 
         # Fetch data
         manifest = await self._get_manifest_from_path(path)
+        return _manifest_stats(manifest)
+
+    async def folder_list_with_stats(
+        self, path: FsPath, names: Optional[Iterable[EntryName]] = None
+    ) -> AsyncIterator[Tuple[EntryName, dict]]:
+        """
+        Yield the name and stats of each child of the folder (or only of the
+        children in `names` if provided). The folder is resolved only once,
+        and the children manifests missing locally are downloaded concurrently.
+
+        The children available locally come first (in name order), then the
+        downloaded ones by batches. A child whose manifest cannot be obtained
+        (not found in the backend, or the backend is offline) has stats of
+        type "inconsistency" (only providing its id).
+        """
+        # Check read rights
+        self.check_read_rights(path)
 
-        # General stats
-        stats = {
-            "id": manifest.id,
-            "created": manifest.created,
-            "updated": manifest.updated,
-            "base_version": manifest.base_version,
-            "is_placeholder": manifest.is_placeholder,
-            "need_sync": manifest.need_sync,
-        }
-
-        # File/folder specific stats
-        if is_file_manifest(manifest):
-            stats["type"] = "file"
-            stats["size"] = manifest.size
-        else:
-            stats["type"] = "folder"
-            stats["children"] = sorted(manifest.children.keys())
+        # Fetch data
+        manifest = await self._get_manifest_from_path(path)
+        if not is_folderish_manifest(manifest):
+            raise FSNotADirectoryError(filename=path)
 
-        return stats
+        children = manifest.children
+        if names is not None:
+            children = {name: children[name] for name in names if name in children}
+
+        missing = []
+        for name, child_id in sorted(children.items()):
+            try:
+                await self.local_storage.get_manifest(child_id)
+            except FSLocalMissError:
+                missing.append((name, child_id))
+                continue
+            # Also takes the pending writes into account
+            yield name, _manifest_stats(await self._load_manifest(child_id))
+
+        for index in range(0, len(missing), FOLDER_STATS_BATCH_SIZE):
+            batch = missing[index : index + FOLDER_STATS_BATCH_SIZE]
+            manifests = await self._load_manifests([child_id for _, child_id in batch])
+            for name, child_id in batch:
+                child_manifest = manifests[child_id]
+                if child_manifest is None:
+                    yield name, {"type": "inconsistency", "id": child_id}
+                else:
+                    yield name, _manifest_stats(child_manifest)
 
     async def entry_rename(
         self, source: FsPath, destination: FsPath, overwrite: bool = True
@@ -366,6 +511,114 @@ class EntryTransactions(FileTransactions):
         # Return the entry id of the created file and the file descriptor
         return child.id, fd
 
+    async def _copy_chunks(
+        self, manifest: LocalFileManifest
+    ) -> Tuple[Tuple[Tuple[Chunk, ...], ...], Set[ChunkID]]:
+        """This internal helper does not perform any locking."""
+        # Blocks already uploaded are immutable: they are shared with the copy
+        # as is. On the other hand, local chunks (including the dirty blocks)
+        # get removed once their file is modified or synchronized, so the copy
+        # gets its own version of them.
+        new_chunk_ids = {}
+        blocks = []
+        try:
+            for chunks in manifest.blocks:
+                new_chunks = []
+                for chunk in chunks:
+                    if chunk.access is not None and not await self.local_storage.is_dirty_chunk(
+                        chunk.id
+                    ):
+                        new_chunks.append(chunk)
+                        continue
+                    if chunk.id not in new_chunk_ids:
+                        data = await self.local_storage.get_chunk(chunk.id)
+                        new_chunk_ids[chunk.id] = ChunkID()
+                        await self.local_storage.set_chunk(new_chunk_ids[chunk.id], data)
+                    new_chunks.append(chunk.evolve(id=new_chunk_ids[chunk.id], access=None))
+                blocks.append(tuple(new_chunks))
+
+        except Exception:
+            for chunk_id in new_chunk_ids.values():
+                await self.local_storage.clear_chunk(chunk_id, miss_ok=True)
+            raise
+
+        return tuple(blocks), set(new_chunk_ids.values())
+
+    async def file_copy(
+        self, source: FsPath, destination: FsPath, exist_ok: bool = False
+    ) -> EntryID:
+        """Copy a file without moving its data around.
+
+        The copy refers to the blocks of the source, so nothing has to be
+        downloaded or uploaded again.
+        """
+        # Check read and write rights
+        self.check_read_rights(source)
+        self.check_write_rights(destination)
+
+        # Lock source while its chunks are copied
+        async with self._lock_manifest_from_path(source) as source_manifest:
+
+            # Not a file
+            if not is_file_manifest(source_manifest):
+                raise FSIsADirectoryError(filename=source)
+
+            blocks, new_chunk_ids = await self._copy_chunks(source_manifest)
+
+        try:
+            # Lock parent and child
+            async with self._lock_parent_manifest_from_path(destination) as (parent, child):
+
+                if child is not None:
+                    # Destination already exists
+                    if not exist_ok:
+                        raise FSFileExistsError(filename=destination)
+                    # Not a file
+                    if not is_file_manifest(child):
+                        raise FSIsADirectoryError(filename=destination)
+
+                    # Overwrite the file
+                    new_child = child.evolve_and_mark_updated(
+                        size=source_manifest.size,
+                        blocksize=source_manifest.blocksize,
+                        blocks=blocks,
+                    )
+                    removed_ids = set()
+                    for chunks in child.blocks:
+                        removed_ids |= chunk_id_set(chunks)
+                    for chunks in blocks:
+                        removed_ids -= chunk_id_set(chunks)
+                    await self.local_storage.set_manifest(
+                        child.id, new_child, removed_ids=removed_ids
+                    )
+
+                else:
+                    # Create file
+                    child = LocalFileManifest.new_placeholder(
+                        parent=parent.id, blocksize=source_manifest.blocksize
+                    ).evolve(size=source_manifest.size, blocks=blocks)
+
+                    # New parent manifest
+                    new_parent = parent.evolve_children_and_mark_updated(
+                        {destination.name: child.id}
+                    )
+
+                    # ~ Atomic change
+                    await self.local_storage.set_manifest(child.id, child, check_lock_status=False)
+                    await self.local_storage.set_manifest(parent.id, new_parent)
+                    self._send_event("fs.entry.updated", id=parent.id)
+
+        except Exception:
+            for chunk_id in new_chunk_ids:
+                await self.local_storage.clear_chunk(chunk_id, miss_ok=True)
+            raise
+
+        # Send event
+        self._send_event("fs.entry.updated", id=child.id)
+
+        # Return the entry id of the copied file
+        return child.id
+
     async def file_open(self, path: FsPath, mode="rw") -> Tuple[EntryID, FileDescriptor]:
         # Check read and write rights
         if "w" in mode:
@@ -1,6 +1,9 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
-from typing import Tuple, List, Callable
+import attr
+import trio
+from typing import Tuple, List, Callable, Optional, Union
+from pendulum import Pendulum, now as pendulum_now
 
 from collections import defaultdict
 from async_generator import asynccontextmanager
@@ -10,8 +13,10 @@ from parsec.core.types import FileDescriptor, EntryID, LocalDevice
 
 from parsec.core.fs.remote_loader import RemoteLoader
 from parsec.core.fs.storage import WorkspaceStorage
+from parsec.core.fs.crypto_offload import run_crypto
+from parsec.core.fs.workspacefs.read_ahead import ReadAheadPrefetcher
 from parsec.core.fs.exceptions import FSLocalMissError, FSInvalidFileDescriptor, FSEndOfFileError
-from parsec.core.types import Chunk, BlockID, LocalFileManifest
+from parsec.core.types import Chunk, BlockID, BlockAccess, LocalFileManifest
 from parsec.core.fs.workspacefs.file_operations import (
     prepare_read,
     prepare_write,
@@ -22,6 +27,28 @@ from parsec.core.fs.workspacefs.file_operations import (
 __all__ = ("FSInvalidFileDescriptor", "FileTransactions")
 
 
+# Maximum amount of written data kept in memory by the write buffers, once
+# reached the writes go straight to the local storage (0 to disable)
+WRITE_BUFFERS_MAX_SIZE = 64 * 1024 * 1024
+# Delay (in seconds) after which the buffered data is written to the local
+# storage, even if the file is still open and the block not complete
+WRITE_BUFFERS_FLUSH_DELAY = 1.0
+
+
+@attr.s(slots=True, auto_attribs=True)
+class WriteBuffer:
+    # File descriptor the data has been written with
+    fd: FileDescriptor
+    offset: int
+    data: bytearray
+    # Time of the last write, to be used as the file update time
+    updated: Pendulum
+
+    @property
+    def end(self) -> int:
+        return self.offset + len(self.data)
+
+
 # Helpers
 
 
@@ -62,6 +89,12 @@ class FileTransactions:
     - truncate -> affects file size and possibly file content
     - read     -> no side effect
     - flush    -> no-op
+
+    Small contiguous writes are merged in a write buffer (at most one per
+    entry, and never over a block boundary) and only written to the local
+    storage as a single chunk once the block is complete, before any other
+    operation on the entry (including its synchronization), or by
+    `run_write_buffers_flusher` after `WRITE_BUFFERS_FLUSH_DELAY`.
     """
 
     def __init__(
@@ -72,6 +105,8 @@ class FileTransactions:
         local_storage: WorkspaceStorage,
         remote_loader: RemoteLoader,
         event_bus: EventBus,
+        prefetcher: Optional[ReadAheadPrefetcher] = None,
+        write_buffers_max_size: Optional[int] = None,
     ):
         self.workspace_id = workspace_id
         self.get_workspace_entry = get_workspace_entry
@@ -80,6 +115,16 @@ class FileTransactions:
         self.remote_loader = remote_loader
         self.event_bus = event_bus
         self._write_count = defaultdict(int)
+        self._write_buffers = {}
+        self._write_buffers_size = 0
+        if write_buffers_max_size is None:
+            write_buffers_max_size = WRITE_BUFFERS_MAX_SIZE
+        self._write_buffers_max_size = write_buffers_max_size
+        self._write_buffers_flush_requested = trio.Event()
+        # Without a nursery to run into, the prefetcher only keeps the statistics
+        self.prefetcher = prefetcher or ReadAheadPrefetcher(
+            local_storage, remote_loader, nursery=None, max_blocks=0
+        )
 
     # Event helper
 
@@ -88,20 +133,34 @@ class FileTransactions:
 
     # Helper
 
-    async def _read_chunk(self, chunk: Chunk) -> bytes:
+    async def _read_chunk(self, chunk: Chunk) -> memoryview:
         data = await self.local_storage.get_chunk(chunk.id)
-        return data[chunk.start - chunk.raw_offset : chunk.stop - chunk.raw_offset]
+        # Slicing a memoryview doesn't copy the underlying data
+        return memoryview(data)[chunk.start - chunk.raw_offset : chunk.stop - chunk.raw_offset]
 
     async def _write_chunk(self, chunk: Chunk, content: bytes, offset: int = 0) -> None:
         data = padded_data(content, offset, offset + chunk.stop - chunk.start)
+        if isinstance(data, memoryview):
+            data = data.tobytes()
         await self.local_storage.set_chunk(chunk.id, data)
         return len(data)
 
-    async def _build_data(self, chunks: Tuple[Chunk]) -> Tuple[bytes, List[BlockID]]:
+    async def _build_data(
+        self, chunks: Tuple[Chunk]
+    ) -> Tuple[Union[bytearray, memoryview], List[BlockAccess]]:
         # Empty array
         if not chunks:
             return bytearray(), []
 
+        # Single chunk, return a view on the chunk data without any copy
+        # Note a missing chunk without access is reported with a `None` access
+        if len(chunks) == 1:
+            chunk, = chunks
+            try:
+                return await self._read_chunk(chunk), []
+            except FSLocalMissError:
+                return bytearray(), [chunk.access]
+
         # Build byte array
         missing = []
         start, stop = chunks[0].start, chunks[-1].stop
@@ -110,7 +169,6 @@ class FileTransactions:
             try:
                 result[chunk.start - start : chunk.stop - start] = await self._read_chunk(chunk)
             except FSLocalMissError:
-                assert chunk.access is not None
                 missing.append(chunk.access)
 
         # Return byte array
@@ -131,14 +189,106 @@ class FileTransactions:
         async with self.local_storage.lock_manifest(manifest.id):
             yield await self.local_storage.load_file_descriptor(fd)
 
+    # Write buffer helpers
+
+    async def _write_content(
+        self,
+        fd: FileDescriptor,
+        manifest: LocalFileManifest,
+        content: bytes,
+        offset: int,
+        updated: Optional[Pendulum] = None,
+    ) -> LocalFileManifest:
+        """This internal helper does not perform any locking."""
+        # Prepare
+        manifest, write_operations, removed_ids = prepare_write(manifest, len(content), offset)
+        if updated is not None:
+            manifest = manifest.evolve(updated=updated)
+
+        # Writing
+        for chunk, offset in write_operations:
+            self._write_count[fd] += await self._write_chunk(chunk, content, offset)
+
+        # Atomic change
+        await self.local_storage.set_manifest(
+            manifest.id, manifest, cache_only=True, removed_ids=removed_ids
+        )
+
+        # Reshaping
+        if self._write_count[fd] >= manifest.blocksize:
+            await self._manifest_reshape(manifest, cache_only=True)
+            self._write_count.pop(fd, None)
+            manifest = await self.local_storage.get_manifest(manifest.id)
+
+        return manifest
+
+    async def _flush_write_buffer(
+        self, manifest: LocalFileManifest, notify: bool = True
+    ) -> LocalFileManifest:
+        """This internal helper does not perform any locking."""
+        buffer = self._write_buffers.pop(manifest.id, None)
+        if buffer is None:
+            return manifest
+        self._write_buffers_size -= len(buffer.data)
+        manifest = await self._write_content(
+            buffer.fd, manifest, buffer.data, buffer.offset, buffer.updated
+        )
+        if notify:
+            self._send_event("fs.entry.updated", id=manifest.id)
+        return manifest
+
+    def _buffered_write(self, fd: FileDescriptor, manifest: LocalFileManifest, content, offset):
+        # Return True if the content has been merged into the write buffer
+        if self._write_buffers_size + len(content) > self._write_buffers_max_size:
+            return False
+        buffer = self._write_buffers.get(manifest.id)
+        if buffer is None:
+            block_start = offset - offset % manifest.blocksize
+            if offset + len(content) >= block_start + manifest.blocksize:
+                return False
+            self._write_buffers[manifest.id] = WriteBuffer(
+                fd, offset, bytearray(content), pendulum_now()
+            )
+        else:
+            block_start = buffer.offset - buffer.offset % manifest.blocksize
+            if offset != buffer.end or offset + len(content) > block_start + manifest.blocksize:
+                return False
+            buffer.data += content
+            buffer.updated = pendulum_now()
+        self._write_buffers_size += len(content)
+        self._write_buffers_flush_requested.set()
+        return True
+
+    async def flush_write_buffers(self) -> None:
+        """Write all the buffered data to the local storage."""
+        for entry_id in list(self._write_buffers):
+            async with self.local_storage.lock_manifest(entry_id) as manifest:
+                await self._flush_write_buffer(manifest)
+
+    async def run_write_buffers_flusher(self, delay: float = WRITE_BUFFERS_FLUSH_DELAY) -> None:
+        """Periodically flush the write buffers, to be run in a nursery.
+
+        This way the buffered data of a file kept open doesn't wait for the
+        file to be closed to be written to the local storage.
+        """
+        while True:
+            await self._write_buffers_flush_requested.wait()
+            await trio.sleep(delay)
+            self._write_buffers_flush_requested = trio.Event()
+            await self.flush_write_buffers()
+
     # Atomic transactions
 
     async def fd_close(self, fd: FileDescriptor) -> None:
         # Fetch and lock
         async with self._load_and_lock_file(fd) as manifest:
 
-            # Force writing to disk
-            await self.local_storage.ensure_manifest_persistent(manifest.id)
+            # Write the pending data
+            await self._flush_write_buffer(manifest)
+
+            # Force writing to disk (closing is not syncing, so the
+            # manifest can wait for the next group commit)
+            await self.local_storage.ensure_manifest_persistent(manifest.id, group_commit=True)
 
             # Atomic change
             self.local_storage.remove_file_descriptor(fd)
@@ -146,12 +296,19 @@ class FileTransactions:
             # Clear write count
             self._write_count.pop(fd, None)
 
+            # Clear read-ahead state
+            self.prefetcher.forget(fd)
+
     async def fd_write(
         self, fd: FileDescriptor, content: bytes, offset: int, constrained: bool = False
     ) -> int:
         # Fetch and lock
         async with self._load_and_lock_file(fd) as manifest:
 
+            # Both rely on the actual file size
+            if constrained or offset < 0:
+                manifest = await self._flush_write_buffer(manifest)
+
             # Constrained - truncate content to the right length
             if constrained:
                 end_offset = min(manifest.size, offset + len(content))
@@ -162,31 +319,30 @@ class FileTransactions:
             if not content:
                 return 0
 
-            # Prepare
+            # Merge contiguous small writes in memory
             offset = normalize_argument(offset, manifest)
-            manifest, write_operations, removed_ids = prepare_write(manifest, len(content), offset)
-
-            # Writing
-            for chunk, offset in write_operations:
-                self._write_count[fd] += await self._write_chunk(chunk, content, offset)
-
-            # Atomic change
-            await self.local_storage.set_manifest(
-                manifest.id, manifest, cache_only=True, removed_ids=removed_ids
-            )
-
-            # Reshaping
-            if self._write_count[fd] >= manifest.blocksize:
-                await self._manifest_reshape(manifest, cache_only=True)
-                self._write_count.pop(fd, None)
-
-        # Notify
+            buffered = self._buffered_write(fd, manifest, content, offset)
+            if not buffered:
+                # Write the pending data first to keep the writes ordered
+                manifest = await self._flush_write_buffer(manifest)
+                buffered = self._buffered_write(fd, manifest, content, offset)
+            if buffered:
+                # Write the block as soon as it is complete
+                if self._write_buffers[manifest.id].end % manifest.blocksize == 0:
+                    await self._flush_write_buffer(manifest, notify=False)
+
+            # Too big to be buffered
+            else:
+                manifest = await self._write_content(fd, manifest, content, offset)
+
+        # Notify (the synchronization takes care of flushing the write buffer)
         self._send_event("fs.entry.updated", id=manifest.id)
         return len(content)
 
     async def fd_resize(self, fd: FileDescriptor, length: int, truncate_only=False) -> None:
         # Fetch and lock
         async with self._load_and_lock_file(fd) as manifest:
+            manifest = await self._flush_write_buffer(manifest)
 
             # Truncate only
             if truncate_only and manifest.size <= length:
@@ -198,7 +354,19 @@ class FileTransactions:
         # Notify
         self._send_event("fs.entry.updated", id=manifest.id)
 
-    async def fd_read(self, fd: FileDescriptor, size: int, offset: int, raise_eof=False) -> bytes:
+    async def fd_read(
+        self, fd: FileDescriptor, size: int, offset: int, raise_eof=False
+    ) -> Union[bytes, bytearray, memoryview]:
+        """
+        The returned buffer is a view on the chunk data if the read
+        doesn't span over several chunks.
+
+        The read doesn't lock the file: manifests are immutable and a chunk
+        is never rewritten once created, so reading the chunks of a manifest
+        snapshot is consistent. The only possible interference is a
+        concurrent write removing a local chunk, in which case the read
+        is simply retried on the new manifest.
+        """
         # Loop over attemps
         missing = []
         while True:
@@ -206,31 +374,44 @@ class FileTransactions:
             # Load missing blocks
             await self.remote_loader.load_blocks(missing)
 
-            # Fetch and lock
-            async with self._load_and_lock_file(fd) as manifest:
+            # Fetch without locking
+            manifest = await self.local_storage.load_file_descriptor(fd)
 
-                # End of file
-                if raise_eof and offset >= manifest.size:
-                    raise FSEndOfFileError()
+            # Pending writes have to be visible
+            if manifest.id in self._write_buffers:
+                async with self._load_and_lock_file(fd) as manifest:
+                    manifest = await self._flush_write_buffer(manifest)
 
-                # Normalize
-                offset = normalize_argument(offset, manifest)
-                size = normalize_argument(size, manifest)
+            # End of file
+            if raise_eof and offset >= manifest.size:
+                raise FSEndOfFileError()
 
-                # No-op
-                if offset > manifest.size:
-                    return b""
+            # Normalize
+            read_offset = normalize_argument(offset, manifest)
+            read_size = normalize_argument(size, manifest)
 
-                # Prepare
-                chunks = prepare_read(manifest, size, offset)
-                data, missing = await self._build_data(chunks)
+            # No-op
+            if read_offset > manifest.size:
+                return b""
+
+            # Prepare
+            chunks = prepare_read(manifest, read_size, read_offset)
+            data, missing = await self._build_data(chunks)
+
+            # A local chunk has been removed by a concurrent write
+            if None in missing:
+                missing = []
+                continue
 
-                # Return the data
-                if not missing:
-                    return data
+            # Return the data, prefetching the next blocks on sequential access
+            self.prefetcher.account_read(chunks, missing)
+            if not missing:
+                self.prefetcher.on_read(fd, manifest, read_offset, read_size)
+                return data
 
     async def fd_flush(self, fd: FileDescriptor) -> None:
         async with self._load_and_lock_file(fd) as manifest:
+            manifest = await self._flush_write_buffer(manifest)
             await self._manifest_reshape(manifest)
             await self.local_storage.ensure_manifest_persistent(manifest.id)
 
@@ -265,6 +446,7 @@ class FileTransactions:
 
             # Build data block
             data, extra_missing = await self._build_data(source)
+            assert None not in extra_missing
 
             # Missing data
             if extra_missing:
@@ -272,7 +454,7 @@ class FileTransactions:
                 continue
 
             # Write data if necessary
-            new_chunk = destination.evolve_as_block(data)
+            new_chunk = await run_crypto(destination.evolve_as_block, data, size=len(data))
             if source != (destination,):
                 await self._write_chunk(new_chunk, data)
 
@@ -0,0 +1,142 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import attr
+from typing import Dict, Set, List
+from structlog import get_logger
+
+from parsec.core.types import FileDescriptor, BlockID, BlockAccess, ChunkID, LocalFileManifest
+from parsec.core.fs.exceptions import FSError
+
+
+logger = get_logger()
+
+DEFAULT_READ_AHEAD_MAX_BLOCKS = 8
+# Prefetched blocks that are never read should not be tracked forever
+MAX_TRACKED_PREFETCHED_BLOCKS = 1024
+
+
+@attr.s(slots=True, auto_attribs=True)
+class ReadAheadStatistics:
+    # Blocks read from the local storage after having been prefetched
+    hits: int = 0
+    # Blocks that had to be downloaded by the read itself
+    misses: int = 0
+    # Blocks downloaded in the background
+    prefetched: int = 0
+
+
+@attr.s(slots=True, auto_attribs=True)
+class ReadAheadState:
+    # Offset where the next read has to start to be considered sequential
+    next_offset: int = 0
+    # Number of blocks to prefetch after the current position
+    window: int = 0
+
+
+class ReadAheadPrefetcher:
+    """Detect sequential reads on file descriptors and prefetch the next blocks.
+
+    The read-ahead window starts at one block and doubles after each sequential
+    read, up to `max_blocks`. Any random access resets the window. The blocks
+    are downloaded in the background (using the provided nursery) and stored
+    in the block storage, ready for the following reads.
+    """
+
+    def __init__(self, local_storage, remote_loader, nursery, max_blocks: int):
+        self.local_storage = local_storage
+        self.remote_loader = remote_loader
+        self.nursery = nursery
+        self.max_blocks = max_blocks
+        self.statistics = ReadAheadStatistics()
+        self._states: Dict[FileDescriptor, ReadAheadState] = {}
+        self._in_flight: Set[BlockID] = set()
+        self._prefetched: Set[BlockID] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.nursery is not None and self.max_blocks > 0
+
+    def get_window(self, fd: FileDescriptor) -> int:
+        try:
+            return self._states[fd].window
+        except KeyError:
+            return 0
+
+    def forget(self, fd: FileDescriptor) -> None:
+        self._states.pop(fd, None)
+
+    def account_read(self, chunks, missing: List[BlockAccess]) -> None:
+        """Update the hit/miss counters for the chunks served by a read."""
+        missing_ids = {access.id for access in missing}
+        self.statistics.misses += len(missing_ids)
+        for chunk in chunks:
+            if chunk.access is None or chunk.access.id in missing_ids:
+                continue
+            try:
+                self._prefetched.remove(chunk.access.id)
+            except KeyError:
+                pass
+            else:
+                self.statistics.hits += 1
+
+    def on_read(self, fd: FileDescriptor, manifest: LocalFileManifest, offset: int, size: int):
+        """Register a read and schedule the prefetching if the access is sequential."""
+        if not self.enabled:
+            return
+
+        # Update the access pattern
+        state = self._states.setdefault(fd, ReadAheadState())
+        if offset == state.next_offset:
+            state.window = min(max(2 * state.window, 1), self.max_blocks)
+        else:
+            state.window = 0
+        stop = min(offset + size, manifest.size)
+        state.next_offset = stop
+
+        # Random access or end of file
+        if not state.window or stop >= manifest.size:
+            return
+
+        # Collect the remote blocks in the read-ahead window
+        first_block = stop // manifest.blocksize
+        accesses = {}
+        for block in range(first_block, first_block + state.window):
+            for chunk in manifest.get_chunks(block):
+                access = chunk.access
+                if access is None or access.id in self._in_flight:
+                    continue
+                if access.id in self._prefetched:
+                    continue
+                accesses[access.id] = access
+        accesses = list(accesses.values())
+
+        # Prefetch in the background
+        if accesses:
+            self._in_flight.update(access.id for access in accesses)
+            self.nursery.start_soon(self._prefetch, accesses)
+
+    async def _prefetch(self, accesses: List[BlockAccess]) -> None:
+        try:
+            # Only download the blocks that are not already available
+            missing = [
+                access
+                for access in accesses
+                if not await self.local_storage.is_chunk(ChunkID(access.id))
+            ]
+            await self.remote_loader.load_blocks(missing)
+            if len(self._prefetched) > MAX_TRACKED_PREFETCHED_BLOCKS:
+                self._prefetched.clear()
+            self._prefetched.update(access.id for access in missing)
+            self.statistics.prefetched += len(missing)
+
+        # Prefetching is best effort, the actual read will report the error if any
+        except FSError as exc:
+            logger.info("Block prefetching has failed", exc_info=exc)
+
+        # The prefetching runs in the nursery of the workspace storages, which
+        # must not be torn down by an unexpected error (cancellation aside)
+        except Exception:
+            logger.exception("Unexpected error while prefetching blocks")
+
+        finally:
+            self._in_flight.difference_update(access.id for access in accesses)
@@ -223,6 +223,9 @@ class SyncTransactions(EntryTransactions):
         # Fetch and lock
         async with self.local_storage.lock_manifest(entry_id) as local_manifest:
 
+            # Include the pending writes
+            local_manifest = await self._flush_write_buffer(local_manifest)
+
             # Sync cannot be performed yet
             if not final and is_file_manifest(local_manifest) and not local_manifest.is_reshaped():
 
@@ -275,6 +278,7 @@ class SyncTransactions(EntryTransactions):
 
             # Fetch and lock
             async with self.local_storage.lock_manifest(entry_id) as manifest:
+                manifest = await self._flush_write_buffer(manifest)
 
                 # Normalize
                 missing = await self._manifest_reshape(manifest)
@@ -298,6 +302,9 @@ class SyncTransactions(EntryTransactions):
         parent_id = local_manifest.parent
         async with self.local_storage.lock_manifest(parent_id) as parent_manifest:
             async with self.local_storage.lock_manifest(entry_id) as current_manifest:
+                # The pending writes belong to the local version, which is
+                # about to be replaced anyway (hence no notification)
+                current_manifest = await self._flush_write_buffer(current_manifest, notify=False)
 
                 # Make sure the file still exists
                 filename = get_filename(parent_manifest, entry_id)
@@ -3,10 +3,20 @@
 import attr
 import trio
 from collections import defaultdict
-from typing import Union, Iterator, Dict, Tuple
+from typing import (
+    Union,
+    Iterator,
+    Dict,
+    List,
+    Tuple,
+    AsyncIterator,
+    Callable,
+    Awaitable,
+    TypeVar,
+)
 from pendulum import Pendulum, now as pendulum_now
 
-from parsec.api.data import Manifest as RemoteManifest
+from parsec.api.data import Manifest as RemoteManifest, BlockAccess
 from parsec.api.protocol import UserID
 from parsec.core.types import (
     FsPath,
@@ -15,16 +25,26 @@ from parsec.core.types import (
     WorkspaceRole,
     LocalFolderishManifests,
     LocalFileManifest,
-    DEFAULT_BLOCK_SIZE,
 )
 from parsec.core.remote_devices_manager import (
     RemoteDevicesManagerBackendOfflineError,
     RemoteDevicesManagerError,
 )
 from parsec.core.fs.exceptions import FSError, FSBackendOfflineError
-from parsec.core.fs.remote_loader import RemoteLoader
+from parsec.core.fs.remote_loader import (
+    RemoteLoader,
+    DEFAULT_BLOCK_DOWNLOAD_MAX_CONCURRENCY,
+    DEFAULT_BLOCK_UPLOAD_MAX_CONCURRENCY,
+    BLOCK_ENCRYPTION_OVERHEAD,
+    group_block_batches,
+)
 from parsec.core.fs import workspacefs  # Needed to break cyclic import with WorkspaceFSTimestamped
 from parsec.core.fs.workspacefs.sync_transactions import SyncTransactions
+from parsec.core.fs.workspacefs.read_ahead import (
+    ReadAheadPrefetcher,
+    ReadAheadStatistics,
+    DEFAULT_READ_AHEAD_MAX_BLOCKS,
+)
 from parsec.core.fs.workspacefs.versioning_helpers import VersionLister
 from parsec.core.fs.utils import is_file_manifest, is_folderish_manifest
 from parsec.core.fs.exceptions import (
@@ -42,6 +62,10 @@ from parsec.core.fs.exceptions import (
 )
 
 AnyPath = Union[FsPath, str]
+T = TypeVar("T")
+
+# Maximum number of placeholder children synchronized in parallel
+PLACEHOLDER_SYNC_MAX_CONCURRENCY = 8
 
 
 @attr.s(frozen=True)
@@ -64,6 +88,10 @@ class WorkspaceFS:
         backend_cmds,
         event_bus,
         remote_device_manager,
+        block_download_max_concurrency: int = DEFAULT_BLOCK_DOWNLOAD_MAX_CONCURRENCY,
+        read_ahead_nursery=None,
+        read_ahead_max_blocks: int = DEFAULT_READ_AHEAD_MAX_BLOCKS,
+        block_upload_max_concurrency: int = DEFAULT_BLOCK_UPLOAD_MAX_CONCURRENCY,
     ):
         self.workspace_id = workspace_id
         self.get_workspace_entry = get_workspace_entry
@@ -73,6 +101,7 @@ class WorkspaceFS:
         self.event_bus = event_bus
         self.remote_device_manager = remote_device_manager
         self.sync_locks = defaultdict(trio.Lock)
+        self.block_upload_max_concurrency = block_upload_max_concurrency
 
         self.remote_loader = RemoteLoader(
             self.device,
@@ -81,6 +110,13 @@ class WorkspaceFS:
             self.backend_cmds,
             self.remote_device_manager,
             self.local_storage,
+            block_download_max_concurrency=block_download_max_concurrency,
+        )
+        self.prefetcher = ReadAheadPrefetcher(
+            self.local_storage,
+            self.remote_loader,
+            nursery=read_ahead_nursery,
+            max_blocks=read_ahead_max_blocks,
         )
         self.transactions = SyncTransactions(
             self.workspace_id,
@@ -89,6 +125,7 @@ class WorkspaceFS:
             self.local_storage,
             self.remote_loader,
             self.event_bus,
+            prefetcher=self.prefetcher,
         )
 
     def __repr__(self):
@@ -110,6 +147,9 @@ class WorkspaceFS:
     def is_revoked(self) -> bool:
         return self.get_workspace_entry().role is None
 
+    def get_read_ahead_statistics(self) -> ReadAheadStatistics:
+        return self.prefetcher.statistics
+
     # Information
 
     async def path_info(self, path: AnyPath) -> dict:
@@ -270,6 +310,26 @@ class WorkspaceFS:
         """
         return [child async for child in self.iterdir(path)]
 
+    async def iterdir_with_stats(self, path: AnyPath) -> AsyncIterator[Tuple[FsPath, dict]]:
+        """
+        Yield the children of a folder along with their stats (as returned
+        by `path_info`), which is much faster than calling `path_info` on
+        each child. The order of the children is not guaranteed.
+
+        Raises:
+            FSError
+        """
+        path = FsPath(path)
+        async for name, stats in self.transactions.folder_list_with_stats(path):
+            yield path / name, stats
+
+    async def listdir_with_stats(self, path: AnyPath) -> Dict[FsPath, dict]:
+        """
+        Raises:
+            FSError
+        """
+        return {child: stats async for child, stats in self.iterdir_with_stats(path)}
+
     async def rename(self, source: AnyPath, destination: AnyPath, overwrite: bool = True) -> None:
         """
         Raises:
@@ -342,7 +402,8 @@ class WorkspaceFS:
         path = FsPath(path)
         _, fd = await self.transactions.file_open(path, "r")
         try:
-            return await self.transactions.fd_read(fd, size, offset)
+            data = await self.transactions.fd_read(fd, size, offset)
+            return data.tobytes() if isinstance(data, memoryview) else data
         finally:
             await self.transactions.fd_close(fd)
 
@@ -406,36 +467,34 @@ class WorkspaceFS:
         await self.unlink(source)
 
     async def copytree(self, source_path: AnyPath, target_path: AnyPath):
+        """
+        Raises:
+            FSError
+        """
         source_path = FsPath(source_path)
         target_path = FsPath(target_path)
         source_files = await self.listdir(source_path)
         await self.mkdir(target_path)
         for source_file in source_files:
             target_file = target_path / source_file.name
-            if await self.is_dir(source_file):
+            # A single look-up to know the entry type
+            info = await self.path_info(source_file)
+            if info["type"] == "folder":
                 await self.copytree(source_file, target_file)
-            elif await self.is_file(source_file):
+            elif info["type"] == "file":
                 await self.copyfile(source_file, target_file)
 
-    async def copyfile(
-        self,
-        source_path: AnyPath,
-        target_path: AnyPath,
-        length=DEFAULT_BLOCK_SIZE,
-        exist_ok: bool = False,
-    ):
+    async def copyfile(self, source_path: AnyPath, target_path: AnyPath, exist_ok: bool = False):
         """
+        The copy is metadata-only: it refers to the blocks of the source
+        file, so no data is downloaded nor uploaded again.
+
         Raises:
             FSError
         """
-        await self.touch(target_path, exist_ok=exist_ok)
-        offset = 0
-        while True:
-            buff = await self.read_bytes(source_path, length, offset * length)
-            if not buff:
-                break
-            await self.write_bytes(target_path, buff, offset * length)
-            offset += 1
+        source_path = FsPath(source_path)
+        target_path = FsPath(target_path)
+        await self.transactions.file_copy(source_path, target_path, exist_ok=exist_ok)
 
     async def rmtree(self, path: AnyPath):
         """
@@ -452,17 +511,73 @@ class WorkspaceFS:
 
     # Sync helpers
 
+    @staticmethod
+    async def _run_concurrently(
+        fn: Callable[[T], Awaitable[None]], items: AsyncIterator[T], max_concurrency: int
+    ) -> None:
+        # The items are produced only when a worker is available to process
+        # them, which bounds the memory used by the pending items
+        send_channel, receive_channel = trio.open_memory_channel(0)
+
+        async def _worker(receive_channel):
+            async with receive_channel:
+                async for item in receive_channel:
+                    await fn(item)
+
+        async with trio.open_service_nursery() as nursery:
+            async with receive_channel:
+                for _ in range(max(1, max_concurrency)):
+                    nursery.start_soon(_worker, receive_channel.clone())
+            async with send_channel:
+                async for item in items:
+                    await send_channel.send(item)
+
     async def _synchronize_placeholders(self, manifest: LocalFolderishManifests) -> None:
-        async for child in self.transactions.get_placeholder_children(manifest):
-            await self.minimal_sync(child)
+        await self._run_concurrently(
+            self.minimal_sync,
+            self.transactions.get_placeholder_children(manifest),
+            PLACEHOLDER_SYNC_MAX_CONCURRENCY,
+        )
+
+    async def _iter_dirty_blocks(
+        self, manifest: LocalFileManifest
+    ) -> AsyncIterator[List[Tuple[BlockAccess, bytes]]]:
+        # Grouped so the small blocks are uploaded with batch requests
+        batches = group_block_batches(
+            manifest.blocks, lambda access: access.size + BLOCK_ENCRYPTION_OVERHEAD
+        )
+        for batch in batches:
+            blocks = []
+            for access in batch:
+                try:
+                    data = await self.local_storage.get_dirty_block(access.id)
+                except FSLocalMissError:
+                    continue
+                blocks.append((access, data))
+            if blocks:
+                yield blocks
 
     async def _upload_blocks(self, manifest: LocalFileManifest) -> None:
-        for access in manifest.blocks:
-            try:
-                data = await self.local_storage.get_dirty_block(access.id)
-            except FSLocalMissError:
-                continue
-            await self.remote_loader.upload_block(access, data)
+        uploaded = 0
+
+        async def _upload_batch(blocks: List[Tuple[BlockAccess, bytes]]) -> None:
+            nonlocal uploaded
+            await self.remote_loader.upload_blocks(blocks)
+            # Report the progress, `uploaded` is the total for this manifest
+            for access, data in blocks:
+                uploaded += len(data)
+                self.event_bus.send(
+                    "fs.entry.block_uploaded",
+                    workspace_id=self.workspace_id,
+                    id=manifest.id,
+                    block_id=access.id,
+                    size=len(data),
+                    uploaded=uploaded,
+                )
+
+        await self._run_concurrently(
+            _upload_batch, self._iter_dirty_blocks(manifest), self.block_upload_max_concurrency
+        )
 
     async def minimal_sync(self, entry_id: EntryID) -> None:
         """
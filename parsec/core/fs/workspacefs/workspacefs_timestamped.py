@@ -4,6 +4,7 @@ import pendulum
 
 from parsec.core.types import WorkspaceRole
 from parsec.core.fs.workspacefs.sync_transactions import SyncTransactions
+from parsec.core.fs.workspacefs.read_ahead import ReadAheadPrefetcher
 from parsec.core.fs.workspacefs.workspacefs import WorkspaceFS
 
 
@@ -23,6 +24,12 @@ class WorkspaceFSTimestamped(WorkspaceFS):
         self.timestamp = timestamp
 
         self.remote_loader = workspacefs.remote_loader.to_timestamped(timestamp)
+        self.prefetcher = ReadAheadPrefetcher(
+            self.local_storage,
+            self.remote_loader,
+            nursery=workspacefs.prefetcher.nursery,
+            max_blocks=workspacefs.prefetcher.max_blocks,
+        )
         self.transactions = SyncTransactions(
             self.workspace_id,
             self.get_workspace_entry,
@@ -30,6 +37,9 @@ class WorkspaceFSTimestamped(WorkspaceFS):
             self.local_storage,
             self.remote_loader,
             self.event_bus,
+            prefetcher=self.prefetcher,
+            # Read-only, the writes must fail right away
+            write_buffers_max_size=0,
         )
 
     def timestamp_get_entry(self, get_original_workspace_entry):
@@ -13,7 +13,6 @@ from PyQt5.QtWidgets import QFileDialog, QWidget
 from parsec.core.types import FsPath, WorkspaceEntry, WorkspaceRole, BackendOrganizationFileLinkAddr
 from parsec.core.fs import WorkspaceFS, WorkspaceFSTimestamped
 from parsec.core.fs.exceptions import (
-    FSRemoteManifestNotFound,
     FSInvalidArgumentError,
     FSFileNotFoundError,
 )
@@ -69,12 +68,8 @@ async def _do_delete(workspace_fs, files, silent=False):
 async def _do_folder_stat(workspace_fs, path, default_selection):
     stats = {}
     dir_stat = await workspace_fs.path_info(path)
-    for child in dir_stat["children"]:
-        try:
-            child_stat = await workspace_fs.path_info(path / child)
-        except FSRemoteManifestNotFound as exc:
-            child_stat = {"type": "inconsistency", "id": exc.args[0]}
-        stats[child] = child_stat
+    async for child, child_stat in workspace_fs.iterdir_with_stats(path):
+        stats[child.name] = child_stat
     return path, dir_stat["id"], stats, default_selection
 
 
@@ -532,8 +532,9 @@ class WorkspacesWidget(QWidget, Ui_WorkspacesWidget):
         async def _reencrypt(on_progress, workspace_id):
             job = await self.core.user_fs.workspace_start_reencryption(workspace_id)
             while True:
-                total, done = await job.do_one_batch(size=1)
-                on_progress.emit(workspace_id, total, done)
+                total, done = await job.do_all_batches(
+                    on_progress=lambda total, done: on_progress.emit(workspace_id, total, done)
+                )
                 if total == done:
                     break
             return workspace_id
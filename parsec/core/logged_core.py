@@ -55,12 +55,22 @@ async def logged_core_factory(
         max_cooldown=config.backend_max_cooldown,
         max_pool=config.backend_max_connections,
         keepalive=config.backend_connection_keepalive,
+        multiplexed_connections=config.backend_multiplexed_connections,
     )
 
     path = config.data_base_dir / device.slug
     remote_devices_manager = RemoteDevicesManager(backend_conn.cmds, device.root_verify_key)
     async with UserFS.run(
-        device, path, backend_conn.cmds, remote_devices_manager, event_bus
+        device,
+        path,
+        backend_conn.cmds,
+        remote_devices_manager,
+        event_bus,
+        block_download_max_concurrency=config.block_download_max_concurrency,
+        block_upload_max_concurrency=config.block_upload_max_concurrency,
+        read_ahead_max_blocks=config.read_ahead_max_blocks,
+        manifest_flush_interval=config.manifest_flush_interval,
+        manifest_cache_size=config.manifest_cache_size,
     ) as user_fs:
 
         backend_conn.register_monitor(partial(monitor_messages, user_fs, event_bus))
@@ -71,6 +81,8 @@ async def logged_core_factory(
                 user_fs,
                 event_bus,
                 config.mountpoint_base_dir,
+                attr_timeout=config.mountpoint_attr_timeout,
+                entry_timeout=config.mountpoint_entry_timeout,
                 mount_all=config.mountpoint_enabled,
                 mount_on_workspace_created=config.mountpoint_enabled,
                 mount_on_workspace_shared=config.mountpoint_enabled,
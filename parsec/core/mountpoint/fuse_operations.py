@@ -108,6 +108,8 @@ class FuseOperations(LoggingMixIn, Operations):
         return fuse_stat
 
     def readdir(self, path: FsPath, fh: int):
+        # Only the names are needed, they come from the parent manifest so
+        # the listing works even if the children manifests are not available
         stat = self.fs_access.entry_info(path)
 
         if stat["type"] == "file":
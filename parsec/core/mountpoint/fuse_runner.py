@@ -23,6 +23,24 @@ __all__ = ("fuse_mountpoint_runner",)
 logger = get_logger()
 
 
+# 128KB is the biggest request size libfuse 2 can negotiate with the kernel
+FUSE_MAX_IO_SIZE = 128 * 1024
+
+
+def _get_fuse_io_options() -> dict:
+    # Without those options, the kernel splits the writes into 4KB requests
+    # (and the reads into requests of the current readahead size), which
+    # multiplies the round trips between the fuse threads and the trio loop
+    if sys.platform != "linux":
+        return {}
+    return {
+        "big_writes": True,
+        "max_write": FUSE_MAX_IO_SIZE,
+        "max_read": FUSE_MAX_IO_SIZE,
+        "max_readahead": FUSE_MAX_IO_SIZE,
+    }
+
+
 @contextmanager
 def _reset_signals(signals=None):
     """A context that save the current signal handlers restore them when leaving.
@@ -129,12 +147,17 @@ async def fuse_mountpoint_runner(
                 logger.info("Starting fuse thread...", mountpoint=mountpoint_path)
                 try:
                     fuse_thread_started.set()
+                    # Keep libfuse multithreaded loop (i.e. `nothreads=False`) so
+                    # that several requests can be processed at the same time,
+                    # the file system transactions doing their own per-entry locking
                     FUSE(
                         fuse_operations,
                         str(mountpoint_path.absolute()),
                         foreground=True,
                         auto_unmount=True,
+                        nothreads=False,
                         encoding=encoding,
+                        **_get_fuse_io_options(),
                         **config,
                     )
 
@@ -270,13 +270,17 @@ async def mountpoint_manager_factory(
     base_mountpoint_path,
     *,
     debug: bool = False,
+    attr_timeout: float = 1.0,
+    entry_timeout: float = 1.0,
     mount_all: bool = False,
     mount_on_workspace_created: bool = False,
     mount_on_workspace_shared: bool = False,
     unmount_on_workspace_revoked: bool = False,
     exclude_from_mount_all: list = (),
 ):
-    config = {"debug": debug}
+    # Number of seconds the kernel is allowed to cache the entries attributes
+    # and path lookups, larger values trade freshness for less fs round trips
+    config = {"debug": debug, "attr_timeout": attr_timeout, "entry_timeout": entry_timeout}
 
     runner = get_mountpoint_runner()
 
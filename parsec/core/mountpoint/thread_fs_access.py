@@ -37,6 +37,13 @@ class ThreadFSAccess:
     def folder_create(self, path):
         return self._run(self.workspace_fs.transactions.folder_create, path)
 
+    def folder_list_with_stats(self, path, names=None):
+        async def _folder_list_with_stats():
+            transactions = self.workspace_fs.transactions
+            return [item async for item in transactions.folder_list_with_stats(path, names)]
+
+        return self._run(_folder_list_with_stats)
+
     def folder_delete(self, path):
         return self._run(self.workspace_fs.transactions.folder_delete, path)
 
@@ -323,9 +323,18 @@ class WinFSPOperations(BaseFileSystemOperations):
                     break
 
         # All remaining children are located after the marker
-        for child_name in iter_children_names:
+        remaining_children_names = list(iter_children_names)
+        if remaining_children_names:
+            # Only the children after the marker are needed
+            children_stats = dict(
+                self.fs_access.folder_list_with_stats(file_context.path, remaining_children_names)
+            )
+        for child_name in remaining_children_names:
+            child_stat = children_stats.get(child_name)
+            # Child removed since the stat or its manifest is not available
+            if child_stat is None or child_stat["type"] == "inconsistency":
+                continue
             name = winify_entry_name(child_name)
-            child_stat = self.fs_access.entry_info(file_context.path / child_name)
             entry = {"file_name": name, **stat_to_winfsp_attributes(child_stat)}
             entries.append(entry)
 
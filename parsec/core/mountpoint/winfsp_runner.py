@@ -145,7 +145,7 @@ async def winfsp_mountpoint_runner(
         sectors_per_allocation_unit=1,
         volume_creation_time=filetime_now(),
         volume_serial_number=volume_serial_number,
-        file_info_timeout=1000,
+        file_info_timeout=int(config.get("attr_timeout", 1.0) * 1000),
         case_sensitive_search=1,
         case_preserved_names=1,
         unicode_on_disk=1,
@@ -3,6 +3,8 @@
 import trio
 from trio.hazmat import current_clock
 import math
+import heapq
+from typing import Optional
 from structlog import get_logger
 
 from parsec.core.types import EntryID, WorkspaceRole
@@ -22,6 +24,12 @@ MIN_WAIT = 1
 MAX_WAIT = 60
 MAINTENANCE_MIN_WAIT = 30
 TICK_CRASH_COOLDOWN = 5
+# Syncs run concurrently, both within a workspace and across workspaces
+MAX_CONCURRENT_SYNCS = 8
+MAX_CONCURRENT_SYNCS_PER_WORKSPACE = 4
+# Entries synced by a single tick, this gives the other workspaces a
+# chance to get their share of the syncs
+SYNC_BATCH_SIZE = 32
 
 
 async def freeze_sync_monitor_mockpoint():
@@ -71,6 +79,9 @@ class SyncContext:
         self.due_time = math.inf
         self._changes_loaded = False
         self._local_changes = {}
+        # Local changes indexed by due time, entries are lazily removed from
+        # the heap once outdated (i.e. not matching `self._local_changes`)
+        self._local_changes_heap = []
         self._remote_changes = set()
 
     def _sync(self, entry_id: EntryID):
@@ -128,6 +139,10 @@ class SyncContext:
         # Ignore local changes in read only mode
         if not self.read_only:
             self._local_changes = {entry_id: LocalChange(now) for entry_id in need_sync_local}
+            self._local_changes_heap = [
+                (change.due_time, entry_id) for entry_id, change in self._local_changes.items()
+            ]
+            heapq.heapify(self._local_changes_heap)
         self._remote_changes = need_sync_remote
 
         # 4) Finally refresh due time according to the changes
@@ -136,18 +151,48 @@ class SyncContext:
         self._changes_loaded = True
         return True
 
+    def _add_local_change(self, entry_id: EntryID, local_change: LocalChange) -> None:
+        self._local_changes[entry_id] = local_change
+        heapq.heappush(self._local_changes_heap, (local_change.due_time, entry_id))
+        # Don't let outdated entries pile up if the same entries keep changing
+        if len(self._local_changes_heap) > 2 * len(self._local_changes) + SYNC_BATCH_SIZE:
+            self._local_changes_heap = [
+                (change.due_time, entry_id) for entry_id, change in self._local_changes.items()
+            ]
+            heapq.heapify(self._local_changes_heap)
+
+    def _next_local_change_due_time(self) -> float:
+        heap = self._local_changes_heap
+        while heap:
+            due_time, entry_id = heap[0]
+            change = self._local_changes.get(entry_id)
+            if change is not None and change.due_time == due_time:
+                return due_time
+            heapq.heappop(heap)
+        return math.inf
+
+    def _pop_due_local_change(self, now: float) -> Optional[EntryID]:
+        if self._next_local_change_due_time() > now:
+            return None
+        _, entry_id = heapq.heappop(self._local_changes_heap)
+        del self._local_changes[entry_id]
+        return entry_id
+
     def set_local_change(self, entry_id: EntryID) -> bool:
         # Ignore local changes in read only mode
         if self.read_only:
             return
 
         now = timestamp()
-        try:
-            new_due_time = self._local_changes[entry_id].changed(now)
-        except KeyError:
+        local_change = self._local_changes.get(entry_id)
+        if local_change is None:
             local_change = LocalChange(now)
-            self._local_changes[entry_id] = local_change
-            new_due_time = local_change.due_time
+            self._add_local_change(entry_id, local_change)
+        else:
+            previous_due_time = local_change.due_time
+            if local_change.changed(now) != previous_due_time:
+                self._add_local_change(entry_id, local_change)
+        new_due_time = local_change.due_time
 
         if new_due_time <= self.due_time:
             self.due_time = new_due_time
@@ -165,10 +210,7 @@ class SyncContext:
         if self._remote_changes:
             self.due_time = now or timestamp()
         elif self._local_changes:
-            # TODO: index changes by due_time to avoid this O(n) operation
-            self.due_time = min(
-                change_info.due_time for change_info in self._local_changes.values()
-            )
+            self.due_time = self._next_local_change_due_time()
         else:
             self.due_time = math.inf
 
@@ -181,7 +223,54 @@ class SyncContext:
         await self._load_changes()
         return self.due_time
 
-    async def tick(self) -> float:
+    async def _sync_remote_change(self, entry_id: EntryID, now: float) -> Optional[float]:
+        try:
+            await self._sync(entry_id)
+        except FSBackendOfflineError as exc:
+            raise BackendNotAvailable from exc
+        except FSWorkspaceNoReadAccess:
+            # We've just lost the read access to the workspace.
+            # This likely means a `sharing.updated` event we soon arrive
+            # and destroy this sync context.
+            # Until then just pretent nothing happened.
+            self._remote_changes.add(entry_id)
+            return now + MIN_WAIT
+        except FSWorkspaceNoWriteAccess:
+            # We don't have write access and this entry contains local
+            # modifications. Hence we can forget about this change given
+            # it's `self._local_changes` role to keep track of local changes.
+            pass
+        except FSWorkspaceInMaintenance:
+            # Not the right time for the sync, retry later
+            self._remote_changes.add(entry_id)
+            return now + MAINTENANCE_MIN_WAIT
+        return None
+
+    async def _sync_local_change(self, entry_id: EntryID, now: float) -> Optional[float]:
+        try:
+            await self._sync(entry_id)
+        except FSBackendOfflineError as exc:
+            raise BackendNotAvailable from exc
+        except (FSWorkspaceNoReadAccess, FSWorkspaceNoWriteAccess):
+            # We've just lost the write access to the workspace, and
+            # the corresponding `sharing.updated` event hasn't updated
+            # the `read_only` flag yet.
+            # We keep track of the change (given we may be given back
+            # the write access in the future) but pretent it just accured
+            # to avoid a busy sync loop until `read_only` flag is updated.
+            self._add_local_change(entry_id, LocalChange(now))
+        except FSWorkspaceInMaintenance:
+            # Not the right time for the sync, retry later
+            self._add_local_change(entry_id, LocalChange(now))
+            return now + MAINTENANCE_MIN_WAIT
+        return None
+
+    async def tick(self, sync_limiter: Optional[trio.CapacityLimiter] = None) -> float:
+        """Sync the due changes, up to `SYNC_BATCH_SIZE` of them.
+
+        Changes are synced concurrently by `MAX_CONCURRENT_SYNCS_PER_WORKSPACE`
+        workers, `sync_limiter` bounding the syncs across all the sync contexts.
+        """
         now = timestamp()
         if self.due_time > now:
             return self.due_time
@@ -192,63 +281,73 @@ class SyncContext:
             return self.due_time
 
         min_due_time = None
-
-        # Remote changes sync have priority over local changes
-        if self._remote_changes:
-            entry_id = self._remote_changes.pop()
+        budget = SYNC_BATCH_SIZE
+        local_changes_synced = False
+        # An entry changed again while being synced cannot be synced
+        # concurrently, so it is put back once the tick is over
+        syncing = set()
+        postponed_remote_changes = set()
+        postponed_local_changes = {}
+        errors = []
+
+        async def _sync_worker(cancel_scope):
+            nonlocal min_due_time, budget, local_changes_synced
             try:
-                await self._sync(entry_id)
-            except FSBackendOfflineError as exc:
-                raise BackendNotAvailable from exc
-            except FSWorkspaceNoReadAccess:
-                # We've just lost the read access to the workspace.
-                # This likely means a `sharing.updated` event we soon arrive
-                # and destroy this sync context.
-                # Until then just pretent nothing happened.
-                min_due_time = now + MIN_WAIT
-                self._remote_changes.add(entry_id)
-            except FSWorkspaceNoWriteAccess:
-                # We don't have write access and this entry contains local
-                # modifications. Hence we can forget about this change given
-                # it's `self._local_changes` role to keep track of local changes.
-                pass
-            except FSWorkspaceInMaintenance:
-                # Not the right time for the sync, retry later
-                min_due_time = now + MAINTENANCE_MIN_WAIT
-                self._remote_changes.add(entry_id)
+                # Stop as soon as the workspace asked to retry later
+                while budget > 0 and min_due_time is None:
+                    # Remote changes sync have priority over local changes
+                    if self._remote_changes:
+                        entry_id = self._remote_changes.pop()
+                        if entry_id in syncing:
+                            postponed_remote_changes.add(entry_id)
+                            continue
+                        sync = self._sync_remote_change
+                    else:
+                        entry_id = self._pop_due_local_change(now)
+                        if entry_id is None:
+                            return
+                        if entry_id in syncing:
+                            postponed_local_changes[entry_id] = LocalChange(now)
+                            continue
+                        sync = self._sync_local_change
+                        local_changes_synced = True
+
+                    budget -= 1
+                    syncing.add(entry_id)
+                    try:
+                        if sync_limiter:
+                            async with sync_limiter:
+                                retry_at = await sync(entry_id, now)
+                        else:
+                            retry_at = await sync(entry_id, now)
+                    finally:
+                        syncing.discard(entry_id)
+                    if retry_at is not None:
+                        min_due_time = max(min_due_time or retry_at, retry_at)
+
+            except Exception as exc:
+                # Keep only the first error instead of a `MultiError`,
+                # the other workers are cancelled anyway
+                errors.append(exc)
+                cancel_scope.cancel()
 
-        elif self._local_changes:
-            entry_id = next(
-                (
-                    entry_id
-                    for entry_id, change_info in self._local_changes.items()
-                    if change_info.due_time <= now
-                ),
-                None,
-            )
-            if entry_id:
-                del self._local_changes[entry_id]
-                try:
-                    await self._sync(entry_id)
-                except FSBackendOfflineError as exc:
-                    raise BackendNotAvailable from exc
-                except (FSWorkspaceNoReadAccess, FSWorkspaceNoWriteAccess):
-                    # We've just lost the write access to the workspace, and
-                    # the corresponding `sharing.updated` event hasn't updated
-                    # the `read_only` flag yet.
-                    # We keep track of the change (given we may be given back
-                    # the write access in the future) but pretent it just accured
-                    # to avoid a busy sync loop until `read_only` flag is updated.
-                    self._local_changes[entry_id] = LocalChange(now)
-                except FSWorkspaceInMaintenance:
-                    # Not the right time for the sync, retry later
-                    min_due_time = now + MAINTENANCE_MIN_WAIT
-                    self._local_changes[entry_id] = LocalChange(now)
-
-                # This is where we plug our vacuuming routine
-                # as it corresponds to a fresh synchronized state
-                if not self._local_changes:
-                    await self._get_local_storage().run_vacuum()
+        try:
+            async with trio.open_nursery() as nursery:
+                for _ in range(MAX_CONCURRENT_SYNCS_PER_WORKSPACE):
+                    nursery.start_soon(_sync_worker, nursery.cancel_scope)
+        finally:
+            # The postponed changes must not be lost, even on error
+            self._remote_changes |= postponed_remote_changes
+            for entry_id, local_change in postponed_local_changes.items():
+                if entry_id not in self._local_changes:
+                    self._add_local_change(entry_id, local_change)
+        if errors:
+            raise errors[0]
+
+        # This is where we plug our vacuuming routine
+        # as it corresponds to a fresh synchronized state
+        if local_changes_synced and not self._local_changes:
+            await self._get_local_storage().run_vacuum()
 
         self._compute_due_time(now=now, min_due_time=min_due_time)
         return self.due_time
@@ -357,9 +456,9 @@ async def monitor_sync(user_fs, event_bus, task_status):
                 ctx.due_time = timestamp()
                 _trigger_early_wakeup()
 
-    async def _ctx_action(ctx, meth):
+    async def _ctx_action(ctx, meth, *args):
         try:
-            return await getattr(ctx, meth)()
+            return await getattr(ctx, meth)(*args)
         except BackendNotAvailable:
             raise
         except Exception:
@@ -374,12 +473,33 @@ async def monitor_sync(user_fs, event_bus, task_status):
             else:
                 return math.inf
 
+    # Shared among the sync contexts, as a FIFO this also guarantees
+    # fairness between the workspaces
+    sync_limiter = trio.CapacityLimiter(MAX_CONCURRENT_SYNCS)
+
+    async def _tick_all(ctxs_to_tick):
+        # Workspaces are synced concurrently
+        offline_errors = []
+
+        async def _tick(ctx, cancel_scope):
+            try:
+                due_times.append(await _ctx_action(ctx, "tick", sync_limiter))
+            except BackendNotAvailable as exc:
+                offline_errors.append(exc)
+                cancel_scope.cancel()
+
+        async with trio.open_nursery() as nursery:
+            for ctx in ctxs_to_tick:
+                nursery.start_soon(_tick, ctx, nursery.cancel_scope)
+        if offline_errors:
+            raise offline_errors[0]
+
+    due_times = []
     with event_bus.connect_in_context(
         ("fs.entry.updated", _on_entry_updated),
         ("backend.realm.vlobs_updated", _on_realm_vlobs_updated),
         ("sharing.updated", _on_sharing_updated),
     ):
-        due_times = []
         # Init userfs sync context
         ctx = ctxs.get(user_fs.user_manifest_id)
         due_times.append(await _ctx_action(ctx, "bootstrap"))
@@ -405,5 +525,4 @@ async def monitor_sync(user_fs, event_bus, task_status):
                 task_status.awake()
             due_times.clear()
             await freeze_sync_monitor_mockpoint()
-            for ctx in ctxs.iter():
-                due_times.append(await _ctx_action(ctx, "tick"))
+            await _tick_all(ctxs.iter())
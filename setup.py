@@ -336,6 +336,8 @@ extra_requirements = {
         # Swift
         "python-swiftclient==3.5.0",
         "pbr==4.0.2",
+        # RAID parity computation
+        "numpy==1.18.2",
     ],
     "dev": test_requirements,
 }
@@ -0,0 +1,44 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import tracemalloc
+import pytest
+from uuid import uuid4
+
+from tests.backend.common import block_create, block_read, block_create_stream, block_read_stream
+
+
+BLOCK_SIZE = 900 * 1024  # Largest size allowed by the regular commands, roughly
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("mode", ["message", "stream"])
+async def test_bench_block_transfer_peak_memory(alice_backend_sock, realm, mode):
+    # Note the client and the backend run in the same process here,
+    # so the peaks include the memory used on both sides
+    create, read = {
+        "message": (block_create, block_read),
+        "stream": (block_create_stream, block_read_stream),
+    }[mode]
+    block = os.urandom(BLOCK_SIZE)
+    block_id = uuid4()
+
+    tracemalloc.start()
+    try:
+        tracemalloc.clear_traces()
+        await create(alice_backend_sock, block_id, realm, block)
+        _, create_peak = tracemalloc.get_traced_memory()
+
+        tracemalloc.clear_traces()
+        rep = await read(alice_backend_sock, block_id)
+        _, read_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert rep["block"] == block
+
+    print(
+        f"\nTransfer of a {BLOCK_SIZE // 1024}KB block ({mode}): peak memory "
+        f"{create_peak / BLOCK_SIZE:.1f}x the block size on create, "
+        f"{read_peak / BLOCK_SIZE:.1f}x on read"
+    )
@@ -0,0 +1,57 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import time
+import pytest
+
+from parsec.backend.parity import ReedSolomonCodec
+from parsec.backend.raid5_blockstore import (
+    split_block_in_chunks,
+    generate_checksum_chunk,
+    rebuild_block_from_chunks,
+)
+
+
+BLOCK_SIZE = 4 * 1024 * 1024
+ROUNDS = 10
+
+
+def _throughput(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return BLOCK_SIZE * ROUNDS / (time.perf_counter() - start) / 1024 ** 2
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("nb_nodes", [3, 5, 8])
+def test_bench_raid5_parity(nb_nodes):
+    block = os.urandom(BLOCK_SIZE)
+    chunks = split_block_in_chunks(block, nb_nodes - 1)
+    checksum = generate_checksum_chunk(chunks)
+    partial_chunks = [None, *chunks[1:]]
+
+    encode = _throughput(lambda: generate_checksum_chunk(chunks))
+    rebuild = _throughput(lambda: rebuild_block_from_chunks(partial_chunks, checksum))
+    print(
+        f"\nRAID5 with {nb_nodes} nodes: encode {encode:.0f}MB/s, "
+        f"rebuild of 1 missing node {rebuild:.0f}MB/s"
+    )
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("nb_nodes,nb_parity", [(3, 1), (5, 2), (8, 2), (8, 3)])
+def test_bench_raidn_reed_solomon(nb_nodes, nb_parity):
+    block = os.urandom(BLOCK_SIZE)
+    codec = ReedSolomonCodec(nb_nodes - nb_parity, nb_parity)
+    chunks = split_block_in_chunks(block, codec.nb_data)
+    all_chunks = chunks + codec.encode(chunks)
+    # Worst case: all the missing chunks are data chunks
+    partial_chunks = [None] * nb_parity + all_chunks[nb_parity:]
+
+    encode = _throughput(lambda: codec.encode(chunks))
+    rebuild = _throughput(lambda: codec.rebuild(partial_chunks))
+    print(
+        f"\nRAIDN with {nb_nodes} nodes ({nb_parity} parity): encode {encode:.0f}MB/s, "
+        f"rebuild of {nb_parity} missing nodes {rebuild:.0f}MB/s"
+    )
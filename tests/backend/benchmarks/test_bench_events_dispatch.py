@@ -0,0 +1,80 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import trio
+import pytest
+from uuid import uuid4
+
+from parsec.event_bus import EventBus
+from parsec.api.protocol import OrganizationID, DeviceID
+from parsec.backend.events import EventsComponent
+
+
+NB_EVENTS = 1000
+REALM_SUBSCRIBERS = 10
+
+
+class FakeClientContext:
+    def __init__(self, organization_id, device_id):
+        self.organization_id = organization_id
+        self.device_id = device_id
+        self.user_id = device_id.user_id
+        self.realms = set()
+        self.dropped_events = 0
+        self.send_events_channel, self.receive_events_channel = trio.open_memory_channel(NB_EVENTS)
+
+
+def _connect_fanout(event_bus, client_ctx):
+    # Previous implementation: a filtering callback per subscribed client
+    def _on_realm_events(event, organization_id, author, realm_id, **kwargs):
+        if (
+            organization_id != client_ctx.organization_id
+            or author == client_ctx.device_id
+            or realm_id not in client_ctx.realms
+        ):
+            return
+        client_ctx.send_events_channel.send_nowait({"event": event, "realm_id": realm_id})
+
+    event_bus.connect("realm.vlobs_updated", _on_realm_events)
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("mode", ["fanout", "indexed"])
+@pytest.mark.parametrize("nb_subscribers", [100, 1000, 10000])
+async def test_bench_events_dispatch(mode, nb_subscribers):
+    organization_id = OrganizationID("CoolOrg")
+    realm_id = uuid4()
+    event_bus = EventBus()
+    events = EventsComponent(realm_component=None)
+
+    with events.connect_in_context(event_bus):
+        for i in range(nb_subscribers):
+            client_ctx = FakeClientContext(organization_id, DeviceID(f"user{i}@dev1"))
+            # Only a handful of clients are concerned by the realm
+            client_realm_id = realm_id if i < REALM_SUBSCRIBERS else uuid4()
+            if mode == "fanout":
+                client_ctx.realms.add(client_realm_id)
+                _connect_fanout(event_bus, client_ctx)
+            else:
+                events._organization_clients[organization_id].add(client_ctx)
+                events._add_realm(client_ctx, client_realm_id)
+
+        author = DeviceID("author@dev1")
+        start = time.perf_counter()
+        for _ in range(NB_EVENTS):
+            event_bus.send(
+                "realm.vlobs_updated",
+                organization_id=organization_id,
+                author=author,
+                realm_id=realm_id,
+                checkpoint=1,
+                src_id=uuid4(),
+                src_version=1,
+            )
+        elapsed = time.perf_counter() - start
+
+    print(
+        f"\n{nb_subscribers} subscribers ({mode}): "
+        f"{elapsed / NB_EVENTS * 1e6:.1f}us per realm.vlobs_updated event"
+    )
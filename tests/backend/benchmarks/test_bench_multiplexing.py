@@ -0,0 +1,51 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import trio
+import pytest
+
+from parsec.core.backend_connection import BackendAuthenticatedConn
+
+
+NB_REQUESTS = 1000
+CONCURRENCY = 50
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("multiplexed_connections", [0, 1, 4])
+async def test_bench_multiplexed_requests(
+    running_backend, alice, event_bus, multiplexed_connections
+):
+    conn = BackendAuthenticatedConn(
+        alice.organization_addr,
+        alice.device_id,
+        alice.signing_key,
+        event_bus,
+        multiplexed_connections=multiplexed_connections,
+    )
+    latencies = []
+
+    async def _sender(nb):
+        for i in range(nb):
+            start = time.perf_counter()
+            rep = await conn.cmds.ping(str(i))
+            latencies.append(time.perf_counter() - start)
+            assert rep["status"] == "ok"
+
+    async with conn.run():
+        # Warm up the connections
+        await conn.cmds.ping("warmup")
+        start = time.perf_counter()
+        async with trio.open_service_nursery() as nursery:
+            for _ in range(CONCURRENCY):
+                nursery.start_soon(_sender, NB_REQUESTS // CONCURRENCY)
+        duration = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"\n{NB_REQUESTS} requests with {multiplexed_connections} multiplexed connections: "
+        f"{NB_REQUESTS / duration:.0f} req/s, "
+        f"p50 {latencies[len(latencies) // 2] * 1e3:.1f}ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.1f}ms"
+    )
@@ -0,0 +1,100 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import threading
+import trio
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from parsec.backend.s3_blockstore import S3BlockStoreComponent
+
+
+BLOCK_SIZE = 512 * 1024
+S3_LATENCY = 0.05  # Simulated round trip for each S3 request
+CONCURRENT_READS = 64
+TICK = 0.005
+
+
+class S3StubHandler(BaseHTTPRequestHandler):
+    """Minimal S3-compatible server: any bucket exists and any object has the same content."""
+
+    protocol_version = "HTTP/1.1"
+    block = b"x" * BLOCK_SIZE
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply(200)
+
+    def do_GET(self):
+        time.sleep(S3_LATENCY)
+        self._reply(200, self.block)
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(S3_LATENCY)
+        self._reply(200)
+
+
+@pytest.fixture
+def s3_stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), S3StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+async def _monitor_event_loop_latency(lags):
+    while True:
+        start = trio.current_time()
+        try:
+            await trio.sleep(TICK)
+        finally:
+            # Also account for the tick interrupted by the end of the benchmark
+            lags.append(max(trio.current_time() - start - TICK, 0))
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("mode", ["event_loop", "worker_threads"])
+async def test_bench_s3_concurrent_reads(s3_stub_url, mode):
+    blockstore = S3BlockStoreComponent("europe", "parsec", "john", "secret", s3_stub_url)
+
+    if mode == "event_loop":
+        # Former behavior: S3 request done directly from the trio thread
+        async def _read(i):
+            blockstore._get_object(f"org42/{i}")
+
+    else:
+
+        async def _read(i):
+            await blockstore.read("org42", i)
+
+    lags = []
+    start = time.perf_counter()
+    async with trio.open_nursery() as monitor_nursery:
+        monitor_nursery.start_soon(_monitor_event_loop_latency, lags)
+        async with trio.open_nursery() as nursery:
+            for i in range(CONCURRENT_READS):
+                nursery.start_soon(_read, i)
+        monitor_nursery.cancel_scope.cancel()
+    duration = time.perf_counter() - start
+
+    lags.sort()
+    print(
+        f"\n{CONCURRENT_READS} concurrent reads ({mode}): {duration:.3f}s, "
+        f"event loop lag p50={lags[len(lags) // 2] * 1000:.1f}ms "
+        f"max={lags[-1] * 1000:.1f}ms"
+    )
@@ -0,0 +1,70 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import trio
+import pytest
+from uuid import uuid4
+from pendulum import now as pendulum_now
+
+from parsec.backend.postgresql import handler
+
+
+NB_WRITERS = 50
+NB_UPDATES = 10
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_bench_vlob_concurrent_writes_on_one_realm(backend, alice, realm, monkeypatch):
+    # `retry_on_unique_violation` warns each time it retries
+    retries = 0
+    logger_warning = handler.logger.warning
+
+    def _count_retries(*args, **kwargs):
+        nonlocal retries
+        retries += 1
+        return logger_warning(*args, **kwargs)
+
+    monkeypatch.setattr(handler.logger, "warning", _count_retries)
+
+    async def _writer():
+        vlob_id = uuid4()
+        await backend.vlob.create(
+            organization_id=alice.organization_id,
+            author=alice.device_id,
+            realm_id=realm,
+            encryption_revision=1,
+            vlob_id=vlob_id,
+            timestamp=pendulum_now(),
+            blob=b"v1",
+        )
+        for version in range(2, NB_UPDATES + 2):
+            await backend.vlob.update(
+                organization_id=alice.organization_id,
+                author=alice.device_id,
+                encryption_revision=1,
+                vlob_id=vlob_id,
+                version=version,
+                timestamp=pendulum_now(),
+                blob=f"v{version}".encode(),
+            )
+
+    start = time.perf_counter()
+    async with trio.open_service_nursery() as nursery:
+        for _ in range(NB_WRITERS):
+            nursery.start_soon(_writer)
+    duration = time.perf_counter() - start
+
+    nb_writes = NB_WRITERS * (NB_UPDATES + 1)
+    checkpoint, changes = await backend.vlob.poll_changes(
+        alice.organization_id, alice.device_id, realm, 0
+    )
+    # Each write got its own index in the realm
+    assert checkpoint == nb_writes
+    assert len(changes) == NB_WRITERS
+
+    print(
+        f"\n{nb_writes} writes by {NB_WRITERS} concurrent writers on one realm: "
+        f"{nb_writes / duration:.0f} writes/s, {retries} retries"
+    )
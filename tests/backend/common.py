@@ -9,6 +9,10 @@ from parsec.api.protocol import (
     ping_serializer,
     block_create_serializer,
     block_read_serializer,
+    block_batch_create_serializer,
+    block_batch_read_serializer,
+    block_create_stream_serializer,
+    block_read_stream_serializer,
     realm_create_serializer,
     realm_status_serializer,
     realm_get_role_certificates_serializer,
@@ -103,6 +107,28 @@ class CmdSock:
                 await box.do_recv()
 
 
+class StreamCmdSock(CmdSock):
+    """
+    For the commands transferring a block as a stream next to the messages:
+    `parse_args` provides it as `stream` for the request, and it is added as
+    `block` to the `ok` reply that provides its `size`.
+    """
+
+    async def _do_send(self, sock, args, kwargs):
+        req = {"cmd": self.cmd, **self.parse_args(self, *args, **kwargs)}
+        stream = req.pop("stream", None)
+        raw_req = self.serializer.req_dumps(req)
+        await sock.send(raw_req)
+        if stream is not None:
+            await sock.send_stream(stream)
+
+    async def _do_recv(self, sock, check_rep):
+        rep = await super()._do_recv(sock, check_rep)
+        if rep["status"] == "ok" and "size" in rep:
+            rep["block"] = await sock.recv_stream(rep["size"])
+        return rep
+
+
 ### Ping ###
 
 
@@ -130,6 +156,36 @@ block_create = CmdSock(
 block_read = CmdSock(
     "block_read", block_read_serializer, parse_args=lambda self, block_id: {"block_id": block_id}
 )
+block_batch_create = CmdSock(
+    "block_batch_create",
+    block_batch_create_serializer,
+    parse_args=lambda self, realm_id, blocks: {
+        "realm_id": realm_id,
+        "blocks": [{"block_id": block_id, "block": block} for block_id, block in blocks],
+    },
+    check_rep_by_default=True,
+)
+block_batch_read = CmdSock(
+    "block_batch_read",
+    block_batch_read_serializer,
+    parse_args=lambda self, realm_id, block_ids: {"realm_id": realm_id, "block_ids": block_ids},
+)
+block_create_stream = StreamCmdSock(
+    "block_create_stream",
+    block_create_stream_serializer,
+    parse_args=lambda self, block_id, realm_id, block, size=None: {
+        "block_id": block_id,
+        "realm_id": realm_id,
+        "size": len(block) if size is None else size,
+        "stream": block,
+    },
+    check_rep_by_default=True,
+)
+block_read_stream = StreamCmdSock(
+    "block_read_stream",
+    block_read_stream_serializer,
+    parse_args=lambda self, block_id: {"block_id": block_id},
+)
 
 
 ### Realm ###
@@ -237,10 +293,12 @@ vlob_poll_changes = CmdSock(
 vlob_maintenance_get_reencryption_batch = CmdSock(
     "vlob_maintenance_get_reencryption_batch",
     vlob_maintenance_get_reencryption_batch_serializer,
-    parse_args=lambda self, realm_id, encryption_revision, size=100: {
+    parse_args=lambda self, realm_id, encryption_revision, size=100, after=(None, None): {
         "realm_id": realm_id,
         "encryption_revision": encryption_revision,
         "size": size,
+        "after_vlob_id": after[0],
+        "after_version": after[1],
     },
 )
 vlob_maintenance_save_reencryption_batch = CmdSock(
@@ -1,5 +1,6 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import os
 import trio
 import pytest
 from unittest.mock import ANY
@@ -9,14 +10,31 @@ from hypothesis import given, strategies as st
 
 from parsec.backend.block import BlockTimeoutError
 from parsec.backend.realm import RealmGrantedRole
+from parsec.backend.parity import ReedSolomonCodec
 from parsec.backend.raid5_blockstore import (
     split_block_in_chunks,
     generate_checksum_chunk,
     rebuild_block_from_chunks,
 )
-from parsec.api.protocol import block_create_serializer, block_read_serializer, packb, RealmRole
+from parsec.api.protocol import (
+    BLOCK_BATCH_MAX_SIZE,
+    BLOCK_BATCH_MAX_BYTES,
+    block_create_serializer,
+    block_read_serializer,
+    block_batch_read_serializer,
+    packb,
+    unpackb,
+    RealmRole,
+)
 
-from tests.backend.common import block_create, block_read
+from tests.backend.common import (
+    block_create,
+    block_read,
+    block_batch_create,
+    block_batch_read,
+    block_create_stream,
+    block_read_stream,
+)
 
 
 BLOCK_ID = UUID("00000000000000000000000000000001")
@@ -286,6 +304,74 @@ async def test_raid5_block_read_multiple_failure(
     )
 
 
+@pytest.mark.trio
+@pytest.mark.raidn_blockstore
+async def test_raidn_block_create_and_read(alice_backend_sock, realm):
+    await test_block_create_and_read(alice_backend_sock, realm)
+
+
+@pytest.mark.trio
+@pytest.mark.raidn_blockstore
+@pytest.mark.parametrize("failing_blockstores", [(0,), (1, 3), (3, 4), (0, 2)])
+async def test_raidn_block_create_and_read_with_failures(
+    caplog, alice_backend_sock, backend, realm, failing_blockstores
+):
+    async def mock_timeout(*args):
+        await trio.sleep(0)
+        raise BlockTimeoutError()
+
+    for fb in failing_blockstores:
+        backend.blockstore.blockstores[fb].create = mock_timeout
+        backend.blockstore.blockstores[fb].read = mock_timeout
+
+    await block_create(alice_backend_sock, BLOCK_ID, realm, BLOCK_DATA)
+    rep = await block_read(alice_backend_sock, BLOCK_ID)
+    assert rep == {"status": "ok", "block": BLOCK_DATA}
+
+    # Should be notified of blockstore malfunction
+    for fb in failing_blockstores:
+        caplog.assert_occured(
+            f"[warning  ] Cannot reach RAIDN blockstore #{fb} to "
+            f"create block {BLOCK_ID} [parsec.backend.raidn_blockstore]"
+        )
+
+
+@pytest.mark.trio
+@pytest.mark.raidn_blockstore
+async def test_raidn_block_create_too_many_failures(caplog, alice_backend_sock, backend, realm):
+    async def mock_create(organization_id, id, block):
+        await trio.sleep(0)
+        raise BlockTimeoutError()
+
+    for fb in (0, 2, 4):
+        backend.blockstore.blockstores[fb].create = mock_create
+
+    rep = await block_create(alice_backend_sock, BLOCK_ID, realm, BLOCK_DATA, check_rep=False)
+    assert rep == {"status": "timeout"}
+    caplog.assert_occured(
+        f"[error    ] Block {BLOCK_ID} cannot be created: Too many failing "
+        "blockstores in the RAIDN cluster [parsec.backend.raidn_blockstore]"
+    )
+
+
+@pytest.mark.trio
+@pytest.mark.raidn_blockstore
+async def test_raidn_block_read_too_many_failures(caplog, alice_backend_sock, backend, block):
+    async def mock_read(organization_id, id):
+        await trio.sleep(0)
+        raise BlockTimeoutError()
+
+    for fb in (0, 1, 3):
+        backend.blockstore.blockstores[fb].read = mock_read
+
+    rep = await block_read(alice_backend_sock, block)
+    assert rep == {"status": "timeout"}
+    caplog.assert_occured(
+        f"[error    ] Block {block} cannot be read: Too many failing "
+        "blockstores in the RAIDN cluster [parsec.backend.raidn_blockstore]"
+    )
+
+
 @pytest.mark.parametrize(
     "bad_msg",
     [
@@ -389,6 +475,168 @@ async def test_access_during_maintenance(backend, alice, alice_backend_sock, rea
     assert rep == {"status": "in_maintenance"}
 
 
+@pytest.mark.trio
+async def test_block_batch_create_and_read(alice_backend_sock, realm):
+    blocks = [(uuid4(), f"block {i}".encode()) for i in range(10)]
+    await block_batch_create(alice_backend_sock, realm, blocks)
+
+    # Order of the request is preserved
+    blocks.reverse()
+    rep = await block_batch_read(alice_backend_sock, realm, [block_id for block_id, _ in blocks])
+    assert rep == {
+        "status": "ok",
+        "blocks": [{"block_id": block_id, "block": block} for block_id, block in blocks],
+    }
+
+    # Single block commands see the blocks created by batch
+    block_id, block = blocks[0]
+    rep = await block_read(alice_backend_sock, block_id)
+    assert rep == {"status": "ok", "block": block}
+
+    # A single missing block fails the whole batch
+    rep = await block_batch_read(alice_backend_sock, realm, [block_id, uuid4()])
+    assert rep == {"status": "not_found"}
+
+
+@pytest.mark.trio
+@pytest.mark.raid1_blockstore
+async def test_raid1_block_batch_create_and_read(alice_backend_sock, realm):
+    await test_block_batch_create_and_read(alice_backend_sock, realm)
+
+
+@pytest.mark.trio
+@pytest.mark.raid5_blockstore
+async def test_raid5_block_batch_create_and_read(alice_backend_sock, realm):
+    await test_block_batch_create_and_read(alice_backend_sock, realm)
+
+
+@pytest.mark.trio
+async def test_block_batch_check_access_rights(backend, alice, bob, bob_backend_sock, realm, block):
+    blocks = [(uuid4(), BLOCK_DATA)]
+
+    # User not part of the realm
+    rep = await block_batch_read(bob_backend_sock, realm, [block])
+    assert rep == {"status": "not_allowed"}
+    rep = await block_batch_create(bob_backend_sock, realm, blocks, check_rep=False)
+    assert rep == {"status": "not_allowed"}
+
+    # Reader can only read
+    await backend.realm.update_roles(
+        alice.organization_id,
+        RealmGrantedRole(
+            certificate=b"<dummy>",
+            realm_id=realm,
+            user_id=bob.user_id,
+            role=RealmRole.READER,
+            granted_by=alice.device_id,
+        ),
+    )
+    rep = await block_batch_read(bob_backend_sock, realm, [block])
+    assert rep == {"status": "ok", "blocks": [{"block_id": block, "block": BLOCK_DATA}]}
+    rep = await block_batch_create(bob_backend_sock, realm, blocks, check_rep=False)
+    assert rep == {"status": "not_allowed"}
+
+
+@pytest.mark.trio
+async def test_block_batch_read_other_realm(backend, alice, alice_backend_sock, realm, block):
+    other_realm = uuid4()
+    await backend.realm.create(
+        alice.organization_id,
+        RealmGrantedRole(
+            certificate=b"<dummy>",
+            realm_id=other_realm,
+            user_id=alice.user_id,
+            role=RealmRole.OWNER,
+            granted_by=alice.device_id,
+        ),
+    )
+
+    # Blocks must belong to the realm provided in the request
+    rep = await block_batch_read(alice_backend_sock, other_realm, [block])
+    assert rep == {"status": "not_found"}
+
+    # Unknown realm
+    rep = await block_batch_read(alice_backend_sock, uuid4(), [block])
+    assert rep == {"status": "not_found"}
+    rep = await block_batch_create(alice_backend_sock, uuid4(), [(uuid4(), b"")], check_rep=False)
+    assert rep == {"status": "not_found"}
+
+
+@pytest.mark.trio
+async def test_block_batch_create_is_atomic(alice_backend_sock, realm, block):
+    new_block_id = uuid4()
+
+    rep = await block_batch_create(
+        alice_backend_sock, realm, [(new_block_id, b"new"), (block, b"v2")], check_rep=False
+    )
+    assert rep == {"status": "already_exists"}
+
+    # Duplicated ids within the batch
+    rep = await block_batch_create(
+        alice_backend_sock, realm, [(new_block_id, b"new"), (new_block_id, b"v2")], check_rep=False
+    )
+    assert rep == {"status": "already_exists"}
+
+    # Nothing has been created
+    rep = await block_batch_read(alice_backend_sock, realm, [new_block_id])
+    assert rep == {"status": "not_found"}
+    rep = await block_read(alice_backend_sock, block)
+    assert rep == {"status": "ok", "block": BLOCK_DATA}
+
+
+@pytest.mark.trio
+async def test_block_batch_during_maintenance(backend, alice, alice_backend_sock, realm, block):
+    await backend.realm.start_reencryption_maintenance(
+        alice.organization_id,
+        alice.device_id,
+        realm,
+        2,
+        {alice.user_id: b"whatever"},
+        pendulum.now(),
+    )
+
+    rep = await block_batch_create(
+        alice_backend_sock, realm, [(uuid4(), BLOCK_DATA)], check_rep=False
+    )
+    assert rep == {"status": "in_maintenance"}
+
+    rep = await block_batch_read(alice_backend_sock, realm, [block])
+    assert rep == {"status": "in_maintenance"}
+
+
+@pytest.mark.parametrize("size", [0, BLOCK_BATCH_MAX_SIZE + 1])
+@pytest.mark.trio
+async def test_block_batch_read_bad_size(alice_backend_sock, realm, size):
+    block_ids = [str(uuid4()) for _ in range(size)]
+    await alice_backend_sock.send(
+        packb({"cmd": "block_batch_read", "realm_id": str(realm), "block_ids": block_ids})
+    )
+    raw_rep = await alice_backend_sock.recv()
+    rep = block_batch_read_serializer.rep_loads(raw_rep)
+    assert rep["status"] == "bad_message"
+
+
+@pytest.mark.trio
+async def test_block_batch_max_bytes(alice_backend_sock, realm):
+    # Blocks must stay below the 1MB limit of the msgpack binary fields
+    block_size = BLOCK_BATCH_MAX_BYTES // 4 - 1
+    blocks = [(uuid4(), bytes([i]) * block_size) for i in range(5)]
+    rep = await block_batch_create(alice_backend_sock, realm, blocks, check_rep=False)
+    assert rep["status"] == "bad_message"
+    await block_batch_create(alice_backend_sock, realm, blocks[:4])
+    await block_create(alice_backend_sock, blocks[4][0], realm, blocks[4][1])
+
+    block_ids = [block_id for block_id, _ in blocks]
+    rep = await block_batch_read(alice_backend_sock, realm, block_ids)
+    assert rep == {"status": "too_large"}
+
+    rep = await block_batch_read(alice_backend_sock, realm, block_ids[1:])
+    assert rep == {
+        "status": "ok",
+        "blocks": [{"block_id": block_id, "block": block} for block_id, block in blocks[1:]],
+    }
+
+
 @given(block=st.binary(max_size=2 ** 8), nb_blockstores=st.integers(min_value=3, max_value=16))
 def test_split_block(block, nb_blockstores):
     nb_chunks = nb_blockstores - 1
@@ -408,3 +656,85 @@ def test_split_block(block, nb_blockstores):
         partial_chunks[missing] = None
         rebuilt = rebuild_block_from_chunks(partial_chunks, checksum_chunk)
         assert rebuilt == block
+
+
+@given(
+    block=st.binary(max_size=2 ** 8),
+    nb_data=st.integers(min_value=1, max_value=8),
+    nb_parity=st.integers(min_value=1, max_value=4),
+    data=st.data(),
+)
+def test_reed_solomon_rebuild(block, nb_data, nb_parity, data):
+    codec = ReedSolomonCodec(nb_data, nb_parity)
+    chunks = split_block_in_chunks(block, nb_data)
+    parity_chunks = codec.encode(chunks)
+    assert len(parity_chunks) == nb_parity
+    all_chunks = chunks + parity_chunks
+
+    missing = data.draw(
+        st.sets(st.integers(min_value=0, max_value=nb_data + nb_parity - 1), max_size=nb_parity)
+    )
+    partial_chunks = [None if i in missing else chunk for i, chunk in enumerate(all_chunks)]
+    assert codec.rebuild(partial_chunks) == chunks
+
+    if len(missing) == nb_parity:
+        partial_chunks[next(i for i, c in enumerate(partial_chunks) if c is not None)] = None
+        with pytest.raises(ValueError):
+            codec.rebuild(partial_chunks)
+
+
+@pytest.mark.trio
+async def test_block_stream_create_and_read(alice_backend_sock, realm):
+    # Streamed blocks are not limited by the 1MB of the msgpack binary fields
+    block = os.urandom(3 * 1024 * 1024 + 42)
+    await block_create_stream(alice_backend_sock, BLOCK_ID, realm, block)
+
+    rep = await block_read_stream(alice_backend_sock, BLOCK_ID)
+    assert rep == {"status": "ok", "size": len(block), "block": block}
+
+    # Interoperability with the regular commands
+    await block_create(alice_backend_sock, VLOB_ID, realm, BLOCK_DATA)
+    rep = await block_read_stream(alice_backend_sock, VLOB_ID)
+    assert rep == {"status": "ok", "size": len(BLOCK_DATA), "block": BLOCK_DATA}
+
+    rep = await block_create_stream(alice_backend_sock, VLOB_ID, realm, b"", check_rep=False)
+    assert rep == {"status": "already_exists"}
+
+    rep = await block_read_stream(alice_backend_sock, uuid4())
+    assert rep == {"status": "not_found"}
+
+    # The connection is still usable
+    rep = await block_read(alice_backend_sock, VLOB_ID)
+    assert rep == {"status": "ok", "block": BLOCK_DATA}
+
+
+@pytest.mark.trio
+async def test_block_stream_create_check_access_rights(bob_backend_sock, realm):
+    rep = await block_create_stream(bob_backend_sock, BLOCK_ID, realm, BLOCK_DATA, check_rep=False)
+    assert rep == {"status": "not_allowed"}
+    # The stream has been consumed nevertheless
+    rep = await block_read_stream(bob_backend_sock, BLOCK_ID)
+    assert rep == {"status": "not_found"}
+
+
+@pytest.mark.trio
+async def test_block_stream_create_bad_message(alice_backend_sock, realm):
+    await alice_backend_sock.send(
+        packb({"cmd": "block_create_stream", "block_id": "<dummy>", "size": len(BLOCK_DATA)})
+    )
+    await alice_backend_sock.send_stream(BLOCK_DATA)
+    rep = unpackb(await alice_backend_sock.recv())
+    assert rep["status"] == "bad_message"
+
+    # The stream has been discarded, hence not taken for the next request
+    rep = await block_read(alice_backend_sock, BLOCK_ID)
+    assert rep == {"status": "not_found"}
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("size", [len(BLOCK_DATA) - 1, len(BLOCK_DATA) + 1])
+async def test_block_stream_create_bad_size(alice_backend_sock, realm, size):
+    rep = await block_create_stream(
+        alice_backend_sock, BLOCK_ID, realm, BLOCK_DATA, size=size, check_rep=False
+    )
+    assert rep == {"status": "invalid_msg_format", "reason": "Invalid message format"}
@@ -433,6 +433,39 @@ async def test_reencryption(alice, alice_backend_sock, realm, vlobs, vlob_atoms)
         assert rep["blob"] == f"{vlob_id}::{version} reencrypted".encode()
 
 
+@pytest.mark.trio
+async def test_reencryption_batch_after_cursor(alice_backend_sock, realm, vlobs, vlob_atoms):
+    await realm_start_reencryption_maintenance(
+        alice_backend_sock, realm, 2, pendulum_now(), {"alice": b"foo"}
+    )
+
+    # Batches are ordered, so the next one can be fetched before saving the current one
+    rep = await vlob_maintenance_get_reencryption_batch(alice_backend_sock, realm, 2, size=2)
+    assert rep["status"] == "ok"
+    first_batch = rep["batch"]
+    assert [(x["vlob_id"], x["version"]) for x in first_batch] == sorted(vlob_atoms)[:2]
+
+    after = (first_batch[-1]["vlob_id"], first_batch[-1]["version"])
+    rep = await vlob_maintenance_get_reencryption_batch(
+        alice_backend_sock, realm, 2, size=2, after=after
+    )
+    assert rep["status"] == "ok"
+    second_batch = rep["batch"]
+    assert [(x["vlob_id"], x["version"]) for x in second_batch] == sorted(vlob_atoms)[2:]
+
+    for entry in [*first_batch, *second_batch]:
+        entry["blob"] = f"{entry['vlob_id']}::{entry['version']} reencrypted".encode()
+    rep = await vlob_maintenance_save_reencryption_batch(alice_backend_sock, realm, 2, second_batch)
+    assert rep == {"status": "ok", "total": 3, "done": 1}
+
+    # Saving again the same vlob atoms is a no-op
+    rep = await vlob_maintenance_save_reencryption_batch(alice_backend_sock, realm, 2, second_batch)
+    assert rep == {"status": "ok", "total": 3, "done": 1}
+
+    rep = await vlob_maintenance_save_reencryption_batch(alice_backend_sock, realm, 2, first_batch)
+    assert rep == {"status": "ok", "total": 3, "done": 3}
+
+
 @pytest.mark.trio
 async def test_reencryption_events(
     backend, alice, alice_backend_sock, alice2_backend_sock, realm, vlobs, vlob_atoms
@@ -30,6 +30,10 @@ async def check_allowed_cmds(backend_sock, cmds):
         if cmd == "events_listen":
             # Must pass wait option otherwise backend will hang forever
             await backend_sock.send(packb({"cmd": cmd, "wait": False}))
+        elif cmd == "block_create_stream":
+            # The block is always streamed after the request
+            await backend_sock.send(packb({"cmd": cmd}))
+            await backend_sock.send_stream(b"")
         else:
             await backend_sock.send(packb({"cmd": cmd}))
         rep = await backend_sock.recv()
@@ -5,6 +5,7 @@ from uuid import uuid4
 from unittest.mock import ANY
 
 from parsec.api.protocol import apiv1_organization_stats_serializer
+from parsec.backend.organization import OrganizationStats
 from tests.backend.common import vlob_create, block_create
 
 
@@ -49,3 +50,30 @@ async def test_organization_stats(coolorg, alice_backend_sock, administration_ba
 async def test_stats_unknown_organization(administration_backend_sock):
     rep = await organization_stats(administration_backend_sock, organization_id="dummy")
     assert rep == {"status": "not_found"}
+
+
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_organization_stats_counters_consistency(
+    backend, coolorg, alice_backend_sock, administration_backend_sock, realm
+):
+    await vlob_create(alice_backend_sock, realm_id=realm, vlob_id=uuid4(), blob=b"1234")
+    await block_create(alice_backend_sock, realm_id=realm, block_id=uuid4(), block=b"1234")
+
+    # Counters maintained on insert match a full computation of the stats
+    drift = await backend.organization.reconcile_stats(coolorg.organization_id)
+    assert drift == OrganizationStats(users=0, data_size=0, metadata_size=0)
+    expected = await organization_stats(administration_backend_sock, coolorg.organization_id)
+
+    # Simulate a drift of the counters, which is then corrected
+    async with backend.organization.dbh.pool.acquire() as conn:
+        await conn.execute("UPDATE organization_stats SET users = users + 1, data_size = 0")
+    rep = await organization_stats(administration_backend_sock, coolorg.organization_id)
+    assert rep != expected
+
+    drift = await backend.organization.reconcile_stats(coolorg.organization_id)
+    assert drift.data_size == expected["data_size"]
+    assert drift.metadata_size == 0
+    assert drift.users < 0
+    rep = await organization_stats(administration_backend_sock, coolorg.organization_id)
+    assert rep == expected
@@ -54,6 +54,45 @@ async def test_event_resubscribe(backend, alice_backend_sock, alice2_backend_soc
     assert rep == {"status": "no_events"}
 
 
+@pytest.mark.trio
+async def test_events_queue_overflow(backend, alice_backend_sock, alice2_backend_sock):
+    await events_subscribe(alice_backend_sock)
+
+    with backend.event_bus.listen() as spy:
+        for i in range(105):
+            await ping(alice2_backend_sock, str(i))
+        await spy.wait_multiple_with_timeout(["pinged"] * 105)
+
+    # Events queue only holds 100 events, the others are dropped
+    assert backend.events.stats() == {
+        "subscribed_clients": 1,
+        "indexed_users": 1,
+        "indexed_realms": 1,  # Alice's user manifest realm
+        "dropped_events": 5,
+        "overflowed_clients": 1,
+    }
+    for i in range(100):
+        rep = await events_listen_nowait(alice_backend_sock)
+        assert rep == {"status": "ok", "event": "pinged", "ping": str(i)}
+    rep = await events_listen_nowait(alice_backend_sock)
+    assert rep == {"status": "no_events"}
+
+
+@pytest.mark.trio
+async def test_events_unsubscribe_on_disconnect(backend, backend_sock_factory, alice):
+    async with backend_sock_factory(backend, alice) as alice_sock:
+        await events_subscribe(alice_sock)
+        assert backend.events.stats()["subscribed_clients"] == 1
+
+    assert backend.events.stats() == {
+        "subscribed_clients": 0,
+        "indexed_users": 0,
+        "indexed_realms": 0,
+        "dropped_events": 0,
+        "overflowed_clients": 0,
+    }
+
+
 @pytest.mark.trio
 @pytest.mark.postgresql
 async def test_cross_backend_event(backend_factory, backend_sock_factory, alice, bob):
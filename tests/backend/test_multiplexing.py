@@ -0,0 +1,33 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import pytest
+
+from parsec.api.protocol import (
+    packb,
+    unpackb,
+    pack_multiplexed_message,
+    unpack_multiplexed_message,
+)
+
+
+@pytest.mark.trio
+async def test_multiplexed_requests(alice_backend_sock):
+    for req_id in range(10):
+        await alice_backend_sock.send(
+            pack_multiplexed_message(req_id, packb({"cmd": "ping", "ping": str(req_id)}))
+        )
+
+    reps = {}
+    for _ in range(10):
+        req_id, raw_rep = unpack_multiplexed_message(await alice_backend_sock.recv())
+        reps[req_id] = unpackb(raw_rep)
+    assert reps == {i: {"status": "ok", "pong": str(i)} for i in range(10)}
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("cmd", ["events_subscribe", "events_listen"])
+async def test_multiplexed_excluded_cmd(alice_backend_sock, cmd):
+    await alice_backend_sock.send(pack_multiplexed_message(1, packb({"cmd": cmd})))
+    req_id, raw_rep = unpack_multiplexed_message(await alice_backend_sock.recv())
+    assert req_id == 1
+    assert unpackb(raw_rep)["status"] == "unknown_command"
@@ -0,0 +1,46 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import pytest
+
+from parsec.backend import parity
+from parsec.backend.parity import xor_buffers, ReedSolomonCodec
+
+
+@pytest.fixture(params=["numpy", "int"])
+def xor_implementation(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        assert parity.numpy is not None
+    else:
+        monkeypatch.setattr(parity, "numpy", None)
+    return request.param
+
+
+@pytest.mark.parametrize("nb_buffers", [1, 2, 5])
+@pytest.mark.parametrize("size", [0, 1, 7, 4096 + 3])
+def test_xor_buffers(xor_implementation, nb_buffers, size):
+    buffers = [os.urandom(size) for _ in range(nb_buffers)]
+    expected = bytearray(size)
+    for buff in buffers:
+        for index, value in enumerate(buff):
+            expected[index] ^= value
+
+    xored = xor_buffers(*buffers)
+    assert isinstance(xored, bytes)
+    assert xored == expected
+    # Leading zero bytes must be kept
+    assert xor_buffers(bytes(size), bytes(size)) == bytes(size)
+
+
+@pytest.mark.parametrize("nb_data, nb_parity", [(4, 1), (3, 2)])
+def test_reed_solomon_rebuild(xor_implementation, nb_data, nb_parity):
+    codec = ReedSolomonCodec(nb_data, nb_parity)
+    chunks = [os.urandom(100) for _ in range(nb_data)]
+    all_chunks = chunks + codec.encode(chunks)
+
+    for missing in range(nb_data):
+        partial_chunks = list(all_chunks)
+        for index in range(missing, missing + nb_parity):
+            partial_chunks[index] = None
+        assert codec.rebuild(partial_chunks) == chunks
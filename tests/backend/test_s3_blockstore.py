@@ -1,5 +1,8 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import time
+import threading
+import trio
 from unittest.mock import Mock
 from unittest import mock
 
@@ -9,7 +12,7 @@ from botocore.exceptions import (
 )
 import pytest
 
-from parsec.backend.s3_blockstore import S3BlockStoreComponent
+from parsec.backend.s3_blockstore import S3BlockStoreComponent, _add_if_none_match_header
 from parsec.backend.block import BlockAlreadyExistsError, BlockNotFoundError, BlockTimeoutError
 
 
@@ -48,35 +51,23 @@ async def test_s3_create():
         client_mock.return_value = Mock()
         client_mock().head_container.return_value = True
         blockstore = S3BlockStoreComponent("europe", "parsec", "john", "secret")
-        # Ok
-        client_mock().head_object.side_effect = S3ClientError(
-            error_response={"Error": {"Code": "404"}}, operation_name="HEAD"
+        # Conditional PUT is used to detect existing object
+        client_mock().meta.events.register.assert_called_with(
+            "before-sign.s3.PutObject", _add_if_none_match_header
         )
+        # Ok
         await blockstore.create("org42", 123, "content")
         client_mock().put_object.assert_called_with(
             Bucket="parsec", Key="org42/123", Body="content"
         )
-        client_mock().put_object.reset_mock()
+        client_mock().head_object.assert_not_called()
         # Already exist
-        client_mock().head_object.side_effect = None
-        with pytest.raises(BlockAlreadyExistsError):
-            await blockstore.create("org42", 123, "content")
-        client_mock().put_object.assert_not_called()
-        # Connection error at HEAD
-        client_mock().head_object.side_effect = S3EndpointConnectionError(endpoint_url="url")
-        with pytest.raises(BlockTimeoutError):
-            await blockstore.create("org42", 123, "content")
-        client_mock().put_object.assert_not_called()
-        # Unknown exception at HEAD
-        client_mock().head_object.side_effect = S3ClientError(
-            error_response={"Error": {"Code": "401"}}, operation_name="HEAD"
+        client_mock().put_object.side_effect = S3ClientError(
+            error_response={"Error": {"Code": "PreconditionFailed"}}, operation_name="PUT"
         )
-        with pytest.raises(BlockTimeoutError):
+        with pytest.raises(BlockAlreadyExistsError):
             await blockstore.create("org42", 123, "content")
         # Connection error at PUT
-        client_mock().head_object.side_effect = S3ClientError(
-            error_response={"Error": {"Code": "404"}}, operation_name="HEAD"
-        )
         client_mock().put_object.side_effect = S3EndpointConnectionError(endpoint_url="url")
         with pytest.raises(BlockTimeoutError):
             await blockstore.create("org42", 123, "content")
@@ -86,3 +77,77 @@ async def test_s3_create():
         )
         with pytest.raises(BlockTimeoutError):
             await blockstore.create("org42", 123, "content")
+
+
+def test_s3_conditional_put_header():
+    request = Mock(headers={})
+    _add_if_none_match_header(request)
+    assert request.headers == {"If-None-Match": "*"}
+
+
+@pytest.mark.trio
+async def test_s3_read_does_not_block_event_loop():
+    with mock.patch("boto3.client") as client_mock:
+        client_mock.return_value = Mock()
+        blockstore = S3BlockStoreComponent("europe", "parsec", "john", "secret")
+        got_request = threading.Event()
+        release_request = threading.Event()
+
+        def _blocking_read():
+            got_request.set()
+            release_request.wait()
+            return "content"
+
+        client_mock().get_object.return_value = {"Body": Mock(read=_blocking_read)}
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(blockstore.read, "org42", 123)
+            await trio.to_thread.run_sync(got_request.wait)
+            # Event loop is still available while S3 is processing the request
+            await trio.sleep(0)
+            release_request.set()
+
+
+@pytest.mark.trio
+async def test_s3_operation_timeout():
+    with mock.patch("boto3.client") as client_mock:
+        client_mock.return_value = Mock()
+        blockstore = S3BlockStoreComponent(
+            "europe", "parsec", "john", "secret", operation_timeout=0.01
+        )
+        release_request = threading.Event()
+        client_mock().get_object.side_effect = lambda **kwargs: release_request.wait()
+        client_mock().put_object.side_effect = lambda **kwargs: release_request.wait()
+        try:
+            with pytest.raises(BlockTimeoutError):
+                await blockstore.read("org42", 123)
+            with pytest.raises(BlockTimeoutError):
+                await blockstore.create("org42", 123, "content")
+        finally:
+            release_request.set()
+
+
+@pytest.mark.trio
+async def test_s3_bounded_concurrency():
+    with mock.patch("boto3.client") as client_mock:
+        client_mock.return_value = Mock()
+        blockstore = S3BlockStoreComponent("europe", "parsec", "john", "secret", max_connections=2)
+        lock = threading.Lock()
+        running = 0
+        max_running = 0
+
+        def _get_object(**kwargs):
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(running, max_running)
+            time.sleep(0.01)
+            with lock:
+                running -= 1
+            return {"Body": Mock(read=lambda: "content")}
+
+        client_mock().get_object.side_effect = _get_object
+        async with trio.open_nursery() as nursery:
+            for i in range(6):
+                nursery.start_soon(blockstore.read, "org42", i)
+        assert max_running == 2
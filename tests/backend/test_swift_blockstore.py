@@ -1,5 +1,6 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import threading
 from unittest.mock import Mock
 from unittest import mock
 import swiftclient
@@ -39,15 +40,32 @@ async def test_swift_post():
         connection_mock().head_container.return_value = True
         blockstore = SwiftBlockStoreComponent("http://url", "scille", "parsec", "john", "secret")
         # Ok
-        connection_mock().get_object.side_effect = ClientException(http_status=404, msg="")
         await blockstore.create("org42", 123, "content")
-        connection_mock().put_object.assert_called_with("parsec", "org42/123", "content")
+        connection_mock().put_object.assert_called_with(
+            "parsec", "org42/123", "content", headers={"If-None-Match": "*"}
+        )
+        connection_mock().get_object.assert_not_called()
         # Already exists
-        connection_mock().get_object.side_effect = None
-        connection_mock().get_object.return_value = True, "content"
+        connection_mock().put_object.side_effect = ClientException(http_status=412, msg="")
         with pytest.raises(BlockAlreadyExistsError):
             await blockstore.create("org42", 123, "content")
         # Other exception
-        connection_mock().get_object.side_effect = ClientException(http_status=500, msg="")
+        connection_mock().put_object.side_effect = ClientException(http_status=500, msg="")
         with pytest.raises(BlockTimeoutError):
             await blockstore.create("org42", 123, "content")
+
+
+@pytest.mark.trio
+async def test_swift_operation_timeout():
+    with mock.patch("swiftclient.Connection") as connection_mock:
+        connection_mock.return_value = Mock()
+        blockstore = SwiftBlockStoreComponent(
+            "http://url", "scille", "parsec", "john", "secret", operation_timeout=0.01
+        )
+        release_request = threading.Event()
+        connection_mock().get_object.side_effect = lambda *args: release_request.wait()
+        try:
+            with pytest.raises(BlockTimeoutError):
+                await blockstore.read("org42", 123)
+        finally:
+            release_request.set()
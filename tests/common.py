@@ -99,6 +99,22 @@ class FreezeTestOnTransportError(Transport):
             # Wait here until this coroutine is cancelled
             await trio.sleep_forever()
 
+    async def send_stream(self, data):
+        try:
+            return await self.transport.send_stream(data)
+
+        except TransportError:
+            # Wait here until this coroutine is cancelled
+            await trio.sleep_forever()
+
+    async def recv_stream(self, size):
+        try:
+            return await self.transport.recv_stream(size)
+
+        except TransportError:
+            # Wait here until this coroutine is cancelled
+            await trio.sleep_forever()
+
 
 @attr.s
 class CallController:
@@ -33,6 +33,7 @@ from parsec.backend.config import (
     RAID0BlockStoreConfig,
     RAID1BlockStoreConfig,
     RAID5BlockStoreConfig,
+    RAIDNBlockStoreConfig,
 )
 
 
@@ -376,6 +377,10 @@ def persistent_mockup(monkeypatch):
         storage_set.discard(storage)
         storage._conn = None
 
+    async def _connect_readers(storage):
+        # In-memory databases cannot be shared with read-only connections
+        pass
+
     @asynccontextmanager
     async def thread_pool_runner(max_workers):
         assert max_workers == 1
@@ -388,6 +393,7 @@ def persistent_mockup(monkeypatch):
     monkeypatch.setattr(local_database, "thread_pool_runner", thread_pool_runner)
     monkeypatch.setattr(LocalDatabase, "_create_connection", _create_connection)
     monkeypatch.setattr(LocalDatabase, "_close", _close)
+    monkeypatch.setattr(LocalDatabase, "_connect_readers", _connect_readers)
 
     yield mockup_context
     mockup_context.clear()
@@ -437,6 +443,11 @@ def blockstore(request, backend_store):
         config = RAID5BlockStoreConfig(
             blockstores=[config, MockedBlockStoreConfig(), MockedBlockStoreConfig()]
         )
+    if request.node.get_closest_marker("raidn_blockstore"):
+        # 3 data nodes and 2 parity nodes
+        config = RAIDNBlockStoreConfig(
+            blockstores=[config, *(MockedBlockStoreConfig() for _ in range(4))], nb_parity=2
+        )
 
     return config
 
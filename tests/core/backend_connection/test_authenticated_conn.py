@@ -199,6 +199,32 @@ async def test_concurrency_sends(running_backend, alice, event_bus):
             await work_all_done.wait()
 
 
+@pytest.mark.trio
+async def test_multiplexed_concurrency_sends(running_backend, alice, event_bus):
+    CONCURRENCY = 10
+
+    async def sender(cmds, x):
+        rep = await cmds.ping(x)
+        assert rep == {"status": "ok", "pong": str(x)}
+
+    conn = BackendAuthenticatedConn(
+        alice.organization_addr,
+        alice.device_id,
+        alice.signing_key,
+        event_bus,
+        multiplexed_connections=2,
+    )
+    async with conn.run():
+        with trio.fail_after(1):
+            async with trio.open_service_nursery() as nursery:
+                for x in range(CONCURRENCY):
+                    nursery.start_soon(sender, conn.cmds, str(x))
+
+        # Requests have been shared among the multiplexed connections
+        assert len(conn._multiplexed_transport_pool._transports) <= 2
+        assert not conn._multiplexed_transport_pool.unsupported
+
+
 @pytest.mark.trio
 async def test_realm_notif_on_new_entry_sync(running_backend, alice_backend_conn, alice2_user_fs):
     wid = await alice2_user_fs.workspace_create("foo")
@@ -0,0 +1,37 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import time
+import pytest
+
+from parsec.core.types import DEFAULT_BLOCK_SIZE
+
+
+FILE_SIZE = 50 * 1024 * 1024  # 100 blocks of 512KB
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("max_concurrency", [1, 2, 4, 8])
+async def test_bench_cold_read_throughput(running_backend, alice_user_fs, max_concurrency):
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    workspace.remote_loader.block_download_max_concurrency = max_concurrency
+
+    data = os.urandom(FILE_SIZE)
+    await workspace.touch("/foo.bin")
+    await workspace.write_bytes("/foo.bin", data)
+    await workspace.sync()
+
+    # Drop the local cache so every block has to be downloaded again
+    await workspace.local_storage.block_storage.clear_all_blocks()
+
+    start = time.perf_counter()
+    assert await workspace.read_bytes("/foo.bin") == data
+    duration = time.perf_counter() - start
+
+    print(
+        f"\nCold read of {FILE_SIZE // DEFAULT_BLOCK_SIZE} blocks "
+        f"(max_concurrency={max_concurrency}): {duration:.3f}s, "
+        f"{FILE_SIZE / duration / 1024 ** 2:.1f} MB/s"
+    )
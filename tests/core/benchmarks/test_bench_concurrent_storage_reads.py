@@ -0,0 +1,76 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import trio
+import pytest
+
+from parsec.core.types import EntryID, Chunk, LocalFileManifest
+from parsec.core.fs.storage import WorkspaceStorage
+
+
+NB_MANIFESTS = 50
+NB_CHUNKS = 50
+CHUNK_SIZE = 64 * 1024
+WRITE_SIZE = 4 * 1024 * 1024
+NB_READS = 500
+
+
+async def _measure_reads(aws, manifests, chunk_ids):
+    latencies = []
+    done = trio.Event()
+
+    # Large copy going on: big chunks written and committed continuously
+    async def _writer():
+        data = os.urandom(WRITE_SIZE)
+        while not done.is_set():
+            await aws.set_chunk(Chunk.new(0, WRITE_SIZE).id, data)
+            await aws.data_localdb.commit()
+
+    # Parallel `ls` and `cat`: manifests and chunks not in the memory caches
+    async def _reader(index):
+        for i in range(index, NB_READS, 4):
+            await aws.manifest_storage.clear_memory_cache()
+            aws.chunk_storage.clear_memory_cache()
+            start = trio.current_time()
+            await aws.get_manifest(manifests[i % len(manifests)].id)
+            await aws.get_chunk(chunk_ids[i % len(chunk_ids)])
+            latencies.append(trio.current_time() - start)
+
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(_writer)
+        async with trio.open_nursery() as readers:
+            for index in range(4):
+                readers.start_soon(_reader, index)
+        done.set()
+
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_bench_reads_during_large_write(tmpdir, alice):
+    results = {}
+    for max_readers in (0, 4):
+        path = tmpdir / f"readers-{max_readers}"
+        async with WorkspaceStorage.run(alice, path, EntryID(), max_readers=max_readers) as aws:
+            manifests = []
+            for _ in range(NB_MANIFESTS):
+                manifest = LocalFileManifest.new_placeholder(parent=EntryID())
+                async with aws.lock_entry_id(manifest.id):
+                    await aws.set_manifest(manifest.id, manifest)
+                manifests.append(manifest)
+            chunk_ids = []
+            for _ in range(NB_CHUNKS):
+                chunk = Chunk.new(0, CHUNK_SIZE)
+                await aws.set_chunk(chunk.id, os.urandom(CHUNK_SIZE))
+                chunk_ids.append(chunk.id)
+            await aws.data_localdb.commit()
+
+            results[max_readers] = await _measure_reads(aws, manifests, chunk_ids)
+
+    for max_readers, (median, p99) in results.items():
+        print(
+            f"\n{max_readers} reader connection(s): read latency during a large write "
+            f"median={median * 1000:.2f}ms p99={p99 * 1000:.2f}ms"
+        )
@@ -0,0 +1,102 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import time
+import pytest
+
+from parsec.crypto import SecretKey, HashDigest
+from parsec.core.types import DEFAULT_BLOCK_SIZE, BlockID, BlockAccess, Chunk
+
+
+NB_FOLDERS = 10
+NB_FILES_PER_FOLDER = 10
+FILE_SIZE = 105 * 1024 * 1024  # ~10GB tree in total
+
+
+async def _make_synced_like_file(workspace, path, size):
+    # Crafting the block accesses is enough here: a metadata-only copy
+    # never reads the blocks, so there is no need to upload 10GB first
+    await workspace.touch(path)
+    entry_id = await workspace.path_id(path)
+    blocks = []
+    for offset in range(0, size, DEFAULT_BLOCK_SIZE):
+        access = BlockAccess(
+            id=BlockID(),
+            key=SecretKey.generate(),
+            offset=offset,
+            size=min(DEFAULT_BLOCK_SIZE, size - offset),
+            digest=HashDigest.from_data(b""),
+        )
+        blocks.append((Chunk.from_block_acess(access),))
+    async with workspace.local_storage.lock_entry_id(entry_id):
+        manifest = await workspace.local_storage.get_manifest(entry_id)
+        manifest = manifest.evolve(size=size, blocks=tuple(blocks))
+        await workspace.local_storage.set_manifest(entry_id, manifest)
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_bench_copytree_10gb(running_backend, alice_user_fs):
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    await workspace.mkdir("/src")
+    for i in range(NB_FOLDERS):
+        await workspace.mkdir(f"/src/dir-{i}")
+        for j in range(NB_FILES_PER_FOLDER):
+            await _make_synced_like_file(workspace, f"/src/dir-{i}/file-{j}.bin", FILE_SIZE)
+
+    transferred = []
+
+    async def _forbidden(*args, **kwargs):
+        transferred.append(args)
+        raise AssertionError("No block should be transferred")
+
+    workspace.remote_loader.load_blocks = _forbidden
+    workspace.remote_loader.upload_blocks = _forbidden
+
+    start = time.perf_counter()
+    await workspace.copytree("/src", "/dst")
+    duration = time.perf_counter() - start
+
+    assert not transferred
+    info = await workspace.path_info("/dst/dir-0/file-0.bin")
+    assert info["size"] == FILE_SIZE
+    total = NB_FOLDERS * NB_FILES_PER_FOLDER * FILE_SIZE
+    print(
+        f"\nMetadata-only copytree of {NB_FOLDERS * NB_FILES_PER_FOLDER} files "
+        f"({total / 1024 ** 3:.1f}GB): {duration:.2f}s"
+    )
+
+
+async def _bytes_copyfile(workspace, source_path, target_path):
+    # Previous implementation of `WorkspaceFS.copyfile`
+    await workspace.touch(target_path, exist_ok=False)
+    offset = 0
+    while True:
+        buff = await workspace.read_bytes(source_path, DEFAULT_BLOCK_SIZE, offset)
+        if not buff:
+            break
+        await workspace.write_bytes(target_path, buff, offset)
+        offset += DEFAULT_BLOCK_SIZE
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("mode", ["bytes", "metadata"])
+async def test_bench_copyfile_then_sync(running_backend, alice_user_fs, mode):
+    size = 32 * 1024 * 1024
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    await workspace.touch("/src.bin")
+    await workspace.write_bytes("/src.bin", os.urandom(size))
+    await workspace.sync()
+
+    start = time.perf_counter()
+    if mode == "bytes":
+        await _bytes_copyfile(workspace, "/src.bin", "/dst.bin")
+    else:
+        await workspace.copyfile("/src.bin", "/dst.bin")
+    await workspace.sync()
+    duration = time.perf_counter() - start
+
+    print(f"\nCopy and sync of a {size // 1024 ** 2}MB file ({mode}): {duration:.2f}s")
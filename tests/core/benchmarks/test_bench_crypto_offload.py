@@ -0,0 +1,56 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import trio
+import pytest
+
+from parsec.core.fs import crypto_offload
+from parsec.core.types import FsPath, DEFAULT_BLOCK_SIZE
+
+
+FILE_SIZE = 64 * 1024 * 1024
+TICK = 0.001
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("offload", [False, True])
+async def test_bench_loop_responsiveness_during_copy(monkeypatch, alice_user_fs, offload):
+    if not offload:
+        monkeypatch.setattr(crypto_offload, "CRYPTO_OFFLOAD_THRESHOLD", float("inf"))
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    data = os.urandom(FILE_SIZE)
+    lags = []
+
+    # Stand-in for the GUI or the sync monitor: a task waking up every millisecond
+    async def _monitor(task_status=trio.TASK_STATUS_IGNORED):
+        task_status.started()
+        while True:
+            start = trio.current_time()
+            try:
+                await trio.sleep(TICK)
+            finally:
+                lags.append(trio.current_time() - start - TICK)
+
+    # Copy a large file in, block by block, then reshape it for the sync
+    async with trio.open_nursery() as nursery:
+        await nursery.start(_monitor)
+        start = trio.current_time()
+        await workspace.touch("/foo.bin")
+        _, fd = await workspace.transactions.file_open(FsPath("/foo.bin"), "w")
+        for offset in range(0, FILE_SIZE, DEFAULT_BLOCK_SIZE):
+            await workspace.transactions.fd_write(
+                fd, data[offset : offset + DEFAULT_BLOCK_SIZE], offset
+            )
+        await workspace.transactions.fd_close(fd)
+        await workspace.transactions.file_reshape(await workspace.path_id("/foo.bin"))
+        duration = trio.current_time() - start
+        nursery.cancel_scope.cancel()
+
+    lags.sort()
+    print(
+        f"\nCopy of {FILE_SIZE // 1024 ** 2}MB (offload={offload}): {duration:.2f}s, "
+        f"loop lag median={lags[len(lags) // 2] * 1000:.2f}ms "
+        f"p99={lags[int(len(lags) * 0.99)] * 1000:.2f}ms max={lags[-1] * 1000:.2f}ms"
+    )
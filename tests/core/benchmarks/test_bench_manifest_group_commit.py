@@ -0,0 +1,35 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import pytest
+
+
+NB_FOLDERS = 100
+NB_FILES_PER_FOLDER = 500  # 50k files in total
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("flush_interval", [None, 1.0])
+async def test_bench_untar_50k_files(alice_user_fs, flush_interval):
+    alice_user_fs.manifest_flush_interval = flush_interval
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    localdb = workspace.local_storage.data_localdb
+    commit_count = localdb.commit_count
+
+    # Equivalent of `tar -x` of an archive with 50k small files
+    start = time.perf_counter()
+    for i in range(NB_FOLDERS):
+        await workspace.mkdir(f"/dir-{i}")
+        for j in range(NB_FILES_PER_FOLDER):
+            await workspace.touch(f"/dir-{i}/file-{j}.txt")
+            await workspace.write_bytes(f"/dir-{i}/file-{j}.txt", b"content")
+    duration = time.perf_counter() - start
+
+    assert await workspace.read_bytes("/dir-0/file-0.txt") == b"content"
+    nb_files = NB_FOLDERS * NB_FILES_PER_FOLDER
+    print(
+        f"\nCreation of {nb_files} files (flush_interval={flush_interval}): "
+        f"{duration:.2f}s, {localdb.commit_count - commit_count} commits"
+    )
@@ -0,0 +1,87 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import trio
+import pytest
+
+from parsec.core.backend_connection import BackendConnStatus
+
+
+NB_WORKSPACES = 2
+NB_FILES_PER_WORKSPACE = 250
+# In-process backend answers instantly, this accounts for the network
+# and database round trips of a real deployment
+BACKEND_LATENCY = 0.01
+
+
+def _add_latency(component, method_name):
+    method = getattr(component, method_name)
+
+    async def _with_latency(*args, **kwargs):
+        await trio.sleep(BACKEND_LATENCY)
+        return await method(*args, **kwargs)
+
+    setattr(component, method_name, _with_latency)
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("max_concurrent_syncs_per_workspace", [1, 4])
+async def test_bench_offline_changes_catch_up(
+    monkeypatch, running_backend, core_factory, alice, max_concurrent_syncs_per_workspace
+):
+    monkeypatch.setattr(
+        "parsec.core.sync_monitor.MAX_CONCURRENT_SYNCS_PER_WORKSPACE",
+        max_concurrent_syncs_per_workspace,
+    )
+
+    for method_name in ("create", "update", "read"):
+        _add_latency(running_backend.backend.vlob, method_name)
+
+    async with core_factory(alice) as core:
+        workspaces = []
+        for i in range(NB_WORKSPACES):
+            wid = await core.user_fs.workspace_create(f"w{i}")
+            workspaces.append(core.user_fs.get_workspace(wid))
+        with trio.fail_after(60):
+            await core.wait_idle_monitors()
+
+        # Offline session
+        with running_backend.offline_for(alice.device_id):
+            for workspace in workspaces:
+                for i in range(NB_FILES_PER_WORKSPACE):
+                    await workspace.touch(f"/file-{i}.txt")
+            with trio.fail_after(60):
+                await core.wait_idle_monitors()
+
+        with core.event_bus.listen() as spy:
+            await spy.wait_with_timeout(
+                "backend.connection.changed",
+                {"status": BackendConnStatus.READY, "status_exc": spy.ANY},
+                timeout=60,
+            )
+            start = time.perf_counter()
+            # Monitors may be considered idle until they are restarted
+            # after the reconnection, so poll the remaining changes
+            remaining = [
+                (workspace, f"/file-{i}.txt")
+                for workspace in workspaces
+                for i in range(NB_FILES_PER_WORKSPACE)
+            ]
+            with trio.fail_after(600):
+                while remaining:
+                    await trio.sleep(0.1)
+                    remaining = [
+                        (workspace, path)
+                        for workspace, path in remaining
+                        if (await workspace.path_info(path))["need_sync"]
+                    ]
+                await core.wait_idle_monitors()
+            duration = time.perf_counter() - start
+
+    print(
+        f"\nCatching up {NB_WORKSPACES * NB_FILES_PER_WORKSPACE} offline changes "
+        f"with a {BACKEND_LATENCY * 1000:.0f}ms backend latency "
+        f"(max_concurrent_syncs_per_workspace={max_concurrent_syncs_per_workspace}): "
+        f"{duration:.2f}s"
+    )
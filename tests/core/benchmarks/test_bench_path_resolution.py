@@ -0,0 +1,87 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import pytest
+
+from parsec.core.types import FsPath, LocalFileManifest, LocalFolderManifest
+
+
+NB_TOP_FOLDERS = 10
+NB_SUB_FOLDERS = 10
+NB_FILES_PER_FOLDER = 1000  # 100k files in total
+
+
+class _NoCache(dict):
+    def __setitem__(self, key, value):
+        pass
+
+
+async def _create_children(workspace, parent_id, children):
+    # Crafting the manifests avoids the quadratic cost of adding the
+    # entries one by one to folders with a thousand children
+    async with workspace.local_storage.lock_entry_id(parent_id):
+        parent = await workspace.local_storage.get_manifest(parent_id)
+        for child in children.values():
+            await workspace.local_storage.set_manifest(
+                child.id, child, cache_only=True, check_lock_status=False
+            )
+        parent = parent.evolve_children({name: child.id for name, child in children.items()})
+        await workspace.local_storage.set_manifest(parent_id, parent, cache_only=True)
+
+
+async def _build_tree(workspace):
+    folders = []
+    top_folders = {
+        f"dir-{i}": LocalFolderManifest.new_placeholder(parent=workspace.workspace_id)
+        for i in range(NB_TOP_FOLDERS)
+    }
+    await _create_children(workspace, workspace.workspace_id, top_folders)
+    for top_name, top_folder in top_folders.items():
+        sub_folders = {
+            f"sub-{j}": LocalFolderManifest.new_placeholder(parent=top_folder.id)
+            for j in range(NB_SUB_FOLDERS)
+        }
+        await _create_children(workspace, top_folder.id, sub_folders)
+        for sub_name, sub_folder in sub_folders.items():
+            files = {
+                f"file-{k}.txt": LocalFileManifest.new_placeholder(parent=sub_folder.id)
+                for k in range(NB_FILES_PER_FOLDER)
+            }
+            await _create_children(workspace, sub_folder.id, files)
+            folders.append(FsPath(f"/{top_name}/{sub_name}"))
+    return folders
+
+
+async def _find_and_stat(workspace, path):
+    # Equivalent of `find -exec stat` through a mountpoint: a readdir
+    # on each folder followed by a getattr on each of its children
+    count = 0
+    info = await workspace.transactions.entry_info(path)
+    for name in info.get("children", ()):
+        count += await _find_and_stat(workspace, path / name)
+    return count + 1
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("path_cache", [False, True])
+async def test_bench_find_stat_100k_entries(alice_user_fs, path_cache):
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    await _build_tree(workspace)
+    if not path_cache:
+        workspace.transactions._path_cache = _NoCache()
+
+    start = time.perf_counter()
+    nb_entries = await _find_and_stat(workspace, FsPath("/"))
+    find_duration = time.perf_counter() - start
+
+    # Second pass, as done by tools stating the same tree over and over
+    start = time.perf_counter()
+    assert await _find_and_stat(workspace, FsPath("/")) == nb_entries
+    second_duration = time.perf_counter() - start
+
+    print(
+        f"\nfind/stat over {nb_entries} entries (path_cache={path_cache}): "
+        f"{find_duration:.2f}s, second pass {second_duration:.2f}s"
+    )
@@ -0,0 +1,58 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import random
+import tracemalloc
+import pytest
+
+from parsec.core.types import FsPath, DEFAULT_BLOCK_SIZE
+
+
+NB_BLOCKS = 8
+NB_READS = 1000
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("read_size", [4 * 1024, 64 * 1024])
+async def test_bench_small_random_reads_allocations(alice_user_fs, read_size):
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+
+    # File made of full blocks, kept in the local storage
+    data = os.urandom(NB_BLOCKS * DEFAULT_BLOCK_SIZE)
+    await workspace.touch("/foo.bin")
+    _, fd = await workspace.transactions.file_open(FsPath("/foo.bin"), "r")
+    await workspace.transactions.fd_write(fd, data, 0)
+    await workspace.transactions.fd_flush(fd)
+
+    # Reads within a single block, with the decrypted blocks in memory
+    offsets = []
+    for _ in range(NB_READS):
+        block = random.randrange(NB_BLOCKS)
+        offsets.append(
+            block * DEFAULT_BLOCK_SIZE + random.randrange(DEFAULT_BLOCK_SIZE - read_size)
+        )
+    for block in range(NB_BLOCKS):
+        await workspace.transactions.fd_read(fd, 1, block * DEFAULT_BLOCK_SIZE)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for offset in offsets:
+            tracemalloc.clear_traces()
+            result = await workspace.transactions.fd_read(fd, read_size, offset)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak)
+            assert result == data[offset : offset + read_size]
+    finally:
+        tracemalloc.stop()
+        await workspace.transactions.fd_close(fd)
+
+    print(
+        f"\n{NB_READS} random reads of {read_size // 1024}KB in {DEFAULT_BLOCK_SIZE // 1024}KB "
+        f"blocks: {sum(peaks) / len(peaks):.0f} bytes allocated per read on average "
+        f"(max {max(peaks)})"
+    )
+    # No copy of the block nor of the data read
+    assert sum(peaks) / len(peaks) < read_size
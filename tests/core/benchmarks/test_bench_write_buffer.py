@@ -0,0 +1,47 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import time
+import pytest
+
+from parsec.core.types import FsPath
+
+
+FILE_SIZE = 256 * 1024 * 1024
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+@pytest.mark.parametrize("write_buffer", [False, True])
+@pytest.mark.parametrize("block_size", [4 * 1024, 1024 * 1024])
+async def test_bench_dd_write(alice_user_fs, block_size, write_buffer):
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    transactions = workspace.transactions
+    if not write_buffer:
+        transactions._write_buffers_max_size = 0
+
+    written = 0
+    set_chunk = workspace.local_storage.set_chunk
+
+    async def _set_chunk(chunk_id, data):
+        nonlocal written
+        written += 1
+        await set_chunk(chunk_id, data)
+
+    workspace.local_storage.set_chunk = _set_chunk
+
+    # Equivalent of `dd if=/dev/zero of=<mountpoint>/file bs=<block_size>`
+    block = b"\x00" * block_size
+    _, fd = await transactions.file_create(FsPath("/file"))
+    start = time.perf_counter()
+    for offset in range(0, FILE_SIZE, block_size):
+        await transactions.fd_write(fd, block, offset)
+    await transactions.fd_close(fd)
+    duration = time.perf_counter() - start
+
+    assert (await workspace.path_info("/file"))["size"] == FILE_SIZE
+    print(
+        f"\ndd bs={block_size // 1024}k of {FILE_SIZE // 1024 ** 2}MB "
+        f"(write_buffer={write_buffer}): {FILE_SIZE / duration / 1024 ** 2:.0f}MB/s, "
+        f"{written} chunks written"
+    )
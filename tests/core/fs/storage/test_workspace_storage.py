@@ -2,6 +2,7 @@
 
 from pathlib import Path
 
+import trio
 import pytest
 from pendulum import now
 
@@ -191,6 +192,72 @@ async def test_cache_flushed_on_exit(tmpdir, alice, workspace_id):
         assert await aws2.get_manifest(manifest.id) == manifest
 
 
+@pytest.mark.trio
+async def test_manifests_group_commit(mock_clock, tmpdir, alice, workspace_id):
+    mock_clock.autojump_threshold = 0.1
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, manifest_flush_interval=10) as aws:
+        aws.manifest_storage.flush_threshold = 10
+        manifests = [create_manifest(aws.device, LocalFileManifest) for _ in range(15)]
+        chunk = Chunk.new(0, 3)
+        await aws.set_chunk(chunk.id, b"abc")
+
+        async def _set_manifests(manifests, **kwargs):
+            for manifest in manifests:
+                async with aws.lock_entry_id(manifest.id):
+                    await aws.set_manifest(manifest.id, manifest, **kwargs)
+
+        async def _is_persistent(manifest):
+            async with WorkspaceStorage.run(alice, tmpdir, workspace_id) as aws2:
+                try:
+                    return await aws2.get_manifest(manifest.id) == manifest
+                except FSLocalMissError:
+                    return False
+
+        # The manifests are waiting for the group commit
+        commit_count = aws.data_localdb.commit_count
+        await _set_manifests(manifests[:8])
+        await _set_manifests(manifests[8:9], removed_ids={chunk.id})
+        assert aws.data_localdb.commit_count == commit_count
+        assert not await _is_persistent(manifests[0])
+        assert await aws.get_chunk(chunk.id) == b"abc"
+
+        # Reaching the threshold commits all of them in a single transaction
+        await _set_manifests(manifests[9:10])
+        assert aws.data_localdb.commit_count == commit_count + 1
+        assert all([await _is_persistent(manifest) for manifest in manifests[:10]])
+        with pytest.raises(FSLocalMissError):
+            await aws.get_chunk(chunk.id)
+
+        # The remaining ones are committed once the flush interval is over
+        await _set_manifests(manifests[10:])
+        assert not await _is_persistent(manifests[10])
+        with trio.fail_after(11):
+            while aws.manifest_storage._cache_ahead_of_localdb:
+                await trio.sleep(0.1)
+        assert aws.data_localdb.commit_count == commit_count + 2
+        assert all([await _is_persistent(manifest) for manifest in manifests[10:]])
+
+        # Cache only manifests are not concerned by the group commit
+        manifest = create_manifest(aws.device, LocalFileManifest)
+        await _set_manifests([manifest], cache_only=True)
+        await trio.sleep(20)
+        assert not await _is_persistent(manifest)
+
+        # Unless they are allowed to join it
+        async with aws.lock_entry_id(manifest.id):
+            await aws.ensure_manifest_persistent(manifest.id, group_commit=True)
+        assert not await _is_persistent(manifest)
+        with trio.fail_after(11):
+            while aws.manifest_storage._cache_ahead_of_localdb:
+                await trio.sleep(0.1)
+        assert await _is_persistent(manifest)
+
+        # The synchronization never misses the pending manifests
+        await _set_manifests(manifests[:1])
+        local_changes, _ = await aws.get_need_sync_entries()
+        assert local_changes == {x.id for x in manifests + [manifest]}
+
+
 @pytest.mark.trio
 async def test_clear_cache(alice_workspace_storage):
     aws = alice_workspace_storage
@@ -356,6 +423,141 @@ async def test_chunk_interface(alice_workspace_storage):
     await aws.clear_chunk(chunk.id, miss_ok=True)
 
 
+@pytest.mark.trio
+async def test_chunk_memory_cache(alice_workspace_storage):
+    aws = alice_workspace_storage
+    chunk = Chunk.new(0, 7)
+
+    def get_stats():
+        return aws.get_chunk_cache_statistics()["chunks"]
+
+    await aws.set_chunk(chunk.id, b"0123456")
+    assert await aws.get_chunk(chunk.id) == b"0123456"
+    assert await aws.get_chunk(chunk.id) == b"0123456"
+    stats = get_stats()
+    assert (stats.hits, stats.misses, stats.entries, stats.size) == (1, 1, 1, 7)
+    assert stats.hit_ratio == 0.5
+
+    # Cache is invalidated on set
+    await aws.set_chunk(chunk.id, b"abcdefg")
+    assert get_stats().entries == 0
+    assert await aws.get_chunk(chunk.id) == b"abcdefg"
+
+    # Cache is invalidated on clear
+    await aws.clear_chunk(chunk.id)
+    assert get_stats().entries == 0
+    with pytest.raises(FSLocalMissError):
+        await aws.get_chunk(chunk.id)
+
+    # Cache is invalidated when the chunk is removed from its manifest
+    await aws.set_chunk(chunk.id, b"0123456")
+    assert await aws.get_chunk(chunk.id) == b"0123456"
+    manifest = create_manifest(aws.device, LocalFileManifest)
+    await aws.set_manifest(manifest.id, manifest, check_lock_status=False, removed_ids={chunk.id})
+    assert get_stats().entries == 0
+    with pytest.raises(FSLocalMissError):
+        await aws.get_chunk(chunk.id)
+
+
+@pytest.mark.trio
+async def test_block_memory_cache_bounded_size(tmpdir, alice, workspace_id):
+    chunks = [Chunk.new(0, 10).evolve_as_block(b"") for _ in range(3)]
+
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, memory_cache_size=20) as aws:
+        for chunk in chunks:
+            await aws.set_clean_block(chunk.access.id, bytes(10))
+            await aws.get_chunk(chunk.id)
+
+        # Least recently used block has been evicted
+        stats = aws.get_chunk_cache_statistics()["blocks"]
+        assert (stats.entries, stats.size) == (2, 20)
+        await aws.get_chunk(chunks[0].id)
+        assert aws.get_chunk_cache_statistics()["blocks"].misses == 4
+
+        await aws.block_storage.clear_all_blocks()
+        assert aws.get_chunk_cache_statistics()["blocks"].entries == 0
+        with pytest.raises(FSLocalMissError):
+            await aws.get_chunk(chunks[0].id)
+
+
+@pytest.mark.trio
+async def test_block_memory_cache_on_garbage_collection(tmpdir, alice, workspace_id):
+    chunks = [Chunk.new(0, 10).evolve_as_block(b"") for _ in range(3)]
+    cache_size = 2 * DEFAULT_BLOCK_SIZE
+
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, cache_size=cache_size) as aws:
+        for chunk in chunks[:2]:
+            await aws.set_clean_block(chunk.access.id, bytes(10))
+            await aws.get_chunk(chunk.id)
+        assert aws.get_chunk_cache_statistics()["blocks"].entries == 2
+
+        # Only the collected block is removed from the memory cache
+        await aws.set_clean_block(chunks[2].access.id, bytes(10))
+        assert await aws.block_storage.get_nb_blocks() == 2
+        stats = aws.get_chunk_cache_statistics()["blocks"]
+        assert (stats.entries, stats.size) == (1, 10)
+        assert await aws.get_chunk(chunks[1].id) == bytes(10)
+        assert aws.get_chunk_cache_statistics()["blocks"].hits == 1
+        with pytest.raises(FSLocalMissError):
+            await aws.get_chunk(chunks[0].id)
+
+
+@pytest.mark.trio
+async def test_manifest_memory_cache_bounded_size(tmpdir, alice, workspace_id):
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, manifest_cache_size=2) as aws:
+        manifests = [create_manifest(aws.device, LocalFileManifest) for _ in range(3)]
+
+        async def _ensure_manifest_persistent(manifest):
+            async with aws.lock_entry_id(manifest.id):
+                await aws.ensure_manifest_persistent(manifest.id)
+
+        # Manifests not yet written to the local database are never evicted
+        for manifest in manifests:
+            await aws.set_manifest(manifest.id, manifest, cache_only=True, check_lock_status=False)
+        stats = aws.get_manifest_cache_statistics()
+        assert (stats.entries, stats.evictions) == (3, 0)
+
+        # Least recently used manifest is evicted once written
+        assert await aws.get_manifest(manifests[0].id) == manifests[0]
+        await _ensure_manifest_persistent(manifests[1])
+        stats = aws.get_manifest_cache_statistics()
+        assert (stats.entries, stats.evictions) == (2, 1)
+        assert manifests[1].id not in aws.manifest_storage._cache
+        await _ensure_manifest_persistent(manifests[0])
+        await _ensure_manifest_persistent(manifests[2])
+        assert aws.get_manifest_cache_statistics().evictions == 1
+
+        # Evicted manifest is loaded back from the local database
+        assert await aws.get_manifest(manifests[1].id) == manifests[1]
+        stats = aws.get_manifest_cache_statistics()
+        assert (stats.hits, stats.misses, stats.entries, stats.evictions) == (1, 1, 2, 2)
+        assert stats.hit_ratio == 0.5
+
+        await aws.clear_memory_cache()
+        assert aws.get_manifest_cache_statistics().entries == 0
+
+
+@pytest.mark.trio
+async def test_block_accessed_on_deferred_flush(alice_workspace_storage):
+    aws = alice_workspace_storage
+    chunk = Chunk.new(0, 7).evolve_as_block(b"0123456")
+    await aws.set_clean_block(chunk.access.id, b"0123456")
+
+    async def get_accessed_on():
+        async with aws.block_storage._open_cursor() as cursor:
+            cursor.execute("SELECT accessed_on FROM chunks WHERE chunk_id = ?", (chunk.id.bytes,))
+            accessed_on, = cursor.fetchone()
+        return accessed_on
+
+    set_on = await get_accessed_on()
+    for _ in range(10):
+        await aws.get_chunk(chunk.id)
+    assert await get_accessed_on() == set_on
+
+    await aws.block_storage.flush_accessed_on()
+    assert await get_accessed_on() > set_on
+
+
 @pytest.mark.trio
 async def test_file_descriptor(alice_workspace_storage):
     aws = alice_workspace_storage
@@ -508,3 +710,103 @@ async def test_storage_file_tree(alice, tmpdir, workspace_id):
         assert aws.block_storage.path == block_sqlite_db
 
     assert set(path.iterdir()) == {manifest_sqlite_db, chunk_sqlite_db, block_sqlite_db}
+
+
+@pytest.mark.trio
+async def test_concurrent_readers(tmpdir, alice, workspace_id):
+    async with WorkspaceStorage.run(alice, tmpdir, workspace_id, max_readers=2) as aws:
+        assert aws.data_localdb.has_readers
+        assert aws.cache_localdb.has_readers
+
+        # Dirty chunks are not committed, they must be read from the writer connection
+        chunk = Chunk.new(0, 4)
+        await aws.set_chunk(chunk.id, b"1234")
+        aws.chunk_storage.clear_memory_cache()
+        assert await aws.chunk_storage.is_chunk(chunk.id)
+        assert await aws.get_chunk(chunk.id) == b"1234"
+        assert not aws.chunk_storage._use_reader(chunk.id)
+
+        # Same thing for a removal
+        await aws.data_localdb.commit()
+        assert aws.chunk_storage._use_reader(chunk.id)
+        await aws.clear_chunk(chunk.id)
+        assert not await aws.chunk_storage.is_chunk(chunk.id)
+
+        # Committed data is visible from the readers
+        await aws.set_chunk(chunk.id, b"5678")
+        await aws.data_localdb.commit()
+        aws.chunk_storage.clear_memory_cache()
+        assert aws.chunk_storage._use_reader(chunk.id)
+        assert await aws.get_chunk(chunk.id) == b"5678"
+
+        # Manifests are read concurrently
+        manifests = [create_manifest(aws.device, LocalFileManifest) for _ in range(10)]
+        for manifest in manifests:
+            async with aws.lock_entry_id(manifest.id):
+                await aws.set_manifest(manifest.id, manifest)
+        await aws.clear_memory_cache()
+
+        results = {}
+
+        async def _get_manifest(entry_id):
+            results[entry_id] = await aws.get_manifest(entry_id)
+
+        async with trio.open_nursery() as nursery:
+            for manifest in manifests:
+                nursery.start_soon(_get_manifest, manifest.id)
+        assert results == {manifest.id: manifest for manifest in manifests}
+
+        with pytest.raises(FSLocalMissError):
+            await aws.get_manifest(EntryID())
+
+        # Vacuum waits for the readers
+        await aws.data_localdb.run_vacuum()
+        assert len(aws.data_localdb._reader_conns) == 2
+
+
+@pytest.mark.trio
+async def test_concurrent_read_during_group_commit(tmpdir, alice, workspace_id):
+    async with WorkspaceStorage.run(
+        alice, tmpdir, workspace_id, max_readers=1, manifest_cache_size=1
+    ) as aws:
+        manifest = create_manifest(aws.device, LocalFileManifest)
+        other_manifest = create_manifest(aws.device, LocalFileManifest)
+        new_manifest = manifest.evolve(need_sync=False)
+        await aws.set_manifest(manifest.id, manifest, check_lock_status=False)
+        await aws.clear_memory_cache()
+
+        # Hold the result of the first read until the group commit is over
+        fetched = trio.Event()
+        committed = trio.Event()
+        run_read_query = aws.data_localdb.run_read_query
+
+        async def _run_read_query(fn):
+            result = await run_read_query(fn)
+            if not fetched.is_set():
+                fetched.set()
+                await committed.wait()
+            return result
+
+        aws.data_localdb.run_read_query = _run_read_query
+        results = []
+
+        async def _get_manifest():
+            results.append(await aws.get_manifest(manifest.id))
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(_get_manifest)
+            await fetched.wait()
+
+            # The new version is committed along with another manifest,
+            # then evicted from the cache as it is no longer pinned
+            for x in (new_manifest, other_manifest):
+                await aws.set_manifest(x.id, x, cache_only=True, check_lock_status=False)
+            await aws.manifest_storage._ensure_manifests_persistent(
+                [manifest.id, other_manifest.id]
+            )
+            assert manifest.id not in aws.manifest_storage._cache
+            committed.set()
+
+        # The outdated row read before the commit doesn't end up in the cache
+        assert results == [new_manifest]
+        assert await aws.get_manifest(manifest.id) == new_manifest
@@ -0,0 +1,26 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import threading
+import pytest
+
+from parsec.crypto import SecretKey, CryptoError
+from parsec.core.fs import crypto_offload
+from parsec.core.fs.crypto_offload import CRYPTO_OFFLOAD_THRESHOLD, run_crypto
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("size", [10, CRYPTO_OFFLOAD_THRESHOLD])
+async def test_crypto_offload(size):
+    key = SecretKey.generate()
+    data = b"x" * size
+
+    ciphered = await crypto_offload.encrypt(key, data)
+    assert await crypto_offload.decrypt(key, ciphered) == data
+
+    # Errors are propagated from the worker thread
+    with pytest.raises(CryptoError):
+        await crypto_offload.decrypt(SecretKey.generate(), ciphered)
+
+    # Only the large operations leave the trio thread
+    thread = await run_crypto(threading.current_thread, size=size)
+    assert (thread is threading.current_thread()) is (size < CRYPTO_OFFLOAD_THRESHOLD)
@@ -80,6 +80,44 @@ async def test_do_reencryption(running_backend, workspace, alice, alice_user_fs)
         await job.do_one_batch()
 
 
+@pytest.mark.trio
+async def test_do_all_batches(running_backend, workspace, alice_user_fs, monkeypatch):
+    # Force several batches to go through the prefetching (otherwise the
+    # adapted batch size would fit the 4 vlob atoms at once)
+    monkeypatch.setattr("parsec.core.fs.userfs.userfs.REENCRYPTION_BATCH_MIN_SIZE", 1)
+    job = await alice_user_fs.workspace_start_reencryption(workspace)
+    job.batch_size = 1
+
+    fetched = []
+    get_batch = job._get_batch
+
+    async def _get_batch(size, after=None):
+        batch = await get_batch(size, after)
+        fetched.append((after, len(batch)))
+        return batch
+
+    job._get_batch = _get_batch
+
+    progress = []
+    total, done = await job.do_all_batches(
+        on_progress=lambda total, done: progress.append((total, done))
+    )
+    assert (total, done) == (4, 4)
+    assert progress[-1] == (4, 4)
+    assert len(progress) >= 2
+
+    # Non-empty batches have been prefetched after the previous ones
+    assert fetched[0] == (None, 1)
+    assert len([after for after, size in fetched if after is not None and size]) >= 2
+    assert sum(size for _, size in fetched) == 4
+
+    # Maintenance is finished and the workspace still readable
+    with pytest.raises(FSWorkspaceNotInMaintenance):
+        await job.do_one_batch()
+    w = alice_user_fs.get_workspace(workspace)
+    assert await w.read_bytes("/foo.txt") == b"v2"
+
+
 @pytest.mark.trio
 async def test_reencrypt_placeholder(running_backend, alice, alice_user_fs):
     wid = await alice_user_fs.workspace_create("w1")
@@ -76,6 +76,19 @@ async def test_file_create(alice_entry_transactions, alice_file_transactions, al
     }
 
 
+@pytest.mark.trio
+async def test_entry_info_with_pending_writes(alice_entry_transactions):
+    entry_transactions = alice_entry_transactions
+    _, fd = await entry_transactions.file_create(FsPath("/foo.txt"))
+
+    with freeze_time("2000-01-02"):
+        await entry_transactions.fd_write(fd, b"hello", 0)
+    stat = await entry_transactions.entry_info(FsPath("/foo.txt"))
+    assert stat["size"] == 5
+    assert stat["updated"] == Pendulum(2000, 1, 2)
+    await entry_transactions.fd_close(fd)
+
+
 @pytest.mark.trio
 async def test_folder_create_delete(alice_entry_transactions, alice_sync_transactions):
     entry_transactions = alice_entry_transactions
@@ -1,6 +1,7 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 import os
+import trio
 import pytest
 from pendulum import Pendulum
 from pathlib import Path
@@ -12,9 +13,13 @@ from hypothesis_trio.stateful import (
 )
 from hypothesis import strategies as st
 
+from parsec.api.protocol import APIV1_HandshakeType
+from parsec.core.backend_connection import BackendNotAvailable
 from parsec.core.types import EntryID, LocalFileManifest, Chunk
+from parsec.core.fs.remote_loader import BLOCK_STREAM_THRESHOLD
 from parsec.core.fs.storage import WorkspaceStorage
 from parsec.core.fs.workspacefs.file_transactions import FSInvalidFileDescriptor
+from parsec.core.fs.workspacefs.read_ahead import ReadAheadPrefetcher
 from parsec.core.fs.exceptions import FSRemoteBlockNotFound
 
 from tests.common import freeze_time, call_with_control
@@ -136,9 +141,10 @@ async def test_flush_file(alice_file_transactions, foo_txt):
         await file_transactions.fd_write(fd, b"hello ", 0)
         await file_transactions.fd_write(fd, b"world !", -1)
 
+    # The last write is still in the write buffer
     assert foo_txt.is_cache_ahead_of_persistance()
     foo_txt.ensure_manifest(
-        size=13,
+        size=6,
         is_placeholder=False,
         need_sync=True,
         base_version=1,
@@ -161,6 +167,151 @@ async def test_flush_file(alice_file_transactions, foo_txt):
     )
 
 
+@pytest.mark.trio
+async def test_read_within_single_chunk_is_zero_copy(alice_file_transactions, foo_txt):
+    file_transactions = alice_file_transactions
+    fd = foo_txt.open()
+    await file_transactions.fd_write(fd, b"hello ", 0)
+    await file_transactions.fd_write(fd, b"world !", -1)
+
+    # Inside a single chunk: a view on the chunk data is returned
+    data = await file_transactions.fd_read(fd, 3, 1)
+    assert isinstance(data, memoryview)
+    assert data == b"ell"
+
+    # Over several chunks: the data is assembled in a new buffer
+    data = await file_transactions.fd_read(fd, 4, 4)
+    assert isinstance(data, bytearray)
+    assert data == b"o wo"
+
+    # Reshaping a single chunk works from the view as well
+    await file_transactions.fd_flush(fd)
+    data = await file_transactions.fd_read(fd, -1, 0)
+    assert isinstance(data, memoryview)
+    assert data == b"hello world !"
+    await file_transactions.fd_close(fd)
+
+
+@pytest.mark.trio
+async def test_read_doesnt_lock_the_file(alice_file_transactions, foo_txt):
+    file_transactions = alice_file_transactions
+    fd = foo_txt.open()
+    await file_transactions.fd_write(fd, b"hello", 0)
+    await file_transactions.fd_flush(fd)
+
+    # Reading is possible while a write holds the lock on the file
+    async with file_transactions.local_storage.lock_manifest(foo_txt.entry_id):
+        with trio.fail_after(1):
+            assert await file_transactions.fd_read(fd, -1, 0) == b"hello"
+
+
+@pytest.mark.trio
+async def test_read_retried_on_concurrent_write(alice_file_transactions, foo_txt):
+    file_transactions = alice_file_transactions
+    local_storage = file_transactions.local_storage
+    fd = foo_txt.open()
+    await file_transactions.fd_write(fd, b"a" * 10, 0)
+
+    get_chunk = local_storage.get_chunk
+    concurrent_write_done = False
+
+    async def _get_chunk(chunk_id):
+        nonlocal concurrent_write_done
+        # Overwrite and flush the file between the manifest snapshot and
+        # the chunk read, which removes the chunk about to be read
+        if not concurrent_write_done:
+            concurrent_write_done = True
+            await file_transactions.fd_write(fd, b"b" * 10, 0)
+            await file_transactions.fd_flush(fd)
+        return await get_chunk(chunk_id)
+
+    local_storage.get_chunk = _get_chunk
+    assert await file_transactions.fd_read(fd, -1, 0) == b"b" * 10
+    assert concurrent_write_done
+
+
+@pytest.mark.trio
+async def test_write_buffer_merges_small_writes(alice_file_transactions, foo_txt):
+    file_transactions = alice_file_transactions
+    local_storage = file_transactions.local_storage
+    blocksize = foo_txt.fresh_manifest.blocksize
+    fd = foo_txt.open()
+
+    written = []
+    set_chunk = local_storage.set_chunk
+
+    async def _set_chunk(chunk_id, data):
+        written.append(len(data))
+        await set_chunk(chunk_id, data)
+
+    local_storage.set_chunk = _set_chunk
+
+    # A complete block is written as soon as it is complete
+    for i in range(blocksize // 4096):
+        await file_transactions.fd_write(fd, bytes([i % 256]) * 4096, i * 4096)
+    assert written == [blocksize]
+
+    # Pending writes are visible from other file descriptors
+    await file_transactions.fd_write(fd, b"a" * 10, blocksize)
+    await file_transactions.fd_write(fd, b"b" * 10, blocksize + 10)
+    assert written == [blocksize]
+    fd2 = foo_txt.open()
+    data = await file_transactions.fd_read(fd2, 25, blocksize - 5)
+    assert data == bytes([blocksize // 4096 - 1]) * 5 + b"a" * 10 + b"b" * 10
+    assert written == [blocksize, 20]
+
+    # Non contiguous write flushes the pending data first
+    await file_transactions.fd_write(fd, b"c" * 10, blocksize + 20)
+    await file_transactions.fd_write(fd, b"d" * 10, blocksize)
+    assert written == [blocksize, 20, 10]
+    await file_transactions.fd_close(fd)
+    assert written == [blocksize, 20, 10, 10]
+    data = await file_transactions.fd_read(fd2, -1, blocksize)
+    assert data == b"d" * 10 + b"b" * 10 + b"c" * 10
+    await file_transactions.fd_close(fd2)
+
+
+@pytest.mark.trio
+async def test_write_buffer_flushed_while_file_open(mock_clock, alice_file_transactions, foo_txt):
+    mock_clock.autojump_threshold = 0.1
+    file_transactions = alice_file_transactions
+    local_storage = file_transactions.local_storage
+    fd = foo_txt.open()
+
+    written = []
+    set_chunk = local_storage.set_chunk
+
+    async def _set_chunk(chunk_id, data):
+        written.append(len(data))
+        await set_chunk(chunk_id, data)
+
+    local_storage.set_chunk = _set_chunk
+
+    # Buffered writes are notified, so the synchronization can flush them
+    with file_transactions.event_bus.listen() as spy:
+        await file_transactions.fd_write(fd, b"a" * 10, 0)
+    spy.assert_event_occured(
+        "fs.entry.updated", {"workspace_id": file_transactions.workspace_id, "id": foo_txt.entry_id}
+    )
+    assert written == []
+
+    # The pending data is written after a while, even if the file stays open
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(file_transactions.run_write_buffers_flusher, 1)
+        await file_transactions.fd_write(fd, b"b" * 10, 10)
+        with trio.fail_after(2):
+            while not written:
+                await trio.sleep(0.1)
+        assert written == [20]
+        assert (await foo_txt.get_manifest()).size == 20
+
+        # Or when explicitly flushed (e.g. before closing the local storage)
+        await file_transactions.fd_write(fd, b"c" * 10, 20)
+        await file_transactions.flush_write_buffers()
+        assert written == [20, 10]
+        nursery.cancel_scope.cancel()
+
+
 @pytest.mark.trio
 async def test_block_not_loaded_entry(alice_file_transactions, foo_txt):
     file_transactions = alice_file_transactions
@@ -211,6 +362,212 @@ async def test_load_block_from_remote(alice_file_transactions, foo_txt):
     assert data == chunk1_data + chunk2_data[:4]
 
 
+@pytest.mark.trio
+@pytest.mark.parametrize("max_concurrency", [1, 3, 16])
+async def test_load_many_blocks_from_remote(alice_file_transactions, foo_txt, max_concurrency):
+    file_transactions = alice_file_transactions
+    remote_loader = file_transactions.remote_loader
+    remote_loader.block_download_max_concurrency = max_concurrency
+
+    # Prepare the backend
+    await remote_loader.create_realm(remote_loader.workspace_id)
+
+    foo_manifest = await foo_txt.get_manifest()
+    chunks = []
+    for i in range(10):
+        chunk_data = bytes([i]) * 10
+        chunk = Chunk.new(i * 10, (i + 1) * 10).evolve_as_block(chunk_data)
+        await remote_loader.upload_block(chunk.access, chunk_data)
+        await file_transactions.local_storage.clear_clean_block(chunk.access.id)
+        chunks.append(chunk)
+    foo_manifest = foo_manifest.evolve(
+        blocks=tuple((chunk,) for chunk in chunks), blocksize=10, size=100
+    )
+    await foo_txt.set_manifest(foo_manifest)
+
+    fd = foo_txt.open()
+    data = await file_transactions.fd_read(fd, 100, 0)
+    assert data == b"".join(bytes([i]) * 10 for i in range(10))
+
+    # All the blocks are now available locally
+    for chunk in chunks:
+        assert await file_transactions.local_storage.block_storage.is_chunk(chunk.id)
+
+
+@pytest.mark.trio
+async def test_load_many_blocks_with_missing_block(alice_file_transactions):
+    remote_loader = alice_file_transactions.remote_loader
+    await remote_loader.create_realm(remote_loader.workspace_id)
+
+    chunk1 = Chunk.new(0, 10).evolve_as_block(b"a" * 10)
+    chunk2 = Chunk.new(10, 20).evolve_as_block(b"b" * 10)
+    await remote_loader.upload_block(chunk1.access, b"a" * 10)
+
+    with pytest.raises(FSRemoteBlockNotFound):
+        await remote_loader.load_blocks([chunk1.access, chunk2.access])
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("streams_supported", [True, False])
+async def test_large_blocks_through_apiv1_connection(
+    running_backend,
+    file_transactions_factory,
+    alice,
+    apiv1_alice_backend_cmds,
+    alice_transaction_local_storage,
+    monkeypatch,
+    streams_supported,
+):
+    if not streams_supported:
+        # Backend predating the stream commands
+        apiv1_cmds = running_backend.backend.apis[APIV1_HandshakeType.AUTHENTICATED]
+        monkeypatch.delitem(apiv1_cmds, "block_create_stream")
+        monkeypatch.delitem(apiv1_cmds, "block_read_stream")
+
+    file_transactions = await file_transactions_factory(
+        alice, backend_cmds=apiv1_alice_backend_cmds, local_storage=alice_transaction_local_storage
+    )
+    local_storage = file_transactions.local_storage
+    remote_loader = file_transactions.remote_loader
+    await remote_loader.create_realm(remote_loader.workspace_id)
+
+    chunks = []
+    for _ in range(2):
+        chunk_data = os.urandom(BLOCK_STREAM_THRESHOLD)
+        chunk = Chunk.new(0, len(chunk_data)).evolve_as_block(chunk_data)
+        await remote_loader.upload_block(chunk.access, chunk_data)
+        await local_storage.clear_clean_block(chunk.access.id)
+        chunks.append((chunk, chunk_data))
+    assert remote_loader._block_streams_supported is streams_supported
+
+    await remote_loader.load_blocks([chunk.access for chunk, _ in chunks])
+    for chunk, chunk_data in chunks:
+        assert await local_storage.get_chunk(chunk.id) == chunk_data
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("batches_supported", [True, False])
+async def test_small_blocks_through_apiv1_connection(
+    running_backend,
+    file_transactions_factory,
+    alice,
+    apiv1_alice_backend_cmds,
+    alice_transaction_local_storage,
+    monkeypatch,
+    batches_supported,
+):
+    apiv1_cmds = running_backend.backend.apis[APIV1_HandshakeType.AUTHENTICATED]
+    if batches_supported:
+        # Blocks can only be transferred with the batch commands
+        monkeypatch.delitem(apiv1_cmds, "block_create")
+        monkeypatch.delitem(apiv1_cmds, "block_read")
+    else:
+        # Backend predating the batch commands
+        monkeypatch.delitem(apiv1_cmds, "block_batch_create")
+        monkeypatch.delitem(apiv1_cmds, "block_batch_read")
+
+    file_transactions = await file_transactions_factory(
+        alice, backend_cmds=apiv1_alice_backend_cmds, local_storage=alice_transaction_local_storage
+    )
+    local_storage = file_transactions.local_storage
+    remote_loader = file_transactions.remote_loader
+    await remote_loader.create_realm(remote_loader.workspace_id)
+
+    blocks = []
+    for i in range(10):
+        chunk_data = bytes([i]) * 10
+        chunk = Chunk.new(i * 10, (i + 1) * 10).evolve_as_block(chunk_data)
+        blocks.append((chunk, chunk_data))
+    await remote_loader.upload_blocks([(chunk.access, chunk_data) for chunk, chunk_data in blocks])
+    assert remote_loader._block_batches_supported is batches_supported
+
+    for chunk, _ in blocks:
+        await local_storage.clear_clean_block(chunk.access.id)
+    await remote_loader.load_blocks([chunk.access for chunk, _ in blocks])
+    for chunk, chunk_data in blocks:
+        assert await local_storage.get_chunk(chunk.id) == chunk_data
+
+
+@pytest.mark.trio
+async def test_read_ahead_on_sequential_reads(alice_file_transactions, foo_txt):
+    file_transactions = alice_file_transactions
+    remote_loader = file_transactions.remote_loader
+    async with trio.open_nursery() as nursery:
+        prefetcher = ReadAheadPrefetcher(
+            file_transactions.local_storage, remote_loader, nursery=nursery, max_blocks=4
+        )
+        file_transactions.prefetcher = prefetcher
+
+        # Prepare the backend
+        await remote_loader.create_realm(remote_loader.workspace_id)
+
+        foo_manifest = await foo_txt.get_manifest()
+        chunks = []
+        for i in range(20):
+            chunk_data = bytes([i]) * 10
+            chunk = Chunk.new(i * 10, (i + 1) * 10).evolve_as_block(chunk_data)
+            await remote_loader.upload_block(chunk.access, chunk_data)
+            await file_transactions.local_storage.clear_clean_block(chunk.access.id)
+            chunks.append(chunk)
+        foo_manifest = foo_manifest.evolve(
+            blocks=tuple((chunk,) for chunk in chunks), blocksize=10, size=200
+        )
+        await foo_txt.set_manifest(foo_manifest)
+        fd = foo_txt.open()
+
+        # The window grows as long as the reads are sequential
+        for i, expected_window in enumerate([1, 2, 4, 4]):
+            data = await file_transactions.fd_read(fd, 10, i * 10)
+            assert data == bytes([i]) * 10
+            assert prefetcher.get_window(fd) == expected_window
+            await trio.testing.wait_all_tasks_blocked()
+
+        # Only the first block had to be downloaded by the read itself
+        assert prefetcher.statistics.misses == 1
+        assert prefetcher.statistics.hits == 3
+        assert prefetcher.statistics.prefetched == 7
+
+        # Random access resets the window
+        data = await file_transactions.fd_read(fd, 10, 150)
+        assert data == bytes([15]) * 10
+        assert prefetcher.get_window(fd) == 0
+        assert prefetcher.statistics.misses == 2
+
+        # Closing the file descriptor forgets about the access pattern
+        await file_transactions.fd_close(fd)
+        assert prefetcher.get_window(fd) == 0
+
+        nursery.cancel_scope.cancel()
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("error", [BackendNotAvailable, RuntimeError])
+async def test_read_ahead_prefetch_errors(alice_file_transactions, error):
+    file_transactions = alice_file_transactions
+    chunk = Chunk.new(0, 10).evolve_as_block(bytes(10))
+
+    async def _load_blocks(accesses):
+        raise error()
+
+    async with trio.open_nursery() as nursery:
+        prefetcher = ReadAheadPrefetcher(
+            file_transactions.local_storage,
+            file_transactions.remote_loader,
+            nursery=nursery,
+            max_blocks=4,
+        )
+        file_transactions.remote_loader.load_blocks = _load_blocks
+        prefetcher._in_flight.add(chunk.access.id)
+        nursery.start_soon(prefetcher._prefetch, [chunk.access])
+        await trio.testing.wait_all_tasks_blocked()
+
+        # The error is logged, without tearing down the nursery
+        assert not prefetcher._in_flight
+        assert prefetcher.statistics.prefetched == 0
+        assert not nursery.cancel_scope.cancel_called
+        nursery.cancel_scope.cancel()
+
+
 size = st.integers(min_value=0, max_value=4 * 1024 ** 2)  # Between 0 and 4MB
 
 
@@ -1,9 +1,11 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
 from functools import partial
+import trio
 import pytest
 
 from parsec.core.types import FsPath
+from parsec.core.fs.remote_loader import BLOCK_STREAM_THRESHOLD
 
 from tests.common import create_shared_workspace
 
@@ -93,3 +95,55 @@ async def test_sync_by_id_couple(alice_workspace, bob_workspace):
     expected = [FsPath("/a"), FsPath("/b")]
     assert await bob_workspace.listdir("/") == expected
     assert await alice_workspace.listdir("/") == expected
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+async def test_sync_uploads_blocks_and_placeholders_concurrently(
+    alice_workspace, bob_workspace, max_concurrency
+):
+    alice_workspace.block_upload_max_concurrency = max_concurrency
+    # Big enough for the blocks not to be grouped in batch requests
+    blocksize = BLOCK_STREAM_THRESHOLD
+    data = bytes(range(256)) * (5 * blocksize // 256)  # 5 blocks
+    f_id, _ = await alice_workspace.transactions.file_create(FsPath("/f"), open=False)
+    manifest = await alice_workspace.local_storage.get_manifest(f_id)
+    manifest = manifest.evolve(blocksize=blocksize)
+    async with alice_workspace.local_storage.lock_entry_id(f_id):
+        await alice_workspace.local_storage.set_manifest(f_id, manifest)
+    await alice_workspace.write_bytes("/f", data)
+    for i in range(10):
+        await alice_workspace.mkdir(f"/d{i}")
+
+    in_flight = 0
+    max_in_flight = 0
+    upload_blocks = alice_workspace.remote_loader.upload_blocks
+
+    async def _upload_blocks(blocks):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            await trio.sleep(0.01)
+            await upload_blocks(blocks)
+        finally:
+            in_flight -= 1
+
+    alice_workspace.remote_loader.upload_blocks = _upload_blocks
+    with alice_workspace.event_bus.listen() as spy:
+        await alice_workspace.sync()
+    assert max_in_flight == max_concurrency
+
+    # The progress is reported for each uploaded block
+    uploaded = [
+        event.kwargs for event in spy.events if event.event == "fs.entry.block_uploaded"
+    ]
+    assert [x["id"] for x in uploaded] == [f_id] * 5
+    assert sorted(x["uploaded"] for x in uploaded) == [i * blocksize for i in range(1, 6)]
+
+    # Everything has been synchronized
+    await bob_workspace.sync()
+    assert await bob_workspace.read_bytes("/f") == data
+    assert await bob_workspace.listdir("/") == [FsPath(f"/d{i}") for i in range(10)] + [
+        FsPath("/f")
+    ]
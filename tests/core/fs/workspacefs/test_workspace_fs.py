@@ -135,6 +135,43 @@ async def test_listdir(alice_workspace):
         await alice_workspace.listdir("/baz")
 
 
+@pytest.mark.trio
+async def test_listdir_with_stats(alice_workspace, running_backend):
+    bar_id = await alice_workspace.path_id("/foo/bar")
+    baz_id = await alice_workspace.path_id("/foo/baz")
+    expected = {
+        FsPath("/foo/bar"): await alice_workspace.path_info("/foo/bar"),
+        FsPath("/foo/baz"): await alice_workspace.path_info("/foo/baz"),
+    }
+    assert await alice_workspace.listdir_with_stats("/foo") == expected
+
+    # Missing manifests are downloaded
+    for entry_id in (bar_id, baz_id):
+        async with alice_workspace.local_storage.lock_entry_id(entry_id):
+            await alice_workspace.local_storage.clear_manifest(entry_id)
+    assert await alice_workspace.listdir_with_stats("/foo") == expected
+    assert (await alice_workspace.local_storage.get_manifest(bar_id)).id == bar_id
+
+    # Only the requested children are listed
+    transactions = alice_workspace.transactions
+    stats = [x async for x in transactions.folder_list_with_stats(FsPath("/foo"), ["baz", "x"])]
+    assert stats == [("baz", expected[FsPath("/foo/baz")])]
+
+    # A child not available offline doesn't prevent the listing
+    async with alice_workspace.local_storage.lock_entry_id(bar_id):
+        await alice_workspace.local_storage.clear_manifest(bar_id)
+    with running_backend.offline():
+        assert await alice_workspace.listdir_with_stats("/foo") == {
+            FsPath("/foo/bar"): {"type": "inconsistency", "id": bar_id},
+            FsPath("/foo/baz"): expected[FsPath("/foo/baz")],
+        }
+
+    with pytest.raises(NotADirectoryError):
+        await alice_workspace.listdir_with_stats("/foo/bar")
+    with pytest.raises(FileNotFoundError):
+        await alice_workspace.listdir_with_stats("/baz")
+
+
 @pytest.mark.trio
 async def test_rename(alice_workspace):
     await alice_workspace.rename("/foo", "/foz")
@@ -339,6 +376,119 @@ async def test_copyfile(alice_workspace):
     assert await alice_workspace.read_bytes("/copied") == b"a" * 9000 + b"b" * 40000
 
 
+@pytest.mark.trio
+async def test_copyfile_shares_synced_blocks(alice_user_fs, alice_workspace, alice2_user_fs):
+    data = b"a" * 9000 + b"b" * 40000
+    await alice_workspace.write_bytes("/foo/bar", data)
+    await alice_workspace.sync()
+
+    uploaded = []
+    upload_blocks = alice_workspace.remote_loader.upload_blocks
+
+    async def _upload_blocks(blocks):
+        uploaded.extend(access.id for access, _ in blocks)
+        await upload_blocks(blocks)
+
+    alice_workspace.remote_loader.upload_blocks = _upload_blocks
+
+    await alice_workspace.copyfile("/foo/bar", "/copied")
+    source = await alice_workspace.local_storage.get_manifest(
+        await alice_workspace.path_id("/foo/bar")
+    )
+    copied = await alice_workspace.local_storage.get_manifest(
+        await alice_workspace.path_id("/copied")
+    )
+    assert copied.id != source.id
+    assert copied.blocks == source.blocks
+
+    # No block to upload, only the manifest
+    await alice_workspace.sync()
+    assert uploaded == []
+    await alice_user_fs.sync()
+    await alice2_user_fs.sync()
+    alice2_workspace = alice2_user_fs.get_workspace(alice_workspace.workspace_id)
+    await alice2_workspace.sync()
+    assert await alice2_workspace.read_bytes("/copied") == data
+
+
+@pytest.mark.trio
+async def test_copyfile_dirty_chunks(alice_user_fs, alice_workspace, alice2_user_fs):
+    await alice_workspace.write_bytes("/foo/bar", b"a" * 9000 + b"b" * 40000)
+    await alice_workspace.copyfile("/foo/bar", "/copied")
+
+    # Modifying or synchronizing the source doesn't affect the copy
+    await alice_workspace.write_bytes("/foo/bar", b"c" * 5000)
+    await alice_workspace.sync()
+    assert await alice_workspace.read_bytes("/copied") == b"a" * 9000 + b"b" * 40000
+
+    await alice_user_fs.sync()
+    await alice2_user_fs.sync()
+    alice2_workspace = alice2_user_fs.get_workspace(alice_workspace.workspace_id)
+    await alice2_workspace.sync()
+    assert await alice2_workspace.read_bytes("/copied") == b"a" * 9000 + b"b" * 40000
+    assert await alice2_workspace.read_bytes("/foo/bar") == b"c" * 5000
+
+
+@pytest.mark.trio
+async def test_copyfile_exist_ok(alice_workspace):
+    await alice_workspace.write_bytes("/foo/bar", b"a" * 10)
+    await alice_workspace.write_bytes("/foo/baz", b"b" * 20000)
+    with pytest.raises(FileExistsError):
+        await alice_workspace.copyfile("/foo/bar", "/foo/baz")
+    with pytest.raises(IsADirectoryError):
+        await alice_workspace.copyfile("/foo", "/cfoo")
+    with pytest.raises(IsADirectoryError):
+        await alice_workspace.copyfile("/foo/bar", "/foo", exist_ok=True)
+
+    baz_id = await alice_workspace.path_id("/foo/baz")
+    await alice_workspace.copyfile("/foo/bar", "/foo/baz", exist_ok=True)
+    assert await alice_workspace.path_id("/foo/baz") == baz_id
+    assert await alice_workspace.read_bytes("/foo/baz") == b"a" * 10
+
+
+@pytest.mark.trio
+async def test_path_resolution_cache(alice_workspace):
+    bar_id = await alice_workspace.path_id("/foo/bar")
+
+    loaded = []
+    get_manifest = alice_workspace.local_storage.get_manifest
+
+    async def _get_manifest(entry_id):
+        loaded.append(entry_id)
+        return await get_manifest(entry_id)
+
+    alice_workspace.local_storage.get_manifest = _get_manifest
+
+    # Resolved path doesn't go through its parents anymore
+    assert await alice_workspace.path_id("/foo/bar") == bar_id
+    assert loaded == [bar_id]
+
+    # Local changes invalidate the cache
+    await alice_workspace.rename("/foo", "/foo2")
+    with pytest.raises(FileNotFoundError):
+        await alice_workspace.path_info("/foo/bar")
+    assert await alice_workspace.path_id("/foo2/bar") == bar_id
+    await alice_workspace.mkdir("/foo")
+    await alice_workspace.touch("/foo/bar")
+    assert await alice_workspace.path_id("/foo/bar") != bar_id
+
+
+@pytest.mark.trio
+async def test_path_resolution_cache_remote_changes(alice_user_fs, alice_workspace, alice2_user_fs):
+    bar_id = await alice_workspace.path_id("/foo/bar")
+    await alice_user_fs.sync()
+    await alice2_user_fs.sync()
+    alice2_workspace = alice2_user_fs.get_workspace(alice_workspace.workspace_id)
+    await alice2_workspace.sync()
+    await alice2_workspace.rename("/foo/bar", "/foo/qux")
+    await alice2_workspace.sync()
+
+    await alice_workspace.sync()
+    with pytest.raises(FileNotFoundError):
+        await alice_workspace.path_info("/foo/bar")
+    assert await alice_workspace.path_id("/foo/qux") == bar_id
+
+
 @pytest.mark.trio
 async def test_rmtree(alice_workspace):
     await alice_workspace.mkdir("/foz")
@@ -0,0 +1,63 @@
+# Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
+
+import os
+import time
+import random
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+
+NB_FILES = 16
+FILE_SIZE = 8 * 1024 * 1024
+
+
+def _sequential_read(path, block_size):
+    with open(path, "rb", buffering=0) as fd:
+        while fd.read(block_size):
+            pass
+    return FILE_SIZE
+
+
+def _random_read(path, block_size, nb_reads):
+    rand = random.Random(path)
+    with open(path, "rb", buffering=0) as fd:
+        for _ in range(nb_reads):
+            fd.seek(rand.randrange(0, FILE_SIZE - block_size))
+            fd.read(block_size)
+    return nb_reads * block_size
+
+
+def _run_jobs(numjobs, job, paths):
+    # Equivalent of `fio --numjobs=<numjobs>`, each job reading its own file
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=numjobs) as executor:
+        total = sum(executor.map(job, paths[:numjobs]))
+    return total / (time.perf_counter() - start) / 1024 ** 2
+
+
+@pytest.mark.slow
+@pytest.mark.mountpoint
+@pytest.mark.parametrize("numjobs", [1, 4, 16])
+def test_bench_parallel_read(mountpoint_service, numjobs):
+    async def _bootstrap(user_fs, mountpoint_manager):
+        workspace = user_fs.get_workspace(mountpoint_service.wid)
+        for i in range(NB_FILES):
+            await workspace.touch(f"/file-{i}.bin")
+            await workspace.write_bytes(f"/file-{i}.bin", os.urandom(FILE_SIZE))
+
+    mountpoint_service.execute(_bootstrap)
+    paths = [mountpoint_service.wpath / f"file-{i}.bin" for i in range(NB_FILES)]
+    # Make sure all the jobs are reading a different file
+    assert numjobs <= len(paths)
+
+    seq_read = _run_jobs(numjobs, lambda path: _sequential_read(path, 1024 * 1024), paths)
+    rand_read = _run_jobs(numjobs, lambda path: _random_read(path, 4096, 1000), paths)
+    # All the jobs reading the same file
+    same_file_read = _run_jobs(
+        numjobs, lambda path: _sequential_read(path, 1024 * 1024), paths[:1] * numjobs
+    )
+
+    print(
+        f"\nfio-like read with {numjobs} jobs: sequential {seq_read:.0f}MB/s, "
+        f"random 4KB {rand_read:.1f}MB/s, sequential on the same file {same_file_read:.0f}MB/s"
+    )
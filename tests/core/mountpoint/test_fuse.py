@@ -188,3 +188,33 @@ async def test_mountpoint_path_already_in_use_concurrent_with_mountpoint(
 
         # Test is over, stop alice2 mountpoint and exit
         nursery.cancel_scope.cancel()
+
+
+@pytest.mark.linux
+@pytest.mark.trio
+@pytest.mark.mountpoint
+async def test_readdir_offline(base_mountpoint, running_backend, alice_user_fs, event_bus):
+    wid = await alice_user_fs.workspace_create("w")
+    workspace = alice_user_fs.get_workspace(wid)
+    await workspace.mkdir("/foo")
+    await workspace.touch("/foo/bar.txt")
+    await workspace.touch("/foo/baz.txt")
+    await workspace.sync()
+
+    # The manifest of a child is only available in the backend
+    bar_id = await workspace.path_id("/foo/bar.txt")
+    async with workspace.local_storage.lock_entry_id(bar_id):
+        await workspace.local_storage.clear_manifest(bar_id)
+
+    async with mountpoint_manager_factory(
+        alice_user_fs, event_bus, base_mountpoint
+    ) as mountpoint_manager:
+        mountpoint_path = await mountpoint_manager.mount_workspace(wid)
+        with running_backend.offline():
+            children = await trio.to_thread.run_sync(os.listdir, mountpoint_path / "foo")
+            assert sorted(children) == ["bar.txt", "baz.txt"]
+
+            # Only the stats of the missing child require the backend
+            await trio.to_thread.run_sync(os.stat, mountpoint_path / "foo" / "baz.txt")
+            with pytest.raises(OSError):
+                await trio.to_thread.run_sync(os.stat, mountpoint_path / "foo" / "bar.txt")
@@ -1,10 +1,20 @@
 # Parsec Cloud (https://parsec.cloud) Copyright (c) AGPLv3 2019 Scille SAS
 
+import math
 import trio
 import pytest
 from unittest.mock import ANY
 
-from parsec.core.backend_connection import BackendConnStatus
+from parsec.core.types import EntryID, FsPath
+from parsec.core.fs import FSBackendOfflineError
+from parsec.core.backend_connection import BackendConnStatus, BackendNotAvailable
+from parsec.core.sync_monitor import (
+    MIN_WAIT,
+    MAX_CONCURRENT_SYNCS_PER_WORKSPACE,
+    SYNC_BATCH_SIZE,
+    SyncContext,
+    timestamp,
+)
 
 
 @pytest.mark.trio
@@ -99,6 +109,24 @@ async def test_autosync_on_modification(
     assert path_info == path_info2
 
 
+@pytest.mark.trio
+async def test_autosync_file_kept_open(mock_clock, running_backend, alice_core, alice2_user_fs):
+    mock_clock.autojump_threshold = 0
+    wid = await alice_core.user_fs.workspace_create("w")
+    workspace = alice_core.user_fs.get_workspace(wid)
+    _, fd = await workspace.transactions.file_create(FsPath("/foo.txt"))
+
+    # Small writes are buffered, the file descriptor is never closed
+    await workspace.transactions.fd_write(fd, b"hello", 0)
+    await workspace.transactions.fd_write(fd, b" world", 5)
+    with trio.fail_after(60):  # autojump, so not *really* 60s
+        await alice_core.wait_idle_monitors()
+
+    await alice2_user_fs.sync()
+    workspace2 = alice2_user_fs.get_workspace(wid)
+    assert await workspace2.read_bytes("/foo.txt") == b"hello world"
+
+
 @pytest.mark.trio
 async def test_autosync_on_remote_modifications(
     mock_clock, running_backend, alice, alice_core, alice2_user_fs
@@ -240,3 +268,86 @@ async def test_reconnect_with_remote_changes(
             in_order=False,
             timeout=60,  # autojump, so not *really* 60s
         )
+
+
+@pytest.mark.trio
+async def test_sync_contexts_concurrent_and_fair_ticks(mock_clock):
+    mock_clock.autojump_threshold = 0
+    in_progress = {}
+    max_in_progress = {"total": 0}
+    synced = []
+
+    class FakeStorage:
+        async def run_vacuum(self):
+            pass
+
+    class FakeSyncContext(SyncContext):
+        async def _sync(self, entry_id):
+            in_progress[self.id] = in_progress.get(self.id, 0) + 1
+            max_in_progress[self.id] = max(max_in_progress.get(self.id, 0), in_progress[self.id])
+            total = sum(in_progress.values())
+            max_in_progress["total"] = max(max_in_progress["total"], total)
+            await trio.sleep(1)
+            in_progress[self.id] -= 1
+            synced.append((self.id, entry_id))
+
+        def _get_local_storage(self):
+            return FakeStorage()
+
+    ctxs = [FakeSyncContext(None, EntryID()) for _ in range(2)]
+    entries = {ctx.id: [EntryID() for _ in range(SYNC_BATCH_SIZE + 5)] for ctx in ctxs}
+    for ctx in ctxs:
+        ctx._changes_loaded = True
+        for entry_id in entries[ctx.id]:
+            ctx.set_local_change(entry_id)
+        # Changing an entry again doesn't duplicate its sync
+        ctx.set_local_change(entries[ctx.id][0])
+    await trio.sleep(MIN_WAIT)
+
+    sync_limiter = trio.CapacityLimiter(MAX_CONCURRENT_SYNCS_PER_WORKSPACE + 1)
+    async with trio.open_nursery() as nursery:
+        for ctx in ctxs:
+            nursery.start_soon(ctx.tick, sync_limiter)
+
+    # Each context synced a single batch, with a bounded concurrency
+    # shared fairly between the contexts
+    assert max_in_progress["total"] == MAX_CONCURRENT_SYNCS_PER_WORKSPACE + 1
+    for ctx in ctxs:
+        assert 2 <= max_in_progress[ctx.id] <= MAX_CONCURRENT_SYNCS_PER_WORKSPACE
+        assert len([x for x in synced if x[0] == ctx.id]) == SYNC_BATCH_SIZE
+        # Remaining changes are already due
+        assert ctx.due_time <= timestamp()
+
+    for ctx in ctxs:
+        assert await ctx.tick(sync_limiter) == math.inf
+    assert sorted(synced) == sorted(
+        (ctx.id, entry_id) for ctx in ctxs for entry_id in entries[ctx.id]
+    )
+
+
+@pytest.mark.trio
+async def test_sync_context_keeps_postponed_changes_on_error(mock_clock):
+    mock_clock.autojump_threshold = 0
+    entry_a, entry_b = EntryID(), EntryID()
+
+    class FakeSyncContext(SyncContext):
+        async def _sync(self, entry_id):
+            if entry_id == entry_a:
+                # Changed remotely while being synced, then the sync fails
+                self.set_remote_change(entry_a)
+                await trio.sleep(2)
+                raise FSBackendOfflineError()
+            await trio.sleep(1)
+
+    ctx = FakeSyncContext(None, EntryID())
+    ctx._changes_loaded = True
+    ctx.set_local_change(entry_a)
+    await trio.sleep(MIN_WAIT)
+    ctx.set_local_change(entry_b)
+    await trio.sleep(MIN_WAIT)
+
+    # The remote change on `entry_a` is postponed by the worker that synced
+    # `entry_b`, and must be kept despite the failure of the tick
+    with pytest.raises(BackendNotAvailable):
+        await ctx.tick()
+    assert ctx._remote_changes == {entry_a}
@@ -67,6 +67,7 @@ async def asyncio_reset_postgresql_testbed():
         """
 TRUNCATE TABLE
     organization,
+    organization_stats,
 
     user_,
     device,
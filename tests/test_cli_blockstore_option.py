@@ -10,6 +10,7 @@ from parsec.backend.config import (
     S3BlockStoreConfig,
     SWIFTBlockStoreConfig,
     RAID0BlockStoreConfig,
+    RAIDNBlockStoreConfig,
 )
 
 
@@ -113,6 +114,24 @@ def test_parse_simple_raid():
     )
 
 
+def test_parse_raidn():
+    config = _parse_blockstore_params([f"RAIDN-2:{x}:MOCKED" for x in range(5)])
+    assert config == RAIDNBlockStoreConfig(blockstores=[MockedBlockStoreConfig()] * 5, nb_parity=2)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        [f"RAIDN-x:{x}:MOCKED" for x in range(5)],  # Invalid parity count
+        [f"RAIDN-0:{x}:MOCKED" for x in range(5)],  # No parity node
+        [f"RAIDN-2:{x}:MOCKED" for x in range(3)],  # Too few nodes
+    ],
+)
+def test_bad_raidn_params(params):
+    with pytest.raises(BadParameter):
+        _parse_blockstore_params(params)
+
+
 @pytest.mark.parametrize(
     "param",
     [